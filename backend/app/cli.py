@@ -0,0 +1,222 @@
+"""
+命令行维护工具
+
+用法（在 backend 目录下）：
+    python -m app.cli <命令> [参数]
+"""
+import argparse
+import json
+import sys
+from datetime import datetime
+
+from sqlalchemy import text
+
+from .database import engine, create_tables
+
+
+def _print_report(report):
+    print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+
+
+def cmd_migrate_version_storage(args):
+    """将明文版本内容转换为差量压缩存储"""
+    from .services import version_store
+
+    report = version_store.migrate_existing(engine, prompts_per_batch=args.batch_size)
+    if args.vacuum:
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+        report["vacuumed"] = True
+    _print_report(report)
+
+
+def cmd_migrate_blob_storage(args):
+    """将明文测试输入和压缩全文版本转换为去重的内容块引用"""
+    from .services import blob_store
+
+    report = blob_store.migrate_existing(engine, batch_size=args.batch_size)
+    report["storage"] = blob_store.stats(engine)
+    _print_report(report)
+
+
+def cmd_verify_blobs(args):
+    """校验并修正内容块引用计数"""
+    from .services import blob_store
+
+    repaired = blob_store.verify_refcounts(engine)
+    _print_report({"repaired_refcounts": repaired, "storage": blob_store.stats(engine)})
+
+
+def cmd_compress_results(args):
+    """分批压缩已有的明文结果输出"""
+    from .services import result_compression
+
+    _print_report(result_compression.compress_existing(engine, batch_size=args.batch_size, pause=args.pause))
+
+
+def cmd_compression_report(args):
+    """输出结果输出的压缩率与解压开销"""
+    from .services import result_compression
+
+    _print_report(result_compression.compression_report(engine, sample=args.sample))
+
+
+def cmd_archive_results(args):
+    """按保留策略归档旧结果并归还空闲页"""
+    from .services import archive_service
+
+    if args.enable_incremental_vacuum:
+        archive_service.enable_incremental_vacuum(engine)
+    _print_report(archive_service.run_incremental(
+        engine, days=args.days, keep=args.keep, batch_size=args.batch_size
+    ))
+
+
+def cmd_rebuild_stats(args):
+    """从结果和归档重新计算版本统计"""
+    from .services import stats_service
+
+    _print_report(stats_service.rebuild(engine, version_ids=args.version_id, batch_size=args.batch_size))
+
+
+def cmd_rebuild_search_index(args):
+    """重建全文搜索索引"""
+    from .models import prompt as models
+    from .services import search_service
+
+    search_service.rebuild_index(engine, models.Prompt, args.batch_size)
+    search_service.rebuild_index(engine, models.PromptVersion, args.batch_size)
+    print("全文搜索索引重建完成")
+
+
+def cmd_rebuild_usage_rollups(args):
+    """从结果和归档重新计算 result 来源的用量汇总"""
+    from .services import analytics_service
+
+    _print_report(analytics_service.rebuild_from_results(engine, batch_size=args.batch_size))
+
+
+def cmd_export_library(args):
+    """将提示词库导出为NDJSON文件（- 表示标准输出）"""
+    from .services import library_transfer
+
+    use_gzip = args.gzip or args.output.endswith(".gz")
+    stream = library_transfer.export_stream(
+        use_gzip, include_results=not args.no_results, include_templates=not args.no_templates
+    )
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for data in stream:
+            out.write(data)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+
+def cmd_import_library(args):
+    """导入 export-library 生成的文件（gzip 自动识别）"""
+    from .services import library_transfer
+
+    with library_transfer.open_maybe_gzip(args.input) as f:
+        _print_report(library_transfer.import_lines(f, chunk_size=args.chunk_size))
+
+
+def cmd_export_results(args):
+    """将优化结果导出为 Parquet 或 Arrow IPC 文件"""
+    from .core.projection import select_fields
+    from .services import columnar_export
+
+    output_format = args.format or ("arrow" if args.output.endswith((".arrow", ".feather")) else "parquet")
+    columns = select_fields(args.fields, columnar_export.COLUMN_NAMES)
+    stream = columnar_export.export_stream(
+        engine.connect, output_format, columns, row_group_size=args.row_group_size,
+        prompt_ids=args.prompt_id, version_ids=args.version_id, provider=args.provider, model=args.model,
+        created_after=args.since, created_before=args.until
+    )
+    with open(args.output, "wb") as f:
+        for data in stream:
+            f.write(data)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="LLM提示词优化平台维护工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sub = subparsers.add_parser("migrate-version-storage", help="将已有版本内容迁移为差量压缩存储，并输出节省空间报告")
+    sub.add_argument("--batch-size", type=int, default=50, help="每个事务处理的提示词数量")
+    sub.add_argument("--vacuum", action="store_true", help="迁移后执行 VACUUM 以实际释放磁盘空间")
+    sub.set_defaults(func=cmd_migrate_version_storage)
+
+    sub = subparsers.add_parser("migrate-blob-storage", help="将测试输入和版本关键帧迁移为去重的内容块，并输出报告")
+    sub.add_argument("--batch-size", type=int, default=1000, help="每个事务处理的记录数")
+    sub.set_defaults(func=cmd_migrate_blob_storage)
+
+    sub = subparsers.add_parser("verify-blobs", help="按实际引用重算内容块引用计数并清理无引用的内容块")
+    sub.set_defaults(func=cmd_verify_blobs)
+
+    sub = subparsers.add_parser("compress-results", help="分批压缩已有的明文结果输出")
+    sub.add_argument("--batch-size", type=int, default=200, help="每个事务处理的行数")
+    sub.add_argument("--pause", type=float, default=0.05, help="批间暂停秒数，让出写锁")
+    sub.set_defaults(func=cmd_compress_results)
+
+    sub = subparsers.add_parser("compression-report", help="统计结果输出的压缩率和每行解压耗时")
+    sub.add_argument("--sample", type=int, default=1000, help="实际解压测量的最大行数")
+    sub.set_defaults(func=cmd_compression_report)
+
+    sub = subparsers.add_parser("archive-results", help="将超过保留期限的结果移入归档文件")
+    sub.add_argument("--days", type=int, default=None, help="归档早于 N 天的结果（默认 RESULT_RETENTION_DAYS）")
+    sub.add_argument("--keep", type=int, default=None, help="每个版本保留最新的 K 条结果（默认 RESULT_RETENTION_KEEP）")
+    sub.add_argument("--batch-size", type=int, default=500, help="每个事务归档的行数")
+    sub.add_argument("--enable-incremental-vacuum", action="store_true",
+                     help="先将旧数据库切换为增量自动清理模式（执行一次完整 VACUUM）")
+    sub.set_defaults(func=cmd_archive_results)
+
+    sub = subparsers.add_parser("rebuild-stats", help="重新计算版本结果统计（回填或修复）")
+    sub.add_argument("--version-id", type=int, action="append", help="只重建指定版本，可重复；默认全部")
+    sub.add_argument("--batch-size", type=int, default=1000, help="每批读取的结果数")
+    sub.set_defaults(func=cmd_rebuild_stats)
+
+    sub = subparsers.add_parser("rebuild-search-index", help="重建全文搜索索引")
+    sub.add_argument("--batch-size", type=int, default=1000, help="每批处理的记录数")
+    sub.set_defaults(func=cmd_rebuild_search_index)
+
+    sub = subparsers.add_parser("rebuild-usage-rollups", help="重新计算保存结果的用量汇总（/llm/generate 的记录保持不变）")
+    sub.add_argument("--batch-size", type=int, default=1000, help="每批读取的结果数")
+    sub.set_defaults(func=cmd_rebuild_usage_rollups)
+
+    sub = subparsers.add_parser("export-library", help="以NDJSON导出提示词、版本、结果和模板")
+    sub.add_argument("output", help="输出文件，以 .gz 结尾时压缩；- 表示标准输出")
+    sub.add_argument("--gzip", action="store_true", help="以 gzip 压缩输出")
+    sub.add_argument("--no-results", action="store_true", help="不导出优化结果")
+    sub.add_argument("--no-templates", action="store_true", help="不导出提示词模板")
+    sub.set_defaults(func=cmd_export_library)
+
+    sub = subparsers.add_parser("import-library", help="导入 export-library 生成的NDJSON文件，重复记录自动跳过")
+    sub.add_argument("input", help="导入文件（可为 gzip 压缩）")
+    sub.add_argument("--chunk-size", type=int, default=1000, help="每个事务写入的记录数")
+    sub.set_defaults(func=cmd_import_library)
+
+    sub = subparsers.add_parser("export-results", help="将优化结果导出为 Parquet 或 Arrow IPC 文件（需要 pyarrow）")
+    sub.add_argument("output", help="输出文件，.arrow/.feather 结尾时默认 Arrow 格式")
+    sub.add_argument("--format", choices=["parquet", "arrow"], help="文件格式，默认按扩展名判断")
+    sub.add_argument("--prompt-id", type=int, action="append", help="按提示词筛选，可重复")
+    sub.add_argument("--version-id", type=int, action="append", help="按版本筛选，可重复")
+    sub.add_argument("--provider", help="按提供商筛选")
+    sub.add_argument("--model", help="按模型筛选")
+    sub.add_argument("--since", type=datetime.fromisoformat, help="创建时间下限（ISO格式，含）")
+    sub.add_argument("--until", type=datetime.fromisoformat, help="创建时间上限（ISO格式，不含）")
+    sub.add_argument("--fields", help="导出列，逗号分隔；默认全部列")
+    sub.add_argument("--row-group-size", type=int, default=50000, help="每个行组的行数")
+    sub.set_defaults(func=cmd_export_results)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    create_tables()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    线程安全的LRU缓存，按条目数和总大小双重限制
+
+    size_of 用于计算单个值的大小（默认 len），超过 max_size 的值不会被缓存
+    """
+
+    def __init__(self, max_items: int = 1024, max_size: Optional[int] = None,
+                 size_of: Callable[[Any], int] = len):
+        self.max_items = max_items
+        self.max_size = max_size
+        self._size_of = size_of
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        size = self._size_of(value) if self.max_size is not None else 0
+        with self._lock:
+            self._pop(key)
+            if self.max_size is not None and size > self.max_size:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self._size += size
+            while len(self._data) > self.max_items or (self.max_size is not None and self._size > self.max_size):
+                oldest = next(iter(self._data))
+                self._pop(oldest)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._pop(key)
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """删除 predicate(键, 值) 为真的条目，返回删除数"""
+        with self._lock:
+            keys = [key for key, value in self._data.items() if predicate(key, value)]
+            for key in keys:
+                self._pop(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._size = 0
+
+    def _pop(self, key: Hashable):
+        if key in self._data:
+            del self._data[key]
+            self._size -= self._sizes.pop(key)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """缓存命中统计"""
+        with self._lock:
+            return {
+                "items": len(self._data),
+                "size": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
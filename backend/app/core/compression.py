@@ -0,0 +1,109 @@
+"""
+文本压缩编解码
+
+压缩后的值为 bytes，首字节标识压缩算法，其余为压缩数据；未压缩的值保持为 str。
+zstd 需要安装可选依赖 zstandard，未安装时使用 zlib。
+"""
+import threading
+import time
+import zlib
+from typing import Optional, Union
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖
+    zstandard = None
+
+HEADER_ZLIB = 0x01
+HEADER_ZSTD = 0x02
+
+CODECS = {"zlib": HEADER_ZLIB, "zstd": HEADER_ZSTD}
+CODEC_NAMES = {header: name for name, header in CODECS.items()}
+
+
+class CompressionError(RuntimeError):
+    """无法解压（未知的头字节或缺少对应的解压库）"""
+    pass
+
+
+def available_codecs():
+    return [name for name in CODECS if name != "zstd" or zstandard is not None]
+
+
+def resolve_codec(name: Optional[str]) -> str:
+    """将配置的算法名解析为可用算法，auto 或不可用时优先 zstd、其次 zlib"""
+    if name in available_codecs():
+        return name
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def compress(text: str, codec: str = "zlib", threshold: int = 0) -> Union[str, bytes]:
+    """
+    压缩文本，低于阈值（字节）或压缩后不更小时原样返回 str
+    """
+    raw = text.encode("utf-8")
+    if len(raw) < threshold:
+        return text
+    data = encode(raw, codec)
+    if len(data) >= len(raw):
+        return text
+    return data
+
+
+def encode(raw: bytes, codec: str = "zlib") -> bytes:
+    """无条件压缩字节串，返回带头字节的数据"""
+    if codec == "zstd":
+        return bytes([HEADER_ZSTD]) + zstandard.ZstdCompressor(level=10).compress(raw)
+    return bytes([HEADER_ZLIB]) + zlib.compress(raw, 6)
+
+
+class DecodeStats:
+    """解压次数与耗时统计（用于评估解压开销）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.seconds = 0.0
+        self.compressed_bytes = 0
+        self.raw_bytes = 0
+
+    def record(self, seconds: float, compressed_bytes: int, raw_bytes: int):
+        with self._lock:
+            self.rows += 1
+            self.seconds += seconds
+            self.compressed_bytes += compressed_bytes
+            self.raw_bytes += raw_bytes
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "rows": self.rows,
+                "total_ms": round(self.seconds * 1000, 3),
+                "avg_us_per_row": round(self.seconds * 1e6 / self.rows, 2) if self.rows else None,
+                "ratio": round(self.compressed_bytes / self.raw_bytes, 4) if self.raw_bytes else None,
+            }
+
+
+decode_stats = DecodeStats()
+
+
+def decode(data: bytes) -> bytes:
+    """按头字节解压 encode 的结果"""
+    header, payload = data[0], bytes(data[1:])
+    if header == HEADER_ZLIB:
+        return zlib.decompress(payload)
+    if header == HEADER_ZSTD:
+        if zstandard is None:
+            raise CompressionError("数据使用 zstd 压缩，但未安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    raise CompressionError(f"未知的压缩头字节: {header:#04x}")
+
+
+def decompress(value: Union[str, bytes, None]) -> Optional[str]:
+    """还原 compress 的结果，str 原样返回"""
+    if value is None or isinstance(value, str):
+        return value
+    started = time.perf_counter()
+    raw = decode(value)
+    decode_stats.record(time.perf_counter() - started, len(value), len(raw))
+    return raw.decode("utf-8")
@@ -0,0 +1,196 @@
+"""
+响应压缩中间件
+
+按请求的 Accept-Encoding 协商 br（brotli 已列入 requirements.txt，未安装时只用 gzip）或 gzip，只压缩文本类响应：
+完整响应体小于阈值时原样返回；流式响应（如 NDJSON 导出）逐块压缩并立即刷新，
+客户端无需等待整个响应结束即可解压已收到的行。已带 Content-Encoding 的响应不会再次压缩。
+可压缩的响应无论是否实际压缩（未达阈值、请求不接受压缩）都带 Vary: Accept-Encoding，
+避免共享缓存（如 nginx proxy_cache）把一种编码的响应返回给另一类客户端。
+"""
+import os
+import zlib
+from typing import List, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+ENABLED = os.getenv("RESPONSE_COMPRESSION", "true").lower() == "true"
+# 小于该字节数的完整响应不压缩
+MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_COMPRESSION_GZIP_LEVEL", "6"))
+# brotli 质量 0-11：动态内容取 4 左右，压缩率接近 gzip 9 而速度与 gzip 6 相当
+BROTLI_QUALITY = int(os.getenv("RESPONSE_COMPRESSION_BROTLI_QUALITY", "4"))
+# 超过该字节数的块在线程池中压缩（zlib / brotli 压缩时释放GIL），避免阻塞事件循环
+THREADPOOL_SIZE = 64 * 1024
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "application/problem+json",
+    "application/javascript", "application/xml", "text/",
+)
+
+
+def available_encodings() -> List[str]:
+    """按优先级排列的可用编码"""
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def negotiate(accept_encoding: str, encodings: Optional[List[str]] = None) -> Optional[str]:
+    """按 Accept-Encoding 的 q 值选择编码，q 相同时按 encodings 的优先级；不可压缩时返回None"""
+    encodings = encodings if encodings is not None else available_encodings()
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class _Encoder:
+    """一个响应的增量压缩器"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            output = self._compressor.process(data) if data else b""
+            return output + self._compressor.flush() if flush else output
+        output = self._compressor.compress(data)
+        return output + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else output
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return (self._compressor.process(data) if data else b"") + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+    async def run(self, data: bytes, more_body: bool) -> bytes:
+        """压缩一块响应体，more_body 为 False 时结束压缩流"""
+        if len(data) >= THREADPOOL_SIZE:
+            if more_body:
+                return await run_in_threadpool(self.compress, data, True)
+            return await run_in_threadpool(self.finish, data)
+        return self.compress(data, flush=True) if more_body else self.finish(data)
+
+
+class CompressionMiddleware:
+    """纯 ASGI 中间件：不缓冲流式响应，只在需要时改写响应头"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        await _CompressingSender(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressingSender:
+
+    def __init__(self, app: ASGIApp, encoding: Optional[str], minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Optional[Send] = None
+        self.start_message: Optional[Message] = None
+        self.encoder: Optional[_Encoder] = None
+        self.passthrough = False
+        self.buffer = b""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    def _compressible(self, headers: Headers) -> bool:
+        if self.start_message["status"] < 200 or self.start_message["status"] in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _rewrite_headers(self) -> MutableHeaders:
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        # 压缩后的字节与原表示不同，强 ETag 降为弱 ETag（与 nginx gzip 的处理一致）
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+        return headers
+
+    async def send_wrapper(self, message: Message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # 等到第一块响应体再决定是否压缩
+            self.start_message = message
+            compressible = self._compressible(Headers(raw=message["headers"]))
+            # 304 响应须带与完整响应相同的 Vary
+            if compressible or message["status"] == 304:
+                MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+            self.passthrough = not compressible or self.encoding is None
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.encoder is None:
+            # 响应体可能分多块到达（如经过 BaseHTTPMiddleware），先缓冲到阈值再决定是否压缩
+            self.buffer += body
+            if more_body and len(self.buffer) < self.minimum_size:
+                return
+            body, self.buffer = self.buffer, b""
+            if not more_body:
+                if len(body) < self.minimum_size:
+                    await self.send(self.start_message)
+                    await self.send({"type": "http.response.body", "body": body})
+                    return
+                # 完整响应：一次压缩并给出准确的 Content-Length
+                compressed = await _Encoder(self.encoding).run(body, more_body=False)
+                headers = self._rewrite_headers()
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            # 流式响应：去掉 Content-Length，逐块压缩
+            self.encoder = _Encoder(self.encoding)
+            headers = self._rewrite_headers()
+            del headers["Content-Length"]
+            await self.send(self.start_message)
+
+        chunk = await self.encoder.run(body, more_body)
+        if more_body:
+            if chunk:
+                await self.send({"type": "http.response.body", "body": chunk, "more_body": True})
+        else:
+            await self.send({"type": "http.response.body", "body": chunk})
@@ -0,0 +1,77 @@
+import hashlib
+from typing import Any, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from .responses import to_json
+
+# 可以缓存，但每次使用前须向服务器验证
+REVALIDATE = "no-cache"
+
+
+def make_etag(*parts: Any, weak: bool = True) -> str:
+    """由资源标识和版本信息（ID、更新时间、计数等）计算 ETag"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def body_etag(body: bytes, weak: bool = True) -> str:
+    """由响应体内容计算 ETag（没有更廉价的版本信息时使用）；预先序列化的固定字节可用强 ETag"""
+    digest = hashlib.sha1(body).hexdigest()[:32]
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def _opaque(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 使用弱比较：忽略 W/ 前缀，支持多个值和 *"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = _opaque(etag)
+    return any(_opaque(candidate.strip()) == opaque for candidate in if_none_match.split(","))
+
+
+def conditional(request: Request, response: Response, etag: str,
+                cache_control: str = REVALIDATE) -> Optional[Response]:
+    """
+    为响应设置 ETag 和 Cache-Control；请求的 If-None-Match 命中时返回 304 响应
+
+    应在加载和序列化响应体之前调用，命中时直接返回该 304 响应
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def cached_response(request: Request, etag: str, cache_control: str, body: bytes,
+                    media_type: str = "application/json") -> Response:
+    """返回已序列化的响应体；If-None-Match 命中时返回 304"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+class PrecomputedResponse(NamedTuple):
+    """
+    预先序列化的响应体及其强 ETag
+
+    用于静态或很少变化的响应（提供商模板、模型列表等）：启动时或内容变化时构建一次，
+    之后每次请求只需比较 If-None-Match 并返回现成的字节
+    """
+    body: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, content: Any) -> "PrecomputedResponse":
+        body = to_json(content)
+        return cls(body, body_etag(body, weak=False))
+
+    def respond(self, request: Request, cache_control: str = REVALIDATE) -> Response:
+        return cached_response(request, self.etag, cache_control, self.body)
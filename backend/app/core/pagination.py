@@ -0,0 +1,34 @@
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析或与当前查询不匹配"""
+    pass
+
+
+def encode_cursor(sort: str, values: List[Any], page: int = 1) -> str:
+    """将排序键和页码编码为不透明的URL安全游标"""
+    payload = json.dumps({"s": sort, "v": values, "p": page}, separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], sort: str) -> Tuple[Optional[List[Any]], int]:
+    """
+    解析游标，返回 (排序键值列表, 页码)
+    游标为空时返回 (None, 1)，即从第一页开始
+    """
+    if not cursor:
+        return None, 1
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        values = payload["v"]
+        if payload["s"] != sort or not isinstance(values, list):
+            raise InvalidCursorError("游标与当前排序方式不匹配")
+        return values, int(payload.get("p", 1))
+    except InvalidCursorError:
+        raise
+    except Exception as e:
+        raise InvalidCursorError(f"无效的游标: {e}")
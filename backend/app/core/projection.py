@@ -0,0 +1,66 @@
+from typing import Iterable, List, Optional
+
+
+class InvalidFieldsError(ValueError):
+    """请求了不存在或不允许的字段"""
+    pass
+
+
+def parse_csv(value: Optional[str]) -> Optional[List[str]]:
+    """解析逗号分隔的查询参数，空值返回None"""
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def select_fields(value: Optional[str], allowed: Iterable[str], always: Iterable[str] = ("id",)) -> List[str]:
+    """
+    解析 ?fields= 参数，返回需要输出的字段列表（保持 allowed 中的顺序）
+    未指定时返回全部允许字段；always 中的字段始终包含
+    """
+    allowed = list(allowed)
+    requested = parse_csv(value)
+    if requested is None:
+        return allowed
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise InvalidFieldsError(f"不支持的字段: {', '.join(unknown)}；可选字段: {', '.join(allowed)}")
+    wanted = set(requested) | set(always)
+    return [name for name in allowed if name in wanted]
+
+
+# 批量获取接口一次最多接受的ID数
+MAX_BATCH_IDS = 200
+
+
+def parse_ids(value: str, max_items: int = MAX_BATCH_IDS) -> List[int]:
+    """解析逗号分隔的ID列表（去重并保持顺序）"""
+    ids = []
+    for item in parse_csv(value) or []:
+        try:
+            ids.append(int(item))
+        except ValueError:
+            raise InvalidFieldsError(f"无效的ID: {item}")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise InvalidFieldsError("至少需要一个ID")
+    if len(ids) > max_items:
+        raise InvalidFieldsError(f"一次最多获取 {max_items} 个ID")
+    return ids
+
+
+def select_includes(value: Optional[str], allowed: Iterable[str], default: Iterable[str]) -> List[str]:
+    """解析 ?include= 参数，返回需要嵌入的关联数据名称"""
+    allowed = list(allowed)
+    requested = parse_csv(value)
+    if requested is None:
+        return list(default)
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise InvalidFieldsError(f"不支持的关联数据: {', '.join(unknown)}；可选: {', '.join(allowed)}")
+    return requested
+
+
+def project(obj, fields: Iterable[str]) -> dict:
+    """从ORM对象中只读取指定字段（字段须已加载，避免触发额外查询）"""
+    return {name: getattr(obj, name) for name in fields}
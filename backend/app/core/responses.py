@@ -0,0 +1,72 @@
+"""
+快速JSON响应
+
+FastAPI 默认对返回值按 response_model 重新校验、转为Python基本类型后再用 json.dumps 编码。
+高流量端点直接返回 FastJSONResponse：Pydantic 模型由 pydantic-core 一步序列化为JSON字节，
+其他内容使用 orjson 编码（orjson 已列入 requirements.txt，未安装时退回 json）。
+response_model 仍保留在路由上，用于生成接口文档。
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Mapping, Optional
+
+from fastapi import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """orjson / json 不能直接编码的类型"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"无法序列化为JSON的类型: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """将任意内容编码为紧凑的UTF-8 JSON字节"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def to_json(content: Any, exclude_unset: bool = False, exclude_none: bool = False) -> bytes:
+    """Pydantic 模型直接序列化，其他内容按 dumps 编码"""
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content, exclude_unset=exclude_unset, exclude_none=exclude_none)
+    return dumps(content)
+
+
+class FastJSONResponse(Response):
+    """
+    直接序列化的JSON响应
+
+    content 为 Pydantic 模型时按 exclude_unset / exclude_none 直接输出JSON，与路由上
+    response_model_exclude_unset 等参数的效果一致；端点返回响应对象时 FastAPI 不再合并
+    注入的 Response 上设置的头，需要通过 headers 传入。
+    """
+    media_type = "application/json"
+
+    def __init__(self, content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None,
+                 exclude_unset: bool = False, exclude_none: bool = False, **kwargs):
+        self.exclude_unset = exclude_unset
+        self.exclude_none = exclude_none
+        super().__init__(content, status_code=status_code, headers=headers, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content, self.exclude_unset, self.exclude_none)
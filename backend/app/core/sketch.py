@@ -0,0 +1,92 @@
+import math
+from typing import Dict, Optional
+
+
+class QuantileSketch:
+    """
+    可合并的分位数草图（对数分桶，参考 DDSketch）
+
+    正值按 gamma = (1+α)/(1-α) 的对数分桶，只保存每个桶的计数，
+    估计的分位数相对误差不超过 α；两个草图按桶相加即可合并，权重为负时表示移除。
+    桶数超过 max_bins 时合并最小的桶（只影响最低分位数的精度）。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 1024):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def add(self, value: Optional[float], weight: int = 1):
+        if value is None:
+            return
+        if value <= 0:
+            self.zero_count += weight
+            return
+        key = self._key(value)
+        count = self.bins.get(key, 0) + weight
+        if count > 0:
+            self.bins[key] = count
+        else:
+            self.bins.pop(key, None)
+        self._collapse()
+
+    def merge(self, other: "QuantileSketch"):
+        self.zero_count += other.zero_count
+        for key, count in other.bins.items():
+            total = self.bins.get(key, 0) + count
+            if total > 0:
+                self.bins[key] = total
+            else:
+                self.bins.pop(key, None)
+        self._collapse()
+
+    def _collapse(self):
+        if len(self.bins) <= self.max_bins:
+            return
+        keys = sorted(self.bins)
+        overflow = keys[:len(keys) - self.max_bins + 1]
+        self.bins[overflow[-1]] = sum(self.bins.pop(key) for key in overflow[:-1]) + self.bins[overflow[-1]]
+
+    def quantile(self, q: float) -> Optional[float]:
+        """估计第 q 分位数（0 <= q <= 1），没有数据时返回None"""
+        total = self.count
+        if total <= 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return self._value(key)
+        return self._value(max(self.bins))
+
+    def to_dict(self) -> dict:
+        return {
+            "a": self.relative_accuracy,
+            "z": self.zero_count,
+            "b": {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "QuantileSketch":
+        if not data:
+            return cls()
+        sketch = cls(relative_accuracy=data.get("a", 0.01))
+        sketch.zero_count = data.get("z", 0)
+        sketch.bins = {int(key): count for key, count in data.get("b", {}).items()}
+        return sketch
@@ -0,0 +1,145 @@
+"""
+提示词模板 - {{变量}} 占位符的编译与渲染
+
+模板只解析一次：编译为以位置参数代替变量的格式串，渲染时一次 str.format 即可完成拼接，
+批量渲染同一模板的大量输入行时不再重复扫描模板文本。编译结果按内容的SHA-256缓存，
+内容相同的模板（不同提示词版本、模板记录或修改前后）共用同一个编译结果。
+变量名由字母、数字、下划线（含中文）组成，花括号内允许空白：{{ name }}。
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from .cache import LRUCache
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+# 形似占位符的片段，用于校验时找出无法识别的写法（如 {{user-name}}）
+_CANDIDATE = re.compile(r"\{\{(.*?)\}\}", re.DOTALL)
+
+CACHE_MAX_ITEMS = int(os.getenv("TEMPLATE_CACHE_MAX_ITEMS", "1024"))
+
+
+class MissingVariablesError(KeyError):
+    """渲染时缺少模板变量"""
+
+    def __init__(self, names: List[str]):
+        self.names = names
+        super().__init__(names)
+
+    def __str__(self) -> str:
+        return f"缺少模板变量: {', '.join(self.names)}"
+
+
+def _to_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class CompiledTemplate:
+    """编译后的模板（不可变，可在线程间共享）"""
+    __slots__ = ("source", "variables", "_format")
+
+    def __init__(self, source: str):
+        parts = _PLACEHOLDER.split(source)
+        self.source = source
+        # split 的结果中偶数位是文本片段，奇数位是变量名；变量按首次出现的顺序去重
+        self.variables: Tuple[str, ...] = tuple(dict.fromkeys(parts[1::2]))
+        positions = {name: index for index, name in enumerate(self.variables)}
+        pieces = []
+        for index, part in enumerate(parts):
+            if index % 2:
+                pieces.append(f"{{{positions[part]}}}")
+            else:
+                pieces.append(part.replace("{", "{{").replace("}", "}}"))
+        self._format = "".join(pieces)
+
+    def missing(self, values: Mapping[str, Any]) -> List[str]:
+        return [name for name in self.variables if name not in values]
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        if not self.variables:
+            return self.source
+        try:
+            return self._format.format(*[_to_text(values[name]) for name in self.variables])
+        except KeyError:
+            raise MissingVariablesError(self.missing(values))
+
+    def render_many(self, rows: Iterable[Mapping[str, Any]]) -> Tuple[List[Optional[str]], Dict[int, str]]:
+        """
+        逐行渲染；返回与输入行一一对应的结果（失败的行为None）和 行号 -> 错误信息
+
+        一行缺少变量不影响其他行
+        """
+        texts: List[Optional[str]] = []
+        errors: Dict[int, str] = {}
+        render_format = self._format.format
+        names = self.variables
+        for index, row in enumerate(rows):
+            try:
+                texts.append(render_format(*[_to_text(row[name]) for name in names]))
+            except KeyError:
+                texts.append(None)
+                errors[index] = str(MissingVariablesError(self.missing(row)))
+            except TypeError:
+                texts.append(None)
+                errors[index] = "输入行必须是对象"
+        return texts, errors
+
+
+class TemplateCheck(NamedTuple):
+    """模板变量的校验结果"""
+    variables: List[str]  # 模板中使用的变量
+    undeclared: List[str]  # 使用了但未在变量定义中声明
+    unused: List[str]  # 声明了但模板中未使用
+    invalid: List[str]  # 无法识别的占位符
+
+    @property
+    def valid(self) -> bool:
+        return not self.undeclared and not self.invalid
+
+
+def check(template: CompiledTemplate, declared: Optional[Iterable[str]] = None) -> TemplateCheck:
+    """
+    校验模板：找出无法识别的占位符；declared 不为 None 时同时比对变量定义
+
+    未声明的变量和无效占位符视为错误，声明了但未使用的变量只作提示
+    """
+    invalid = [match.group(0) for match in _CANDIDATE.finditer(template.source)
+               if not _PLACEHOLDER.fullmatch(match.group(0))]
+    if declared is None:
+        return TemplateCheck(list(template.variables), [], [], invalid)
+    declared = list(dict.fromkeys(declared))
+    declared_set = set(declared)
+    used = set(template.variables)
+    return TemplateCheck(
+        variables=list(template.variables),
+        undeclared=[name for name in template.variables if name not in declared_set],
+        unused=[name for name in declared if name not in used],
+        invalid=invalid,
+    )
+
+
+_compiled = LRUCache(max_items=CACHE_MAX_ITEMS)
+
+
+def content_hash(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def compile_template(source: str, digest: Optional[str] = None) -> CompiledTemplate:
+    """编译模板；按内容哈希缓存编译结果（已知内容的SHA-256时可通过 digest 传入）"""
+    key = digest or content_hash(source)
+    template = _compiled.get(key)
+    if template is None:
+        template = CompiledTemplate(source)
+        _compiled.set(key, template)
+    return template
+
+
+def cache_stats() -> dict:
+    return _compiled.stats()
@@ -57,4 +57,58 @@ def create_tables():
     """
     # 导入所有模型以确保它们被注册到Base.metadata中
     from .models import prompt, api_config
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+    from sqlalchemy import inspect
+
+    with engine.begin() as conn:
+        # 新建的数据库使用增量自动清理，归档删除的空间可通过 PRAGMA incremental_vacuum 归还
+        if not inspect(conn).get_table_names():
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        Base.metadata.create_all(bind=conn)
+    ensure_columns()
+    # 旧数据中可能存在重复的版本号，须在建立唯一索引前修正
+    from .services import prompt_service
+    prompt_service.deduplicate_version_numbers(engine)
+    ensure_indexes()
+
+    # 内容块与版本内容存储、结果归档与统计、标签索引、全文搜索索引和用量汇总（同时注册ORM同步事件）
+    from .services import (
+        blob_store, version_store, archive_service, stats_service, tag_service, search_service, analytics_service,
+        catalog_cache, config_snapshot
+    )
+    archive_service.ensure_result_autoincrement(engine)
+    stats_service.ensure_stats(engine)
+    tag_service.ensure_tag_index(engine)
+    search_service.ensure_search_index(engine)
+    analytics_service.ensure_rollups(engine)
+    catalog_cache.ensure_generation(engine)
+
+
+def ensure_columns():
+    """
+    为已存在的表补加模型中新增的列（仅支持可为空的列）
+    项目未使用迁移工具，新增列通过 ALTER TABLE ADD COLUMN 自动补齐
+    """
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+
+
+def ensure_indexes():
+    """
+    为已存在的表补建模型中新增的索引
+    create_all 只会为新建的表创建索引，旧数据库需要单独补齐
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True) 
\ No newline at end of file
@@ -5,12 +5,13 @@ from typing import List
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from .routers import prompts, versions, llm, api_config
+from .routers import prompts, versions, llm, api_config, search, tags, analytics, library, run, templates
 from .database import engine, create_tables
 from .models import prompt as models
 from .core.security import get_security_headers, SecurityError
 from .core.logging import setup_logging, get_logger
 from .core.monitoring import metrics_collector, health_checker
+from .core import content_encoding
 
 # 初始化日志系统
 setup_logging()
@@ -33,6 +34,12 @@ app = FastAPI(
     redoc_url="/api/redoc"
 )
 
+# 响应压缩：按 Accept-Encoding 协商 br / gzip，超过阈值的文本响应才压缩
+# 最先注册即位于最内层，完整响应体一次到达，可以给出压缩后的 Content-Length
+if content_encoding.ENABLED:
+    app.add_middleware(content_encoding.CompressionMiddleware)
+    logger.info(f"响应压缩已启用: {', '.join(content_encoding.available_encodings())}，阈值 {content_encoding.MIN_SIZE} 字节")
+
 # 添加性能监控中间件
 @app.middleware("http")
 async def performance_monitoring_middleware(request: Request, call_next):
@@ -148,6 +155,12 @@ try:
     app.include_router(versions.router)
     app.include_router(llm.router)
     app.include_router(api_config.router)
+    app.include_router(search.router)
+    app.include_router(tags.router)
+    app.include_router(analytics.router)
+    app.include_router(library.router)
+    app.include_router(run.router)
+    app.include_router(templates.router)
     logger.info("所有路由加载成功")
 except Exception as e:
     logger.error(f"路由加载失败: {e}")
@@ -222,23 +235,19 @@ def health_check():
 def config_status():
     """配置状态检查端点 - 用于前端检查是否需要初始配置"""
     try:
-        from .models.api_config import LLMAPIConfig
-        from .database import SessionLocal
+        from .services import config_snapshot
         
-        db = SessionLocal()
-        try:
-            total_configs = db.query(LLMAPIConfig).count()
-            enabled_configs = db.query(LLMAPIConfig).filter(LLMAPIConfig.is_enabled == True).count()
-            
-            return {
-                "status": "ok",
-                "total_configs": total_configs,
-                "enabled_configs": enabled_configs,
-                "needs_setup": total_configs == 0,
-                "deployment_mode": "zero-config"
-            }
-        finally:
-            db.close()
+        # 与 /api/v1/api-config 共用配置快照，未变更时只执行一次变更戳查询
+        with engine.connect() as connection:
+            status = config_snapshot.get_snapshot(connection).status
+        
+        return {
+            "status": "ok",
+            "total_configs": status.total_configs,
+            "enabled_configs": status.enabled_configs,
+            "needs_setup": status.total_configs == 0,
+            "deployment_mode": "zero-config"
+        }
     except Exception as e:
         logger.error(f"配置状态检查失败: {e}")
         return {
@@ -274,11 +283,31 @@ async def startup_event():
         "deployment_mode": "zero-config"
     })
 
+    from .services import result_compression, archive_service, analytics_service, result_writer, template_service
+    # 单条结果写入经由组提交队列
+    result_writer.start_writer(engine)
+    # 后台分批压缩已有的结果输出
+    result_compression.start_background_migration(engine)
+    # 按保留策略周期归档旧结果
+    archive_service.start_background_archiver(engine)
+    # 周期将用量缓冲写入汇总表
+    analytics_service.start_background_flush(engine)
+    # 周期将模板使用次数写入数据库
+    template_service.start_background_flush(engine)
+
 # 应用关闭事件
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时执行"""
     logger.info("应用正在关闭")
+
+    from .services import result_compression, archive_service, analytics_service, result_writer, template_service
+    # 先写完队列中的结果，用量汇总随后一并写入
+    result_writer.stop_writer()
+    result_compression.stop_background_migration()
+    archive_service.stop_background_archiver()
+    analytics_service.stop_background_flush(engine)
+    template_service.stop_background_flush(engine)
     
     # 导出指标（如果启用）
     if os.getenv("ENABLE_METRICS", "false").lower() == "true":
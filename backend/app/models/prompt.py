@@ -1,11 +1,30 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float, JSON, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float, JSON, Boolean, Index, LargeBinary
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from .base import Base
+from .types import CompressedText
+
+
+def _columns_for(cls, fields, stored_fields):
+    """将对外字段名转换为列属性，stored_fields 中的字段展开为其存储列"""
+    columns = []
+    for name in fields:
+        columns.extend(getattr(cls, column) for column in stored_fields.get(name, (name,)))
+    return columns
+
 
 class Prompt(Base):
     """提示词项目主体 - 管理提示词的基本信息和元数据"""
     __tablename__ = "prompts"
+    __table_args__ = (
+        # 列表页按 (排序列, id) 做键集分页，筛选列在前以便同时命中过滤和排序
+        Index("ix_prompts_updated_at_id", "updated_at", "id"),
+        Index("ix_prompts_created_at_id", "created_at", "id"),
+        Index("ix_prompts_title_id", "title", "id"),
+        Index("ix_prompts_category_updated_at_id", "category", "updated_at", "id"),
+        Index("ix_prompts_framework_type_updated_at_id", "framework_type", "updated_at", "id"),
+        Index("ix_prompts_is_template_updated_at_id", "is_template", "updated_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False, index=True)
@@ -15,25 +34,56 @@ class Prompt(Base):
     is_public = Column(Boolean, default=False)  # 是否公开分享
     is_template = Column(Boolean, default=False)  # 是否为模板
     framework_type = Column(String(50), nullable=True)  # 使用的框架：CO-STAR, RTF, TAG等
+    version_counter = Column(Integer, nullable=True)  # 最后分配的版本号（见 services/prompt_service.py）
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # 关系
-    versions = relationship("PromptVersion", back_populates="prompt", cascade="all, delete-orphan")
+    versions = relationship(
+        "PromptVersion", back_populates="prompt", cascade="all, delete-orphan",
+        order_by="PromptVersion.version_number"
+    )
     
     def __repr__(self):
         return f"<Prompt(id={self.id}, title='{self.title}')>"
 
 
+class PromptTag(Base):
+    """提示词标签索引 - Prompt.tags 的规范化副本，供按标签的索引查询和分面统计使用"""
+    __tablename__ = "prompt_tags"
+    __table_args__ = (
+        Index("ix_prompt_tags_tag_prompt_id", "tag", "prompt_id"),
+    )
+
+    prompt_id = Column(Integer, ForeignKey("prompts.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String(100), primary_key=True)
+
+    def __repr__(self):
+        return f"<PromptTag(prompt_id={self.prompt_id}, tag='{self.tag}')>"
+
+
 class PromptVersion(Base):
     """提示词版本 - 管理提示词的具体版本实现"""
     __tablename__ = "prompt_versions"
+    __table_args__ = (
+        # 按内容哈希查找相同内容的版本
+        Index("ix_prompt_versions_content_hash", "content_hash"),
+        # 同一提示词的版本号唯一（并发创建版本时的最后防线）
+        Index("ux_prompt_versions_prompt_id_version_number", "prompt_id", "version_number", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     prompt_id = Column(Integer, ForeignKey("prompts.id"), nullable=False, index=True)
     version_number = Column(Integer, nullable=False)  # 版本号：1, 2, 3...
     version_name = Column(String(100), nullable=True)  # 版本名称：如 "优化后的版本"
-    content = Column(Text, nullable=False)  # 提示词内容
+    
+    # 内容存储（见 services/version_store.py），通过 content 属性透明读写
+    _content = Column("content", Text, nullable=False, default="")  # 旧数据的明文内容，压缩存储后为空
+    content_encoding = Column(String(10), nullable=True)  # None: 明文, full: 压缩全文, blob: 共享内容块（关键帧）, delta: 压缩差量
+    content_data = Column(LargeBinary, nullable=True)  # 压缩后的全文或差量
+    base_version_id = Column(Integer, nullable=True, index=True)  # 差量所基于的版本ID
+    delta_depth = Column(Integer, nullable=True)  # 距最近关键帧的差量层数
+    content_hash = Column(String(64), nullable=True)  # 完整内容的SHA-256；blob 编码时引用 content_blobs.hash
     
     # LLM参数配置
     llm_config = Column(JSON, nullable=True)  # LLM配置：provider, model, temperature等
@@ -45,8 +95,34 @@ class PromptVersion(Base):
     
     # 关系
     prompt = relationship("Prompt", back_populates="versions")
-    optimization_results = relationship("OptimizationResult", back_populates="version", cascade="all, delete-orphan")
+    optimization_results = relationship(
+        "OptimizationResult", back_populates="version", cascade="all, delete-orphan",
+        order_by="OptimizationResult.id"
+    )
     
+    # ?fields= 中的 content 对应的存储列
+    CONTENT_COLUMNS = ("_content", "content_encoding", "content_data", "base_version_id", "delta_depth", "content_hash")
+
+    @property
+    def content(self) -> str:
+        """提示词内容（按需从压缩存储中还原）"""
+        text = getattr(self, "_content_text", None)
+        if text is None:
+            from ..services.version_store import resolve_content
+            text = resolve_content(self)
+        return text
+
+    @content.setter
+    def content(self, value: str):
+        # 实际编码在 flush 时由 version_store 完成
+        self._content_text = value
+        self._content = value
+
+    @classmethod
+    def columns_for(cls, fields):
+        """将对外字段名转换为需要加载的列属性"""
+        return _columns_for(cls, fields, {"content": cls.CONTENT_COLUMNS})
+
     def __repr__(self):
         return f"<PromptVersion(id={self.id}, prompt_id={self.prompt_id}, version={self.version_number})>"
 
@@ -54,13 +130,25 @@ class PromptVersion(Base):
 class OptimizationResult(Base):
     """优化测试结果 - 存储提示词版本的测试结果和性能指标"""
     __tablename__ = "optimization_results"
+    __table_args__ = (
+        # 结果列表按版本筛选时间范围、提供商和模型
+        Index("ix_optimization_results_version_id_created_at", "version_id", "created_at"),
+        Index("ix_optimization_results_version_id_provider_model", "version_id", "llm_provider", "llm_model"),
+        # “该版本是否已在此输入上运行过”按输入哈希查找
+        Index("ix_optimization_results_version_id_test_input_hash", "version_id", "test_input_hash"),
+        # 结果ID不重用：归档后删除的结果ID仍被 archived_results 引用（旧数据库见 archive_service.ensure_result_autoincrement）
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     version_id = Column(Integer, ForeignKey("prompt_versions.id"), nullable=False, index=True)
     
     # 输入输出数据
-    test_input = Column(Text, nullable=True)  # 测试输入（如果有）
-    output_text = Column(Text, nullable=False)  # LLM输出文本
+    # 测试输入（如果有）：去重存储在 content_blobs 中（见 services/blob_store.py），通过 test_input 属性透明读写
+    _test_input = Column("test_input", Text, nullable=True)  # 旧数据的明文输入，去重存储后为空
+    test_input_hash = Column(String(64), nullable=True)  # 引用 content_blobs.hash
+    # LLM输出文本：超过阈值时压缩存储（见 models/types.py），延迟到访问时才读取和解压
+    output_text = deferred(Column(CompressedText, nullable=False))
     
     # 性能指标
     execution_time = Column(Float, nullable=True)  # 执行时间（秒）
@@ -86,11 +174,164 @@ class OptimizationResult(Base):
     
     # 关系
     version = relationship("PromptVersion", back_populates="optimization_results")
-    
+
+    # ?fields= 中的 test_input 对应的存储列
+    TEST_INPUT_COLUMNS = ("_test_input", "test_input_hash")
+
+    @property
+    def test_input(self):
+        """测试输入（按需从内容块中读取）"""
+        if "_test_input_text" in self.__dict__:
+            return self.__dict__["_test_input_text"]
+        if self.test_input_hash is None:
+            return self._test_input
+        from ..services.blob_store import resolve_text
+        return resolve_text(self, self.test_input_hash)
+
+    @test_input.setter
+    def test_input(self, value):
+        # 实际写入内容块在 flush 时由 blob_store 完成
+        self._test_input_text = value
+        self._test_input = value
+        self.test_input_hash = None
+
+    @classmethod
+    def columns_for(cls, fields):
+        """将对外字段名转换为需要加载的列属性"""
+        return _columns_for(cls, fields, {"test_input": cls.TEST_INPUT_COLUMNS})
+
     def __repr__(self):
         return f"<OptimizationResult(id={self.id}, version_id={self.version_id}, rating={self.user_rating})>"
 
 
+class VersionStats(Base):
+    """版本结果统计 - 每次写入结果时增量更新（见 services/stats_service.py），读取无需扫描结果"""
+    __tablename__ = "version_stats"
+
+    version_id = Column(Integer, primary_key=True, autoincrement=False)
+    result_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    execution_time_sum = Column(Float, nullable=False, default=0)
+    execution_time_count = Column(Integer, nullable=False, default=0)
+    execution_time_sketch = Column(JSON, nullable=True)  # 执行时间的可合并分位数草图（core/sketch.py）
+    input_tokens_sum = Column(Integer, nullable=False, default=0)
+    output_tokens_sum = Column(Integer, nullable=False, default=0)
+    total_tokens_sum = Column(Integer, nullable=False, default=0)
+    cost_sum = Column(Float, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<VersionStats(version_id={self.version_id}, count={self.result_count})>"
+
+
+class CatalogGeneration(Base):
+    """目录缓存代数 - 提示词或版本每次变更时加一，各进程据此丢弃过期的本地缓存（见 services/catalog_cache.py）"""
+    __tablename__ = "catalog_generation"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # 只有一行，id 为 1
+    generation = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CatalogGeneration({self.generation})>"
+
+
+class UsageRollup(Base):
+    """用量汇总 - 按分钟/小时/天、来源、提供商和模型汇总的调用量、用量和延迟（见 services/analytics_service.py）"""
+    __tablename__ = "usage_rollups"
+
+    granularity = Column(String(10), primary_key=True)  # minute / hour / day
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)  # 时间桶起点（UTC）
+    source = Column(String(20), primary_key=True)  # generate: /llm/generate 调用, result: 保存的测试结果
+    provider = Column(String(50), primary_key=True)
+    model = Column(String(100), primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0)
+    latency_count = Column(Integer, nullable=False, default=0)
+    latency_sketch = Column(JSON, nullable=True)  # 延迟的可合并分位数草图（core/sketch.py）
+
+    def __repr__(self):
+        return f"<UsageRollup({self.granularity} {self.bucket_start} {self.provider}/{self.model})>"
+
+
+class IdempotencyRecord(Base):
+    """幂等键记录 - 带 Idempotency-Key 的写请求的执行状态和响应，过期后删除（见 services/idempotency.py）"""
+    __tablename__ = "idempotency_keys"
+
+    scope = Column(String(100), primary_key=True)  # 端点，如 llm.generate
+    key = Column(String(255), primary_key=True)  # 客户端提供的 Idempotency-Key
+    fingerprint = Column(String(64), nullable=False)  # 请求内容的SHA-256，同一键用于不同请求时拒绝
+    status = Column(String(20), nullable=False)  # pending: 执行中, completed: 已保存响应
+    status_code = Column(Integer, nullable=True)
+    body = Column(LargeBinary, nullable=True)  # 已序列化的响应体
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True)  # 执行中的记录过期表示原请求已中断
+
+    def __repr__(self):
+        return f"<IdempotencyRecord({self.scope} {self.key} {self.status})>"
+
+
+class ArchivedResult(Base):
+    """归档结果索引 - 已移入归档文件的优化结果及其所在的数据帧（见 services/archive_service.py）"""
+    __tablename__ = "archived_results"
+    __table_args__ = (
+        Index("ix_archived_results_version_id_id", "version_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # 原优化结果ID
+    version_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=True)  # 原结果创建时间
+    segment = Column(String(100), nullable=False)  # 归档文件名
+    frame_offset = Column(Integer, nullable=False)  # 数据帧在文件中的偏移
+    frame_length = Column(Integer, nullable=False)  # 数据帧长度（字节）
+
+    def __repr__(self):
+        return f"<ArchivedResult(id={self.id}, version_id={self.version_id}, segment='{self.segment}')>"
+
+
+class ArchivedResultStats(Base):
+    """归档结果汇总 - 每个版本已归档结果的聚合统计，无需读取归档文件"""
+    __tablename__ = "archived_result_stats"
+
+    version_id = Column(Integer, primary_key=True, autoincrement=False)
+    result_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    execution_time_sum = Column(Float, nullable=False, default=0)
+    execution_time_count = Column(Integer, nullable=False, default=0)
+    input_tokens_sum = Column(Integer, nullable=False, default=0)
+    output_tokens_sum = Column(Integer, nullable=False, default=0)
+    total_tokens_sum = Column(Integer, nullable=False, default=0)
+    cost_sum = Column(Float, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    first_created_at = Column(DateTime(timezone=True), nullable=True)
+    last_created_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ArchivedResultStats(version_id={self.version_id}, count={self.result_count})>"
+
+
+class ContentBlob(Base):
+    """内容块 - 按SHA-256寻址的去重文本存储，被版本内容和测试输入引用并计数"""
+    __tablename__ = "content_blobs"
+
+    hash = Column(String(64), primary_key=True)  # 原文的SHA-256
+    data = Column(LargeBinary, nullable=False)  # zlib 压缩后的原文
+    size = Column(Integer, nullable=False)  # 原文字节数
+    ref_count = Column(Integer, nullable=False, default=0)  # 引用计数，归零时删除
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ContentBlob(hash='{self.hash[:12]}', size={self.size}, refs={self.ref_count})>"
+
+
 class PromptTemplate(Base):
     """提示词模板 - 管理预制的高质量提示词模板"""
     __tablename__ = "prompt_templates"
@@ -0,0 +1,35 @@
+import os
+
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+from ..core import compression
+
+# 超过该字节数的文本才压缩
+COMPRESSION_THRESHOLD = int(os.getenv("OUTPUT_COMPRESSION_THRESHOLD", "1024"))
+# 压缩算法：zstd / zlib / auto（有 zstandard 时用 zstd）
+COMPRESSION_CODEC = compression.resolve_codec(os.getenv("OUTPUT_COMPRESSION_CODEC", "auto"))
+
+
+class CompressedText(TypeDecorator):
+    """
+    透明压缩的文本列
+
+    超过阈值的文本以 bytes 写入（首字节标识 zlib/zstd），其余仍为普通文本；
+    读取时按首字节解压，旧的明文行无需迁移即可读取
+    """
+    impl = Text
+    cache_ok = True
+
+    def __init__(self, threshold: int = None, codec: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.threshold = COMPRESSION_THRESHOLD if threshold is None else threshold
+        self.codec = COMPRESSION_CODEC if codec is None else compression.resolve_codec(codec)
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        return compression.compress(value, self.codec, self.threshold)
+
+    def process_result_value(self, value, dialect):
+        return compression.decompress(value)
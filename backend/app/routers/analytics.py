@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..database import get_db, engine
+from ..schemas import prompt as schemas
+from ..core.projection import select_fields, InvalidFieldsError
+from ..services import analytics_service, columnar_export
+
+router = APIRouter(
+    prefix="/api/v1/analytics",
+    tags=["analytics"]
+)
+
+
+@router.get("/usage", response_model=List[schemas.UsageSeries])
+def get_usage_series(
+    granularity: schemas.UsageGranularity = Query(schemas.UsageGranularity.HOUR, description="时间粒度"),
+    start: Optional[datetime] = Query(None, description="起始时间（UTC，含），默认结束时间前24小时"),
+    end: Optional[datetime] = Query(None, description="结束时间（UTC，不含），默认当前时间"),
+    provider: Optional[str] = Query(None, description="按提供商筛选"),
+    model: Optional[str] = Query(None, description="按模型筛选"),
+    source: Optional[str] = Query(None, description="按来源筛选：generate 或 result"),
+    group_by: schemas.UsageGroupBy = Query(schemas.UsageGroupBy.MODEL, description="分组方式"),
+    db: Session = Depends(get_db)
+):
+    """获取时间范围内按桶汇总的调用量、token、成本和延迟分位数（只读取汇总表）"""
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="起始时间必须早于结束时间")
+    try:
+        return analytics_service.query_series(
+            db.connection(), granularity.value, start, end, provider, model, source, group_by.value
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/results/export")
+def export_results_columnar(
+    format: schemas.ColumnarFormat = Query(schemas.ColumnarFormat.PARQUET, description="文件格式"),
+    prompt_id: Optional[List[int]] = Query(None, description="按提示词筛选，可重复"),
+    version_id: Optional[List[int]] = Query(None, description="按版本筛选，可重复"),
+    provider: Optional[schemas.LLMProvider] = Query(None, description="按提供商筛选"),
+    model: Optional[str] = Query(None, description="按模型筛选"),
+    created_after: Optional[datetime] = Query(None, description="创建时间下限（含）"),
+    created_before: Optional[datetime] = Query(None, description="创建时间上限（不含）"),
+    fields: Optional[str] = Query(None, description="导出列，逗号分隔；默认全部列"),
+):
+    """将优化结果（附带提示词和版本信息）导出为 Parquet 或 Arrow IPC 文件（按行组流式输出）"""
+    try:
+        columnar_export.ensure_available()
+    except columnar_export.ColumnarExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    try:
+        columns = select_fields(fields, columnar_export.COLUMN_NAMES)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    stream = columnar_export.export_stream(
+        engine.connect, format.value, columns,
+        prompt_ids=prompt_id, version_ids=version_id, provider=provider.value if provider else None,
+        model=model, created_after=created_after, created_before=created_before
+    )
+    filename = columnar_export.default_filename(format.value)
+    return StreamingResponse(
+        stream, media_type=columnar_export.MEDIA_TYPES[format.value],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
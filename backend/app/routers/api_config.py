@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
 from sqlalchemy.orm import Session
 from typing import List
 
@@ -17,7 +17,10 @@ from ..schemas.api_config import (
     TestStatus
 )
 from ..services.llm_service import DynamicLLMService
+from ..services import config_snapshot
 from ..core.security import security_manager, InputValidator, SecurityError, rate_limit
+from ..core import http_cache
+from ..core.responses import FastJSONResponse
 from datetime import datetime
 import logging
 
@@ -108,56 +111,60 @@ PROVIDER_TEMPLATES = {
     )
 }
 
+# 模板只随代码变化，启动时预先序列化并按内容计算强 ETag
+_TEMPLATES_RESPONSE = http_cache.PrecomputedResponse.of(list(PROVIDER_TEMPLATES.values()))
+_TEMPLATE_RESPONSES = {
+    name: http_cache.PrecomputedResponse.of(template) for name, template in PROVIDER_TEMPLATES.items()
+}
+
+
 @router.get("/templates", response_model=List[ProviderTemplate])
-async def get_provider_templates():
+async def get_provider_templates(request: Request):
     """获取所有提供商配置模板"""
-    return list(PROVIDER_TEMPLATES.values())
+    return _TEMPLATES_RESPONSE.respond(request)
 
 @router.get("/templates/{provider}", response_model=ProviderTemplate)
-async def get_provider_template(provider: str):
+async def get_provider_template(provider: str, request: Request):
     """获取指定提供商的配置模板"""
-    if provider not in PROVIDER_TEMPLATES:
+    if provider not in _TEMPLATE_RESPONSES:
         raise HTTPException(status_code=404, detail=f"Provider template '{provider}' not found")
-    return PROVIDER_TEMPLATES[provider]
+    return _TEMPLATE_RESPONSES[provider].respond(request)
 
 @router.get("/", response_model=List[LLMAPIConfigSchema])
-async def get_all_configs(db: Session = Depends(get_db)):
+async def get_all_configs(request: Request, db: Session = Depends(get_db)):
     """获取所有API配置"""
-    configs = db.query(LLMAPIConfig).all()
-    return configs
+    snapshot = config_snapshot.get_snapshot(db.connection())
+    return http_cache.cached_response(
+        request, snapshot.scoped_etag("all"), http_cache.REVALIDATE, snapshot.all_body
+    )
 
 @router.get("/enabled", response_model=List[LLMAPIConfigSchema])
-async def get_enabled_configs(db: Session = Depends(get_db)):
+async def get_enabled_configs(request: Request, db: Session = Depends(get_db)):
     """获取所有启用的API配置"""
-    configs = db.query(LLMAPIConfig).filter(LLMAPIConfig.is_enabled == True).all()
-    return configs
+    snapshot = config_snapshot.get_snapshot(db.connection())
+    return http_cache.cached_response(
+        request, snapshot.scoped_etag("enabled"), http_cache.REVALIDATE, snapshot.enabled_body
+    )
 
 @router.get("/status", response_model=ConfigStatusResponse)
-async def get_config_status(db: Session = Depends(get_db)):
+async def get_config_status(request: Request, db: Session = Depends(get_db)):
     """获取配置状态统计"""
-    total_configs = db.query(LLMAPIConfig).count()
-    enabled_configs = db.query(LLMAPIConfig).filter(LLMAPIConfig.is_enabled == True).count()
-    working_configs = db.query(LLMAPIConfig).filter(
-        LLMAPIConfig.is_enabled == True,
-        LLMAPIConfig.last_test_status == "success"
-    ).count()
-    
-    last_updated = db.query(LLMAPIConfig.updated_at).order_by(LLMAPIConfig.updated_at.desc()).first()
-    
-    return ConfigStatusResponse(
-        total_configs=total_configs,
-        enabled_configs=enabled_configs,
-        working_configs=working_configs,
-        last_updated=last_updated[0] if last_updated else None
+    snapshot = config_snapshot.get_snapshot(db.connection())
+    return http_cache.cached_response(
+        request, snapshot.scoped_etag("status"), http_cache.REVALIDATE, snapshot.status_body
     )
 
 @router.get("/{config_id}", response_model=LLMAPIConfigSchema)
-async def get_config(config_id: int, db: Session = Depends(get_db)):
+async def get_config(config_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """获取指定API配置"""
-    config = db.query(LLMAPIConfig).filter(LLMAPIConfig.id == config_id).first()
-    if not config:
+    snapshot = config_snapshot.get_snapshot(db.connection())
+    config = snapshot.by_id.get(config_id)
+    if config is None:
         raise HTTPException(status_code=404, detail="API配置不存在")
-    return config
+    not_modified = http_cache.conditional(request, response, snapshot.config_etag(config))
+    if not_modified is not None:
+        return not_modified
+    return FastJSONResponse(config, headers=response.headers)
 
 @router.post("/", response_model=LLMAPIConfigSchema)
 @rate_limit(max_requests=10, window=60)  # 限制API配置创建频率
@@ -352,17 +359,11 @@ async def test_config(config_id: int, test_request: APITestRequest = None, db: S
         )
 
 @router.get("/providers/available", response_model=ProvidersResponse)
-async def get_available_providers(db: Session = Depends(get_db)):
+async def get_available_providers(request: Request, db: Session = Depends(get_db)):
     """获取可用的提供商和模型信息"""
-    configs = db.query(LLMAPIConfig).filter(LLMAPIConfig.is_enabled == True).all()
-    
-    providers = [config.provider for config in configs]
-    models = {config.provider: config.supported_models for config in configs}
-    
-    return ProvidersResponse(
-        providers=providers,
-        configs=configs,
-        models=models
+    snapshot = config_snapshot.get_snapshot(db.connection())
+    return http_cache.cached_response(
+        request, snapshot.scoped_etag("providers"), http_cache.REVALIDATE, snapshot.providers_body
     )
 
 
@@ -0,0 +1,48 @@
+from datetime import datetime
+from fastapi import APIRouter, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from ..schemas import prompt as schemas
+from ..services import library_transfer, result_ingest
+
+router = APIRouter(
+    prefix="/api/v1/library",
+    tags=["library"]
+)
+
+
+@router.get("/export")
+def export_library(
+    results: bool = Query(True, description="是否导出优化结果（不含已归档的结果）"),
+    templates: bool = Query(True, description="是否导出提示词模板"),
+    gzip: bool = Query(False, description="是否以 gzip 压缩输出"),
+):
+    """以NDJSON流导出整个提示词库（提示词、版本、结果和模板）"""
+    filename = f"prompt-library-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.ndjson"
+    if gzip:
+        filename += ".gz"
+    return StreamingResponse(
+        library_transfer.export_stream(gzip, include_results=results, include_templates=templates),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/import", response_model=schemas.LibraryImportReport)
+async def import_library(request: Request):
+    """
+    导入 /library/export 导出的NDJSON（可为 gzip 压缩）
+
+    边接收边按块写入；已存在的记录跳过，重复导入同一文件不会产生重复数据
+    """
+    importer = library_transfer.LibraryImporter()
+    batch = []
+    lines = result_ingest.iter_lines(library_transfer.decompress_stream(request.stream()))
+    async for line in lines:
+        if line.strip():
+            batch.append(result_ingest.parse_ndjson_line(line))
+        if len(batch) >= importer.chunk_size:
+            await run_in_threadpool(importer.add_many, batch)
+            batch = []
+    await run_in_threadpool(importer.add_many, batch)
+    return await run_in_threadpool(importer.finish)
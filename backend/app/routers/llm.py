@@ -1,61 +1,88 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.orm import Session
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
-from ..database import get_db
+from ..core import http_cache
+from ..core.responses import FastJSONResponse
+from ..database import get_db, SessionLocal, engine
 from ..schemas.prompt import LLMRequest, LLMResponse, ProvidersResponse, ModelInfo
 from ..services.llm_service import llm_service, DynamicLLMService
+from ..services import analytics_service, config_snapshot, idempotency
 
 router = APIRouter(
     prefix="/api/v1/llm",
     tags=["llm"]
 )
 
+# 环境变量中的提供商在启动时确定，模型列表预先序列化
+_MODEL_INFO_RESPONSES = {
+    provider: http_cache.PrecomputedResponse.of(
+        ModelInfo(provider=provider, models=llm_service.get_available_models(provider))
+    )
+    for provider in llm_service.get_available_providers()
+    if llm_service.get_available_models(provider)
+}
+
+# 数据库配置的提供商和模型：只在配置快照变化时重新构建（需要解密密钥、创建客户端）
+_providers_response: Optional[Tuple[config_snapshot.ConfigSnapshot, http_cache.PrecomputedResponse]] = None
+
 
 @router.get("/providers", response_model=ProvidersResponse)
-async def get_providers(db: Session = Depends(get_db)):
+async def get_providers(request: Request, db: Session = Depends(get_db)):
     """获取可用的LLM服务提供商和模型（从数据库动态加载）"""
+    global _providers_response
     try:
-        # 使用动态服务从数据库加载配置
-        dynamic_service = DynamicLLMService(db)
-        providers = dynamic_service.get_available_providers()
-        models = dynamic_service.get_all_models()
-        
-        return ProvidersResponse(
-            providers=providers,
-            models=models
-        )
+        snapshot = config_snapshot.get_snapshot(db.connection())
+        cached = _providers_response
+        if cached is None or cached[0] is not snapshot:
+            # 使用动态服务从数据库加载配置
+            dynamic_service = DynamicLLMService(db)
+            cached = (snapshot, http_cache.PrecomputedResponse.of(ProvidersResponse(
+                providers=dynamic_service.get_available_providers(),
+                models=dynamic_service.get_all_models()
+            )))
+            _providers_response = cached
+        return cached[1].respond(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取提供商信息失败: {str(e)}")
 
 
 @router.get("/providers/{provider}/models", response_model=ModelInfo)
-async def get_provider_models(provider: str):
+async def get_provider_models(provider: str, request: Request):
     """获取指定提供商的可用模型"""
-    try:
-        models = llm_service.get_available_models(provider)
-        if not models:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"提供商 '{provider}' 未配置或不可用"
-            )
-        
-        return ModelInfo(
-            provider=provider,
-            models=models
+    response = _MODEL_INFO_RESPONSES.get(provider)
+    if response is None:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"提供商 '{provider}' 未配置或不可用"
         )
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取模型信息失败: {str(e)}")
+    return response.respond(request)
 
 
 @router.post("/generate", response_model=LLMResponse)
 async def generate_text(
     request: LLMRequest,
+    http_request: Request,
     db: Session = Depends(get_db)
 ):
-    """使用指定的LLM生成文本（使用数据库配置）"""
+    """
+    使用指定的LLM生成文本（使用数据库配置）
+
+    带 Idempotency-Key 请求头时，同一个键的重试返回首次调用的结果，不会再次调用模型
+    """
+    key = http_request.headers.get(idempotency.HEADER)
+    if key is None:
+        return await _generate_text(request, db)
+
+    async def handler():
+        # 执行任务可能比请求本身存活更久（客户端超时断开），使用独立的会话
+        with SessionLocal() as session:
+            return FastJSONResponse(await _generate_text(request, session))
+
+    return await idempotency.execute(engine, "llm.generate", key, request.model_dump(mode="json"), handler)
+
+
+async def _generate_text(request: LLMRequest, db: Session) -> LLMResponse:
     try:
         # 使用动态服务从数据库加载配置
         dynamic_service = DynamicLLMService(db)
@@ -69,6 +96,7 @@ async def generate_text(
             max_tokens=request.max_tokens,
             **request.parameters
         )
+        analytics_service.record_generate(request.provider.value, request.model, result)
         
         # 构造响应
         response = LLMResponse(
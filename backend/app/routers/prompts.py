@@ -1,15 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List
+import math
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import String, func, select, tuple_, type_coerce
+from sqlalchemy.orm import Session, load_only, selectinload
+from typing import List, Optional
 from ..database import get_db
 from ..models import prompt as models
 from ..schemas import prompt as schemas
+from ..core.pagination import encode_cursor, decode_cursor, InvalidCursorError
+from ..core.projection import select_fields, select_includes, project, parse_ids, InvalidFieldsError
+from ..core import http_cache
+from ..core.responses import FastJSONResponse, to_json
+from ..services import catalog_cache, prompt_service
+from ..services.prompt_service import filter_prompts
 
 router = APIRouter(
     prefix="/api/v1/prompts",
     tags=["prompts"]
 )
 
+# 提示词本身始终完整返回的字段
+PROMPT_FIELDS = list(schemas.PromptRead.model_fields)
+
 
 @router.post("/", response_model=schemas.PromptRead, status_code=201)
 def create_prompt(
@@ -24,27 +36,187 @@ def create_prompt(
     return db_prompt
 
 
-@router.get("/", response_model=List[schemas.PromptRead])
+# 排序方式 -> (排序列, 是否降序)
+_PROMPT_SORT_COLUMNS = {
+    schemas.PromptSort.UPDATED_DESC: (models.Prompt.updated_at, True),
+    schemas.PromptSort.UPDATED_ASC: (models.Prompt.updated_at, False),
+    schemas.PromptSort.CREATED_DESC: (models.Prompt.created_at, True),
+    schemas.PromptSort.CREATED_ASC: (models.Prompt.created_at, False),
+    schemas.PromptSort.TITLE_ASC: (models.Prompt.title, False),
+    schemas.PromptSort.TITLE_DESC: (models.Prompt.title, True),
+}
+
+
+@router.get("/", response_model=schemas.PaginatedResponse[schemas.PromptRead])
 def get_prompts(
-    skip: int = Query(0, ge=0, description="跳过的记录数"),
-    limit: int = Query(100, ge=1, le=100, description="返回的最大记录数"),
+    request: Request,
+    limit: int = Query(20, ge=1, le=100, description="每页返回的最大记录数"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    category: Optional[schemas.PromptCategory] = Query(None, description="按分类筛选"),
+    framework_type: Optional[schemas.FrameworkType] = Query(None, description="按框架筛选"),
+    is_template: Optional[bool] = Query(None, description="按是否为模板筛选"),
+    tags: Optional[List[str]] = Query(None, description="按标签筛选"),
+    tag_mode: schemas.TagMatchMode = Query(schemas.TagMatchMode.ALL, description="多标签匹配方式：all 全部包含，any 任一包含"),
+    sort: schemas.PromptSort = Query(schemas.PromptSort.UPDATED_DESC, description="排序方式"),
+    with_total: bool = Query(False, description="是否计算符合条件的总数"),
+    db: Session = Depends(get_db)
+):
+    """获取提示词项目列表（键集分页，序列化后的响应缓存在进程内，见 services/catalog_cache.py）"""
+    try:
+        after, page = decode_cursor(cursor, sort.value)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cache_key = ("prompts", request.url.query)
+    token = catalog_cache.begin(db.connection())
+    cached = catalog_cache.lookup(cache_key, token)
+    if cached is not None:
+        return http_cache.cached_response(request, cached.etag, cached.cache_control, cached.body)
+
+    sort_column, descending = _PROMPT_SORT_COLUMNS[sort]
+    # 按数据库中的原始字符串比较，避免时间格式差异导致翻页重复或遗漏
+    sort_key = type_coerce(sort_column, String)
+
+    query = filter_prompts(db.query(models.Prompt), category, framework_type, is_template, tags, tag_mode.value)
+    total = query.with_entities(func.count(models.Prompt.id)).scalar() if with_total else None
+
+    page_query = query.add_columns(sort_key.label("sort_key"))
+    if after is not None:
+        key = tuple_(sort_key, models.Prompt.id)
+        boundary = tuple_(*after)
+        page_query = page_query.filter(key < boundary if descending else key > boundary)
+    if descending:
+        page_query = page_query.order_by(sort_column.desc(), models.Prompt.id.desc())
+    else:
+        page_query = page_query.order_by(sort_column.asc(), models.Prompt.id.asc())
+
+    rows = page_query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last_prompt, last_key = rows[-1]
+        next_cursor = encode_cursor(sort.value, [last_key, last_prompt.id], page + 1)
+
+    body = to_json(schemas.PaginatedResponse[schemas.PromptRead](
+        items=[prompt for prompt, _ in rows],
+        total=total,
+        page=page,
+        size=limit,
+        pages=math.ceil(total / limit) if total is not None else None,
+        next_cursor=next_cursor
+    ))
+    etag = http_cache.body_etag(body)
+    catalog_cache.store(cache_key, token, None, etag, http_cache.REVALIDATE, body)
+    return http_cache.cached_response(request, etag, http_cache.REVALIDATE, body)
+
+
+@router.get(":batch", response_model=schemas.PromptBatchResponse, response_model_exclude_unset=True)
+def batch_get_prompts(
+    ids: str = Query(..., description="提示词ID，逗号分隔"),
+    fields: Optional[str] = Query(None, description="返回的字段，逗号分隔，如 id,title,updated_at"),
     db: Session = Depends(get_db)
 ):
-    """获取提示词项目列表"""
-    prompts = db.query(models.Prompt).offset(skip).limit(limit).all()
-    return prompts
+    """按ID批量获取提示词（一次查询），结果按ID索引，不存在的ID列在 missing 中"""
+    try:
+        prompt_ids = parse_ids(ids)
+        prompt_fields = select_fields(fields, PROMPT_FIELDS)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    columns = [getattr(models.Prompt, name) for name in prompt_fields]
+    found = {
+        prompt.id: prompt
+        for prompt in db.query(models.Prompt).options(load_only(*columns)).filter(models.Prompt.id.in_(prompt_ids))
+    }
+    return FastJSONResponse(
+        schemas.PromptBatchResponse(
+            items={prompt_id: project(found[prompt_id], prompt_fields) for prompt_id in prompt_ids if prompt_id in found},
+            missing=[prompt_id for prompt_id in prompt_ids if prompt_id not in found]
+        ),
+        exclude_unset=True
+    )
 
 
-@router.get("/{prompt_id}", response_model=schemas.PromptReadWithVersions)
+@router.get(
+    "/{prompt_id}",
+    response_model=schemas.PromptDetailView,
+    response_model_exclude_unset=True
+)
 def get_prompt(
     prompt_id: int,
+    request: Request,
+    response: Response,
+    include: Optional[str] = Query(None, description="嵌入的关联数据，逗号分隔（versions），传空字符串则不嵌入"),
+    fields: Optional[str] = Query(None, description="版本字段，逗号分隔，如 id,version_number,created_at"),
+    summary: bool = Query(False, description="摘要模式：版本不含内容，附带结果数量"),
     db: Session = Depends(get_db)
 ):
-    """根据ID获取单个提示词项目（包含版本信息）"""
-    prompt = db.query(models.Prompt).filter(models.Prompt.id == prompt_id).first()
+    """根据ID获取单个提示词项目（包含版本信息），支持 If-None-Match 条件请求"""
+    try:
+        includes = select_includes(include, ["versions"], default=["versions"])
+        version_fields = select_fields(fields, schemas.PROMPT_VERSION_FIELDS)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if summary and fields is None:
+        version_fields = [name for name in version_fields if name != "content"]
+
+    # 摘要模式带结果数量，随结果写入变化，不缓存
+    cache_key = ("prompt", prompt_id, request.url.query)
+    token = None
+    if not summary:
+        token = catalog_cache.begin(db.connection())
+        cached = catalog_cache.lookup(cache_key, token)
+        if cached is not None:
+            return http_cache.cached_response(request, cached.etag, cached.cache_control, cached.body)
+
+    # 先用一条聚合查询取得验证信息：新建版本不修改提示词的 updated_at，因此同时带上版本数和最大版本ID
+    validator = db.query(
+        type_coerce(models.Prompt.updated_at, String),
+        func.count(models.PromptVersion.id),
+        func.max(models.PromptVersion.id)
+    ).outerjoin(models.PromptVersion, models.PromptVersion.prompt_id == models.Prompt.id).filter(
+        models.Prompt.id == prompt_id
+    ).group_by(models.Prompt.id).first()
+    if validator is None:
+        raise HTTPException(status_code=404, detail="提示词项目未找到")
+
+    result_counts = {}
+    if "versions" in includes and summary:
+        result_counts = dict(
+            db.query(models.OptimizationResult.version_id, func.count(models.OptimizationResult.id))
+            .filter(models.OptimizationResult.version_id.in_(
+                select(models.PromptVersion.id).where(models.PromptVersion.prompt_id == prompt_id)
+            ))
+            .group_by(models.OptimizationResult.version_id)
+            .all()
+        )
+    etag = http_cache.make_etag("prompt", prompt_id, *validator, sorted(result_counts.items()), request.url.query)
+    not_modified = http_cache.conditional(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    query = db.query(models.Prompt).filter(models.Prompt.id == prompt_id)
+    if "versions" in includes:
+        columns = models.PromptVersion.columns_for(version_fields)
+        query = query.options(selectinload(models.Prompt.versions).load_only(*columns))
+    prompt = query.first()
     if prompt is None:
         raise HTTPException(status_code=404, detail="提示词项目未找到")
-    return prompt
+
+    detail = project(prompt, PROMPT_FIELDS)
+    if "versions" in includes:
+        detail["versions"] = []
+        for version in prompt.versions:
+            item = project(version, version_fields)
+            if summary:
+                item["result_count"] = result_counts.get(version.id, 0)
+            detail["versions"].append(item)
+    result = FastJSONResponse(schemas.PromptDetailView(**detail), headers=response.headers, exclude_unset=True)
+    if token is not None:
+        catalog_cache.store(cache_key, token, prompt_id, etag, http_cache.REVALIDATE, result.body)
+    return result
 
 
 @router.put("/{prompt_id}", response_model=schemas.PromptRead)
@@ -61,6 +233,8 @@ def update_prompt(
     update_data = prompt_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(prompt, field, value)
+    # 数据库默认的 now() 只精确到秒，显式写入以免同一秒内的两次修改得到相同的 ETag
+    prompt.updated_at = datetime.utcnow()
     
     db.commit()
     db.refresh(prompt)
@@ -88,26 +262,9 @@ def create_prompt_version(
     version: schemas.PromptVersionCreate,
     db: Session = Depends(get_db)
 ):
-    """为指定提示词创建新版本"""
-    # 检查提示词是否存在
-    prompt = db.query(models.Prompt).filter(models.Prompt.id == prompt_id).first()
-    if prompt is None:
+    """为指定提示词创建新版本（版本号原子分配，多进程并发创建不会重复）"""
+    db_version = prompt_service.create_version(db, prompt_id, version.dict())
+    if db_version is None:
         raise HTTPException(status_code=404, detail="提示词项目未找到")
-    
-    # 计算新版本号
-    last_version = db.query(models.PromptVersion).filter(
-        models.PromptVersion.prompt_id == prompt_id
-    ).order_by(models.PromptVersion.version_number.desc()).first()
-    
-    new_version_number = 1 if last_version is None else last_version.version_number + 1
-    
-    # 创建新版本
-    db_version = models.PromptVersion(
-        prompt_id=prompt_id,
-        version_number=new_version_number,
-        **version.dict()
-    )
-    db.add(db_version)
-    db.commit()
     db.refresh(db_version)
     return db_version 
\ No newline at end of file
@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+
+from ..core.responses import FastJSONResponse
+from ..core.template import MissingVariablesError
+from ..database import get_db, SessionLocal, engine
+from ..schemas import prompt as schemas
+from ..services import analytics_service, idempotency, prompt_runtime
+from ..services.llm_service import DynamicLLMService
+
+router = APIRouter(
+    prefix="/api/v1/run",
+    tags=["run"]
+)
+
+
+@router.post("/{prompt_id}", response_model=schemas.RunResponse)
+async def run_prompt(
+    prompt_id: int,
+    request: schemas.RunRequest,
+    http_request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    运行已保存的提示词：解析版本（默认基准版本）、渲染模板变量、按版本的LLM配置调用模型
+
+    版本解析和模板编译结果缓存在进程内，随版本变更失效。
+    带 Idempotency-Key 请求头时，同一个键的重试返回首次调用的结果，不会再次调用模型
+    """
+    key = http_request.headers.get(idempotency.HEADER)
+    if key is None:
+        return await _run_prompt(prompt_id, request, db)
+
+    async def handler():
+        # 执行任务可能比请求本身存活更久（客户端超时断开），使用独立的会话
+        with SessionLocal() as session:
+            return FastJSONResponse(await _run_prompt(prompt_id, request, session))
+
+    payload = {"prompt_id": prompt_id, **request.model_dump(mode="json")}
+    return await idempotency.execute(engine, "run.prompt", key, payload, handler)
+
+
+async def _run_prompt(prompt_id: int, request: schemas.RunRequest, db: Session) -> schemas.RunResponse:
+    try:
+        resolved = prompt_runtime.resolve(db, prompt_id, request.version)
+        call = prompt_runtime.build_call(resolved, request)
+    except prompt_runtime.VersionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except MissingVariablesError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except prompt_runtime.LLMNotConfiguredError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        result = await DynamicLLMService(db).generate_text(
+            provider=call.provider,
+            prompt=call.prompt,
+            model=call.model,
+            temperature=call.temperature,
+            max_tokens=call.max_tokens,
+            **call.parameters
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"文本生成失败: {str(e)}")
+    analytics_service.record_generate(call.provider, call.model, result)
+
+    return schemas.RunResponse(
+        text=result.get("text"),
+        model=result["model"],
+        provider=result["provider"],
+        execution_time=result["execution_time"],
+        usage=result.get("usage", {}),
+        error=result.get("error"),
+        finish_reason=result.get("finish_reason") or result.get("stop_reason"),
+        prompt_id=prompt_id,
+        version_id=resolved.version_id,
+        version_number=resolved.version_number,
+    )
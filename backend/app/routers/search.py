@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from typing import Any, List, Optional
+from ..database import get_db
+from ..schemas import prompt as schemas
+from ..services import search_service
+from ..core.pagination import encode_cursor, decode_cursor, InvalidCursorError
+
+router = APIRouter(
+    prefix="/api/v1/search",
+    tags=["search"]
+)
+
+
+def _position(values: List[Any]) -> search_service.Position:
+    """游标中的位置：[索引, rank, rowid]"""
+    try:
+        index, rank, rowid = values
+        return str(index), float(rank), int(rowid)
+    except (TypeError, ValueError):
+        raise InvalidCursorError("无效的游标")
+
+
+@router.get("/", response_model=schemas.PaginatedResponse[schemas.SearchHit])
+def search(
+    q: str = Query(..., min_length=1, max_length=500, description='搜索词，支持前缀（foo*）和短语（"foo bar"）'),
+    scope: schemas.SearchScope = Query(schemas.SearchScope.ALL, description="搜索范围"),
+    limit: int = Query(20, ge=1, le=100, description="每页返回的最大记录数"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    db: Session = Depends(get_db)
+):
+    """
+    按相关性排序的全文搜索（提示词标题/描述/标签与版本内容/变更说明）
+
+    scope 为 all 时先列出提示词命中，再列出版本命中，各自按相关性排序（两类得分不可比较）
+    """
+    sort = f"search:{scope.value}:{q}"
+    try:
+        after, page = decode_cursor(cursor, sort)
+        position = _position(after) if after is not None else None
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        hits, next_after = search_service.search(db, q, scope.value, limit, position)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OperationalError:
+        raise HTTPException(status_code=400, detail="无法解析的搜索表达式")
+
+    next_cursor = encode_cursor(sort, list(next_after), page + 1) if next_after is not None else None
+    return schemas.PaginatedResponse[schemas.SearchHit](
+        items=hits,
+        page=page,
+        size=limit,
+        next_cursor=next_cursor
+    )
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..database import get_db
+from ..models import prompt as models
+from ..schemas import prompt as schemas
+from ..services import tag_service
+from ..services.prompt_service import filter_prompts
+
+router = APIRouter(
+    prefix="/api/v1/tags",
+    tags=["tags"]
+)
+
+
+@router.get("/", response_model=List[schemas.TagFacet])
+def get_tag_facets(
+    category: Optional[schemas.PromptCategory] = Query(None, description="按分类筛选"),
+    framework_type: Optional[schemas.FrameworkType] = Query(None, description="按框架筛选"),
+    is_template: Optional[bool] = Query(None, description="按是否为模板筛选"),
+    tags: Optional[List[str]] = Query(None, description="已选标签，统计同时带有这些标签的提示词"),
+    tag_mode: schemas.TagMatchMode = Query(schemas.TagMatchMode.ALL, description="已选标签的匹配方式"),
+    prefix: Optional[str] = Query(None, max_length=100, description="只返回以此开头的标签"),
+    limit: int = Query(50, ge=1, le=500, description="返回的最大标签数"),
+    db: Session = Depends(get_db)
+):
+    """获取标签分面统计（标签及对应的提示词数量）"""
+    prompt_ids = None
+    if any(value is not None for value in (category, framework_type, is_template, tags)):
+        prompt_ids = filter_prompts(
+            select(models.Prompt.id), category, framework_type, is_template, tags, tag_mode.value
+        )
+    rows = tag_service.tag_facets(db, prompt_ids, prefix, limit)
+    return [schemas.TagFacet(tag=tag, count=count) for tag, count in rows]
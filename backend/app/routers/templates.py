@@ -0,0 +1,150 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, load_only
+from typing import List, Optional
+from ..database import get_db
+from ..models import prompt as models
+from ..schemas import prompt as schemas
+from ..core import template as template_engine
+from ..core.responses import FastJSONResponse
+from ..services import template_service
+
+router = APIRouter(
+    prefix="/api/v1/templates",
+    tags=["templates"]
+)
+
+
+def _read(template: models.PromptTemplate) -> schemas.PromptTemplateRead:
+    """响应中的使用次数包含尚未写入数据库的计数"""
+    result = schemas.PromptTemplateRead.model_validate(template)
+    result.usage_count = template_service.usage_count(template)
+    return result
+
+
+def _validate(template_content: str, variables: Optional[dict]):
+    """保存前校验：不允许无法识别的占位符；声明了变量时，模板中的变量都须已声明"""
+    check = template_engine.check(
+        template_engine.compile_template(template_content), list(variables) if variables else None
+    )
+    if not check.valid:
+        problems = []
+        if check.undeclared:
+            problems.append(f"未声明的变量: {', '.join(check.undeclared)}")
+        if check.invalid:
+            problems.append(f"无法识别的占位符: {', '.join(check.invalid)}")
+        raise HTTPException(status_code=422, detail=f"模板校验失败（{'；'.join(problems)}）")
+
+
+def _get_template(db: Session, template_id: int, *columns) -> models.PromptTemplate:
+    query = db.query(models.PromptTemplate)
+    if columns:
+        query = query.options(load_only(*columns))
+    template = query.filter(models.PromptTemplate.id == template_id).first()
+    if template is None:
+        raise HTTPException(status_code=404, detail="模板未找到")
+    return template
+
+
+@router.get("/", response_model=List[schemas.PromptTemplateRead])
+def list_templates(
+    category: Optional[str] = Query(None, description="按分类筛选"),
+    is_official: Optional[bool] = Query(None, description="只返回官方/非官方模板"),
+    limit: int = Query(50, ge=1, le=200, description="返回的最大记录数"),
+    offset: int = Query(0, ge=0, description="跳过的记录数"),
+    db: Session = Depends(get_db)
+):
+    """获取模板列表（按使用次数降序）"""
+    query = db.query(models.PromptTemplate)
+    if category:
+        query = query.filter(models.PromptTemplate.category == category)
+    if is_official is not None:
+        query = query.filter(models.PromptTemplate.is_official == is_official)
+    templates = query.order_by(
+        models.PromptTemplate.usage_count.desc(), models.PromptTemplate.id
+    ).offset(offset).limit(limit).all()
+    return [_read(template) for template in templates]
+
+
+@router.post("/", response_model=schemas.PromptTemplateRead, status_code=201)
+def create_template(template: schemas.PromptTemplateCreate, db: Session = Depends(get_db)):
+    """创建模板（保存前校验模板变量）"""
+    _validate(template.template_content, template.variables)
+    db_template = models.PromptTemplate(**template.model_dump(mode="json"), usage_count=0)
+    db.add(db_template)
+    db.commit()
+    db.refresh(db_template)
+    return _read(db_template)
+
+
+@router.post("/validate", response_model=schemas.TemplateValidationResponse)
+def validate_template(request: schemas.TemplateValidationRequest):
+    """校验模板：列出使用的变量、未声明/未使用的变量和无法识别的占位符"""
+    check = template_engine.check(
+        template_engine.compile_template(request.template_content),
+        list(request.variables) if request.variables is not None else None
+    )
+    return schemas.TemplateValidationResponse(valid=check.valid, **check._asdict())
+
+
+@router.get("/{template_id}", response_model=schemas.PromptTemplateRead)
+def get_template(template_id: int, db: Session = Depends(get_db)):
+    """获取指定模板"""
+    return _read(_get_template(db, template_id))
+
+
+@router.put("/{template_id}", response_model=schemas.PromptTemplateRead)
+def update_template(template_id: int, template_update: schemas.PromptTemplateUpdate, db: Session = Depends(get_db)):
+    """更新模板（内容或变量定义变化时重新校验）"""
+    db_template = _get_template(db, template_id)
+    update_data = template_update.model_dump(mode="json", exclude_unset=True)
+    if "template_content" in update_data or "variables" in update_data:
+        _validate(
+            update_data.get("template_content") or db_template.template_content,
+            update_data["variables"] if "variables" in update_data else db_template.variables
+        )
+    for field, value in update_data.items():
+        setattr(db_template, field, value)
+    db_template.updated_at = datetime.utcnow()
+    db.commit()
+    db.refresh(db_template)
+    return _read(db_template)
+
+
+@router.delete("/{template_id}", status_code=204)
+def delete_template(template_id: int, db: Session = Depends(get_db)):
+    """删除模板"""
+    db_template = _get_template(db, template_id, models.PromptTemplate.id)
+    db.delete(db_template)
+    db.commit()
+    template_service.usage.discard(template_id)
+    return None
+
+
+@router.post("/{template_id}/render", response_model=schemas.TemplateRenderResponse)
+def render_template(template_id: int, request: schemas.TemplateRenderRequest, db: Session = Depends(get_db)):
+    """用给定的变量值渲染模板"""
+    db_template = _get_template(db, template_id, models.PromptTemplate.id, models.PromptTemplate.template_content)
+    try:
+        text = template_service.compiled(db_template).render(request.inputs)
+    except template_engine.MissingVariablesError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    template_service.usage.add(template_id)
+    return FastJSONResponse(schemas.TemplateRenderResponse(template_id=template_id, text=text))
+
+
+@router.post("/{template_id}/render/batch", response_model=schemas.TemplateBatchRenderResponse)
+def render_template_batch(template_id: int, request: schemas.TemplateBatchRenderRequest,
+                          db: Session = Depends(get_db)):
+    """
+    用多行输入批量渲染同一模板
+
+    模板只加载和编译一次；缺少变量的行在 errors 中列出，不影响其他行
+    """
+    db_template = _get_template(db, template_id, models.PromptTemplate.id, models.PromptTemplate.template_content)
+    items, errors = template_service.compiled(db_template).render_many(request.rows)
+    rendered = len(items) - len(errors)
+    template_service.usage.add(template_id, rendered)
+    return FastJSONResponse(schemas.TemplateBatchRenderResponse(
+        template_id=template_id, items=items, errors=errors, rendered=rendered
+    ))
@@ -1,69 +1,435 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, func, type_coerce
+from sqlalchemy.orm import Session, load_only, selectinload
+from typing import List, Optional
+from ..database import get_db, SessionLocal, engine
 from ..models import prompt as models
 from ..schemas import prompt as schemas
+from ..core.pagination import encode_cursor, decode_cursor, InvalidCursorError
+from ..core.projection import select_fields, select_includes, project, parse_ids, InvalidFieldsError
+from ..core import http_cache
+from ..core.responses import FastJSONResponse
+from ..services import (
+    blob_store, archive_service, catalog_cache, stats_service, result_ingest, result_writer, idempotency
+)
 
 router = APIRouter(
     prefix="/api/v1/versions",
     tags=["versions"]
 )
 
+# NDJSON流式输出时每批从数据库读取的行数
+_STREAM_BATCH_SIZE = 500
+
+
+@router.post("/results/bulk", response_model=schemas.BulkResultResponse, response_model_exclude_none=True)
+async def bulk_create_results(request: Request, db: Session = Depends(get_db)):
+    """
+    批量写入优化结果（可跨多个版本）
+
+    请求体为 BulkResultItem 的JSON数组，或 Content-Type 为 application/x-ndjson 时每行一条；
+    NDJSON 边接收边写入。逐条返回状态，单条失败不影响其他记录。
+    """
+    ingestor = result_ingest.BulkIngestor(db.get_bind())
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        batch = []
+        async for line in result_ingest.iter_lines(request.stream()):
+            if line.strip():
+                batch.append(result_ingest.parse_ndjson_line(line))
+            if len(batch) >= ingestor.chunk_size:
+                await run_in_threadpool(ingestor.add_many, batch)
+                batch = []
+        await run_in_threadpool(ingestor.add_many, batch)
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"请求体不是合法的JSON: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="请求体应为结果数组")
+        await run_in_threadpool(ingestor.add_many, ((item, None) for item in items))
+    return await run_in_threadpool(ingestor.finish)
+
+
+@router.get(":batch", response_model=schemas.PromptVersionBatchResponse, response_model_exclude_unset=True)
+def batch_get_versions(
+    ids: str = Query(..., description="版本ID，逗号分隔"),
+    fields: Optional[str] = Query(None, description="返回的字段，逗号分隔；不需要内容时省略 content 以免解压"),
+    db: Session = Depends(get_db)
+):
+    """按ID批量获取版本（一次查询，用于版本对比等场景），结果按ID索引，不存在的ID列在 missing 中"""
+    try:
+        version_ids = parse_ids(ids)
+        version_fields = select_fields(fields, schemas.PROMPT_VERSION_FIELDS)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    columns = models.PromptVersion.columns_for(version_fields)
+    found = {
+        version.id: version
+        for version in db.query(models.PromptVersion).options(load_only(*columns)).filter(
+            models.PromptVersion.id.in_(version_ids)
+        )
+    }
+    return FastJSONResponse(
+        schemas.PromptVersionBatchResponse(
+            items={
+                version_id: project(found[version_id], version_fields)
+                for version_id in version_ids if version_id in found
+            },
+            missing=[version_id for version_id in version_ids if version_id not in found]
+        ),
+        exclude_unset=True
+    )
+
 
-@router.get("/{version_id}", response_model=schemas.PromptVersionReadWithResults)
+@router.get(
+    "/{version_id}",
+    response_model=schemas.PromptVersionDetailView,
+    response_model_exclude_unset=True
+)
 def get_version(
     version_id: int,
+    request: Request,
+    response: Response,
+    include: Optional[str] = Query(None, description="嵌入的关联数据，逗号分隔（results），传空字符串则不嵌入"),
+    fields: Optional[str] = Query(None, description="结果字段，逗号分隔，如 id,execution_time,user_rating"),
+    summary: bool = Query(False, description="摘要模式：不嵌入结果，附带结果数量"),
     db: Session = Depends(get_db)
 ):
-    """根据ID获取单个提示词版本（包含结果）"""
-    version = db.query(models.PromptVersion).filter(
-        models.PromptVersion.id == version_id
-    ).first()
+    """
+    根据ID获取单个提示词版本（包含结果），支持 If-None-Match 条件请求
+
+    版本内容创建后不再修改，但版本ID在删除后可能被新版本重用（prompt_versions.id 未使用 AUTOINCREMENT），
+    因此响应不标记为 immutable：客户端每次使用缓存前都须验证，ETag 包含内容哈希和创建时间
+    """
+    try:
+        includes = select_includes(include, ["results"], default=[] if summary else ["results"])
+        result_fields = select_fields(fields, schemas.OPTIMIZATION_RESULT_FIELDS)
+    except InvalidFieldsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 只缓存不含结果数据的响应（版本内容不可变，提示词删除时随之失效）
+    cache_key = ("version", version_id, request.url.query)
+    token = None
+    if not summary and "results" not in includes:
+        token = catalog_cache.begin(db.connection())
+        cached = catalog_cache.lookup(cache_key, token)
+        if cached is not None:
+            return http_cache.cached_response(request, cached.etag, cached.cache_control, cached.body)
+
+    validator = db.query(
+        models.PromptVersion.content_hash, type_coerce(models.PromptVersion.created_at, String)
+    ).filter(models.PromptVersion.id == version_id).first()
+    if validator is None:
+        raise HTTPException(status_code=404, detail="版本未找到")
+
+    result_validator = ()
+    if summary or "results" in includes:
+        # 结果会增加或被归档，嵌入结果或结果数量时按结果数和最大结果ID验证
+        result_validator = db.query(
+            func.count(models.OptimizationResult.id), func.max(models.OptimizationResult.id)
+        ).filter(models.OptimizationResult.version_id == version_id).one()
+    etag = http_cache.make_etag("version", version_id, *validator, *result_validator, request.url.query)
+    not_modified = http_cache.conditional(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    query = db.query(models.PromptVersion).filter(models.PromptVersion.id == version_id)
+    if "results" in includes:
+        columns = models.OptimizationResult.columns_for(result_fields)
+        query = query.options(selectinload(models.PromptVersion.optimization_results).load_only(*columns))
+    version = query.first()
     if version is None:
         raise HTTPException(status_code=404, detail="版本未找到")
-    return version
+
+    detail = project(version, schemas.PROMPT_VERSION_FIELDS)
+    if summary:
+        detail["result_count"] = result_validator[0]
+    if "results" in includes:
+        _prefetch_test_inputs(db, version.optimization_results, result_fields)
+        detail["optimization_results"] = [
+            project(result, result_fields) for result in version.optimization_results
+        ]
+    result = FastJSONResponse(schemas.PromptVersionDetailView(**detail), headers=response.headers, exclude_unset=True)
+    if token is not None:
+        catalog_cache.store(cache_key, token, version.prompt_id, etag, http_cache.REVALIDATE, result.body)
+    return result
 
 
 @router.post("/{version_id}/results", response_model=schemas.OptimizationResultRead, status_code=201)
-def create_result(
+async def create_result(version_id: int, result: schemas.OptimizationResultCreate, request: Request):
+    """
+    为指定版本创建优化结果（启用组提交时与并发请求合并到同一事务写入）
+
+    带 Idempotency-Key 请求头时，同一个键的重试返回首次创建的结果，不会重复写入
+    """
+    key = request.headers.get(idempotency.HEADER)
+    if key is None:
+        return await _create_result(version_id, result)
+
+    async def handler():
+        created = await _create_result(version_id, result)
+        return FastJSONResponse(schemas.OptimizationResultRead.model_validate(created), status_code=201)
+
+    payload = {"version_id": version_id, **result.model_dump(mode="json")}
+    return await idempotency.execute(engine, "versions.create_result", key, payload, handler)
+
+
+async def _create_result(version_id: int, result: schemas.OptimizationResultCreate):
+    writer = result_writer.get_writer()
+    if writer is None:
+        return await run_in_threadpool(_create_result_now, version_id, result)
+    try:
+        row = await writer.submit({**result.model_dump(mode="json"), "version_id": version_id})
+    except result_writer.VersionNotFoundError:
+        raise HTTPException(status_code=404, detail="版本未找到")
+    except result_writer.WriterBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except result_writer.WriterTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    return {**result.model_dump(), "id": row["id"], "version_id": version_id, "created_at": row["created_at"]}
+
+
+def _create_result_now(version_id: int, result: schemas.OptimizationResultCreate):
+    """未启用组提交时直接写入"""
+    db = SessionLocal()
+    try:
+        # 检查版本是否存在
+        version = db.query(models.PromptVersion).filter(
+            models.PromptVersion.id == version_id
+        ).first()
+        if version is None:
+            raise HTTPException(status_code=404, detail="版本未找到")
+
+        # 创建结果
+        db_result = models.OptimizationResult(
+            version_id=version_id,
+            **result.dict()
+        )
+        db.add(db_result)
+        db.commit()
+        db.refresh(db_result)
+        return schemas.OptimizationResultRead.model_validate(db_result)
+    finally:
+        db.close()
+
+
+def _prefetch_test_inputs(db: Session, results, fields: List[str]):
+    """批量读取结果引用的测试输入内容块"""
+    if "test_input" in fields:
+        blob_store.prefetch(db.connection(), (result.test_input_hash for result in results))
+
+
+def _filter_results(query, provider, model, is_error, rating, min_rating, created_after, created_before,
+                    test_input=None):
+    """在结果查询上应用筛选条件"""
+    if test_input is not None:
+        # 相同输入按哈希比较，命中 (version_id, test_input_hash) 索引
+        query = query.filter(models.OptimizationResult.test_input_hash == blob_store.content_hash(test_input))
+    if provider is not None:
+        query = query.filter(models.OptimizationResult.llm_provider == provider.value)
+    if model is not None:
+        query = query.filter(models.OptimizationResult.llm_model == model)
+    if is_error is not None:
+        query = query.filter(models.OptimizationResult.is_error == is_error)
+    if rating is not None:
+        query = query.filter(models.OptimizationResult.user_rating == rating)
+    if min_rating is not None:
+        query = query.filter(models.OptimizationResult.user_rating >= min_rating)
+    if created_after is not None:
+        query = query.filter(models.OptimizationResult.created_at >= created_after)
+    if created_before is not None:
+        query = query.filter(models.OptimizationResult.created_at < created_before)
+    return query
+
+
+def _serialize_ndjson(db: Session, results, fields: List[str]) -> str:
+    _prefetch_test_inputs(db, results, fields)
+    return "".join(
+        schemas.OptimizationResultView(**project(result, fields)).model_dump_json(exclude_unset=True) + "\n"
+        for result in results
+    )
+
+
+def _stream_results_ndjson(version_id: int, filters: dict, after_id: Optional[int], descending: bool,
+                           limit: Optional[int], fields: List[str]):
+    """逐行读取并序列化结果，内存占用与结果总数无关"""
+    db = SessionLocal()
+    try:
+        query = _filter_results(
+            db.query(models.OptimizationResult).filter(models.OptimizationResult.version_id == version_id),
+            **filters
+        )
+        if after_id is not None:
+            query = query.filter(
+                models.OptimizationResult.id < after_id if descending else models.OptimizationResult.id > after_id
+            )
+        order = models.OptimizationResult.id.desc() if descending else models.OptimizationResult.id.asc()
+        query = query.options(load_only(*models.OptimizationResult.columns_for(fields))).order_by(order)
+        if limit is not None:
+            query = query.limit(limit)
+        batch = []
+        for result in query.yield_per(_STREAM_BATCH_SIZE):
+            batch.append(result)
+            if len(batch) >= _STREAM_BATCH_SIZE:
+                yield _serialize_ndjson(db, batch, fields)
+                batch = []
+        if batch:
+            yield _serialize_ndjson(db, batch, fields)
+    finally:
+        db.close()
+
+
+@router.get(
+    "/{version_id}/results",
+    response_model=schemas.PaginatedResponse[schemas.OptimizationResultView],
+    response_model_exclude_unset=True,
+    responses={200: {"content": {"application/x-ndjson": {}}}}
+)
+def get_version_results(
     version_id: int,
-    result: schemas.OptimizationResultCreate,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="每页数量（JSON默认50；NDJSON默认不限）"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    order: schemas.SortOrder = Query(schemas.SortOrder.ASC, description="按结果ID排序方向"),
+    format: schemas.ResultFormat = Query(schemas.ResultFormat.JSON, description="响应格式：json 分页，ndjson 流式"),
+    fields: Optional[str] = Query(None, description="结果字段，逗号分隔"),
+    provider: Optional[schemas.LLMProvider] = Query(None, description="按LLM提供商筛选"),
+    model: Optional[str] = Query(None, description="按模型筛选"),
+    is_error: Optional[bool] = Query(None, description="按是否出错筛选"),
+    rating: Optional[int] = Query(None, ge=1, le=5, description="按用户评分筛选"),
+    min_rating: Optional[int] = Query(None, ge=1, le=5, description="最低用户评分"),
+    created_after: Optional[datetime] = Query(None, description="创建时间下限（含）"),
+    created_before: Optional[datetime] = Query(None, description="创建时间上限（不含）"),
+    test_input: Optional[str] = Query(None, description="只返回使用该测试输入（完全相同）的结果"),
     db: Session = Depends(get_db)
 ):
-    """为指定版本创建优化结果"""
+    """获取指定版本的结果（游标分页或NDJSON流式输出）"""
     # 检查版本是否存在
-    version = db.query(models.PromptVersion).filter(
+    version_exists = db.query(models.PromptVersion.id).filter(
         models.PromptVersion.id == version_id
     ).first()
-    if version is None:
+    if version_exists is None:
         raise HTTPException(status_code=404, detail="版本未找到")
-    
-    # 创建结果
-    db_result = models.OptimizationResult(
-        version_id=version_id,
-        **result.dict()
+
+    sort = f"results:{order.value}"
+    try:
+        after, page = decode_cursor(cursor, sort)
+        result_fields = select_fields(fields, schemas.OPTIMIZATION_RESULT_FIELDS)
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    after_id = after[0] if after else None
+    descending = order == schemas.SortOrder.DESC
+    filters = dict(
+        provider=provider, model=model, is_error=is_error, rating=rating, min_rating=min_rating,
+        created_after=created_after, created_before=created_before, test_input=test_input
     )
-    db.add(db_result)
-    db.commit()
-    db.refresh(db_result)
-    return db_result
 
+    if format == schemas.ResultFormat.NDJSON:
+        return StreamingResponse(
+            _stream_results_ndjson(version_id, filters, after_id, descending, limit, result_fields),
+            media_type="application/x-ndjson"
+        )
 
-@router.get("/{version_id}/results", response_model=List[schemas.OptimizationResultRead])
-def get_version_results(
-    version_id: int,
-    db: Session = Depends(get_db)
-):
-    """获取指定版本的所有结果"""
-    # 检查版本是否存在
-    version = db.query(models.PromptVersion).filter(
+    limit = limit or 50
+    query = _filter_results(
+        db.query(models.OptimizationResult).filter(models.OptimizationResult.version_id == version_id),
+        **filters
+    )
+    if after_id is not None:
+        query = query.filter(
+            models.OptimizationResult.id < after_id if descending else models.OptimizationResult.id > after_id
+        )
+    columns = models.OptimizationResult.columns_for(result_fields)
+    order_by = models.OptimizationResult.id.desc() if descending else models.OptimizationResult.id.asc()
+    results = query.options(load_only(*columns)).order_by(order_by).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor(sort, [results[-1].id], page + 1)
+    _prefetch_test_inputs(db, results, result_fields)
+
+    return FastJSONResponse(
+        schemas.PaginatedResponse[schemas.OptimizationResultView](
+            items=[project(result, result_fields) for result in results],
+            total=None,
+            page=page,
+            size=limit,
+            pages=None,
+            next_cursor=next_cursor
+        ),
+        exclude_unset=True
+    )
+
+
+@router.get("/{version_id}/stats", response_model=schemas.OptimizationStats)
+def get_version_stats(version_id: int, db: Session = Depends(get_db)):
+    """获取指定版本的结果统计（增量维护，包含已归档的结果）"""
+    version_exists = db.query(models.PromptVersion.id).filter(
         models.PromptVersion.id == version_id
     ).first()
-    if version is None:
+    if version_exists is None:
         raise HTTPException(status_code=404, detail="版本未找到")
-    
-    results = db.query(models.OptimizationResult).filter(
-        models.OptimizationResult.version_id == version_id
-    ).all()
-    return results 
\ No newline at end of file
+    return stats_service.get_stats(db.connection(), version_id)
+
+
+@router.get("/{version_id}/archive", response_model=schemas.ArchiveSummary)
+def get_version_archive(version_id: int, db: Session = Depends(get_db)):
+    """获取指定版本已归档结果的聚合统计（不读取归档文件）"""
+    summary = archive_service.archive_summary(db.connection(), version_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="该版本没有归档结果")
+    return summary
+
+
+@router.get(
+    "/{version_id}/archive/results",
+    response_model=schemas.PaginatedResponse[schemas.OptimizationResultView],
+    response_model_exclude_unset=True
+)
+def get_archived_results(
+    version_id: int,
+    limit: int = Query(50, ge=1, le=1000, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    order: schemas.SortOrder = Query(schemas.SortOrder.ASC, description="按结果ID排序方向"),
+    fields: Optional[str] = Query(None, description="结果字段，逗号分隔"),
+    db: Session = Depends(get_db)
+):
+    """按需从归档文件读取指定版本的历史结果（游标分页）"""
+    sort = f"archive:{order.value}"
+    try:
+        after, page = decode_cursor(cursor, sort)
+        result_fields = select_fields(fields, schemas.OPTIMIZATION_RESULT_FIELDS)
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        records = archive_service.read_archived(
+            db.connection(), version_id, after_id=after[0] if after else None,
+            limit=limit + 1, descending=order == schemas.SortOrder.DESC
+        )
+    except OSError as e:
+        raise HTTPException(status_code=503, detail=f"归档文件读取失败: {e}")
+
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = encode_cursor(sort, [records[-1]["id"]], page + 1)
+
+    return FastJSONResponse(
+        schemas.PaginatedResponse[schemas.OptimizationResultView](
+            items=[{name: record.get(name) for name in result_fields} for record in records],
+            total=None,
+            page=page,
+            size=limit,
+            pages=None,
+            next_cursor=next_cursor
+        ),
+        exclude_unset=True
+    )
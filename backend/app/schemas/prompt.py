@@ -1,8 +1,10 @@
 from pydantic import BaseModel, Field, validator
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Generic, Literal, TypeVar, Union
 from enum import Enum
 
+T = TypeVar("T")
+
 # ===========================================
 # 枚举定义
 # ===========================================
@@ -41,6 +43,15 @@ class ComplexityLevel(str, Enum):
     MEDIUM = "medium"
     COMPLEX = "complex"
 
+class PromptSort(str, Enum):
+    """提示词列表排序方式"""
+    UPDATED_DESC = "updated_desc"
+    UPDATED_ASC = "updated_asc"
+    CREATED_DESC = "created_desc"
+    CREATED_ASC = "created_asc"
+    TITLE_ASC = "title_asc"
+    TITLE_DESC = "title_desc"
+
 # ===========================================
 # 提示词项目模式
 # ===========================================
@@ -207,6 +218,33 @@ class OptimizationResultCreate(BaseModel):
     llm_provider: Optional[LLMProvider] = None
     llm_model: Optional[str] = Field(None, max_length=100)
 
+class BulkResultItem(OptimizationResultCreate):
+    """批量写入中的一条结果（可属于不同版本）"""
+    version_id: int
+
+class BulkResultStatus(BaseModel):
+    """批量写入中一条结果的处理状态"""
+    index: int = Field(..., description="在请求中的位置（从0开始）")
+    status: str = Field(..., description="created 或 error")
+    id: Optional[int] = Field(None, description="写入后的结果ID")
+    version_id: Optional[int] = None
+    errors: Optional[List[str]] = None
+
+class BulkResultResponse(BaseModel):
+    """批量写入结果的响应"""
+    total: int
+    created: int
+    failed: int
+    items: List[BulkResultStatus]
+
+class LibraryImportReport(BaseModel):
+    """提示词库导入报告"""
+    records: int = Field(..., description="成功处理的记录数")
+    created: Dict[str, int] = Field(..., description="按类型统计的新写入记录数")
+    skipped: Dict[str, int] = Field(..., description="按类型统计的重复（已存在）记录数")
+    error_count: int
+    errors: List[str] = Field(..., description="错误明细（最多100条）")
+
 class OptimizationResultRead(OptimizationResultBase):
     """优化结果的响应模式"""
     id: int
@@ -216,6 +254,88 @@ class OptimizationResultRead(OptimizationResultBase):
     class Config:
         from_attributes = True
 
+# ===========================================
+# 精简投影模式（支持 ?fields= / ?include= / summary）
+# 除 id 外的字段均可省略，未选择的字段不会出现在响应中
+# ===========================================
+
+class OptimizationResultView(BaseModel):
+    """可按字段裁剪的优化结果模式"""
+    id: int
+    version_id: Optional[int] = None
+    test_input: Optional[str] = None
+    output_text: Optional[str] = None
+    execution_time: Optional[float] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
+    cost: Optional[float] = None
+    user_rating: Optional[int] = None
+    quality_score: Optional[float] = None
+    quality_analysis: Optional[QualityMetrics] = None
+    is_error: Optional[bool] = None
+    error_message: Optional[str] = None
+    error_type: Optional[str] = None
+    llm_provider: Optional[LLMProvider] = None
+    llm_model: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class PromptView(BaseModel):
+    """可按字段裁剪的提示词项目模式"""
+    id: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    category: Optional[PromptCategory] = None
+    tags: Optional[List[str]] = None
+    is_public: Optional[bool] = None
+    is_template: Optional[bool] = None
+    framework_type: Optional[FrameworkType] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class PromptVersionView(BaseModel):
+    """可按字段裁剪的提示词版本模式"""
+    id: int
+    prompt_id: Optional[int] = None
+    version_number: Optional[int] = None
+    version_name: Optional[str] = None
+    content: Optional[str] = None
+    llm_config: Optional[LLMConfig] = None
+    change_notes: Optional[str] = None
+    is_baseline: Optional[bool] = None
+    created_at: Optional[datetime] = None
+    result_count: Optional[int] = Field(None, description="测试结果数量（仅 summary 模式）")
+
+class PromptDetailView(PromptRead):
+    """提示词详情（版本列表可裁剪）"""
+    versions: Optional[List[PromptVersionView]] = None
+
+class PromptVersionDetailView(PromptVersionView):
+    """版本详情（结果列表可裁剪）"""
+    optimization_results: Optional[List[OptimizationResultView]] = None
+
+class PromptBatchResponse(BaseModel):
+    """按ID批量获取提示词的响应"""
+    items: Dict[int, PromptView] = Field(..., description="按ID索引的提示词（顺序同请求）")
+    missing: List[int] = Field(default_factory=list, description="不存在的ID")
+
+class PromptVersionBatchResponse(BaseModel):
+    """按ID批量获取版本的响应"""
+    items: Dict[int, PromptVersionView] = Field(..., description="按ID索引的版本（顺序同请求）")
+    missing: List[int] = Field(default_factory=list, description="不存在的ID")
+
+# 可通过 ?fields= 选择的字段
+PROMPT_VERSION_FIELDS = [
+    "id", "prompt_id", "version_number", "version_name", "content",
+    "llm_config", "change_notes", "is_baseline", "created_at",
+]
+OPTIMIZATION_RESULT_FIELDS = [
+    "id", "version_id", "test_input", "output_text", "execution_time",
+    "input_tokens", "output_tokens", "total_tokens", "cost", "user_rating",
+    "quality_score", "quality_analysis", "is_error", "error_message",
+    "error_type", "llm_provider", "llm_model", "created_at",
+]
+
 # ===========================================
 # 提示词模板模式
 # ===========================================
@@ -247,6 +367,52 @@ class PromptTemplateRead(PromptTemplateBase):
     class Config:
         from_attributes = True
 
+class PromptTemplateUpdate(BaseModel):
+    """更新提示词模板的请求模式"""
+    name: Optional[str] = Field(None, min_length=1, max_length=255)
+    description: Optional[str] = Field(None, min_length=1)
+    category: Optional[PromptCategory] = None
+    complexity: Optional[ComplexityLevel] = None
+    framework_type: Optional[FrameworkType] = None
+    template_content: Optional[str] = Field(None, min_length=1)
+    variables: Optional[Dict[str, str]] = None
+    example_use_case: Optional[str] = None
+    best_practices: Optional[List[str]] = None
+    is_official: Optional[bool] = None
+
+class TemplateValidationRequest(BaseModel):
+    """模板校验请求模式"""
+    template_content: str = Field(..., min_length=1, description="模板内容")
+    variables: Optional[Dict[str, str]] = Field(None, description="模板变量定义，为空时不比对")
+
+class TemplateValidationResponse(BaseModel):
+    """模板校验结果"""
+    valid: bool
+    variables: List[str] = Field(..., description="模板中使用的变量")
+    undeclared: List[str] = Field(default_factory=list, description="使用了但未声明的变量")
+    unused: List[str] = Field(default_factory=list, description="声明了但未使用的变量")
+    invalid: List[str] = Field(default_factory=list, description="无法识别的占位符")
+
+class TemplateRenderRequest(BaseModel):
+    """模板渲染请求模式"""
+    inputs: Dict[str, Any] = Field(default_factory=dict, description="模板变量的值")
+
+class TemplateRenderResponse(BaseModel):
+    """模板渲染响应模式"""
+    template_id: int
+    text: str
+
+class TemplateBatchRenderRequest(BaseModel):
+    """批量渲染请求模式：同一模板渲染多行输入"""
+    rows: List[Dict[str, Any]] = Field(..., min_length=1, max_length=10000, description="每行为一组模板变量的值（最多10000行）")
+
+class TemplateBatchRenderResponse(BaseModel):
+    """批量渲染响应模式"""
+    template_id: int
+    items: List[Optional[str]] = Field(..., description="与输入行一一对应的渲染结果，失败的行为 null")
+    errors: Dict[int, str] = Field(default_factory=dict, description="行号 -> 错误信息")
+    rendered: int = Field(..., description="渲染成功的行数")
+
 # ===========================================
 # 复合模式和特殊用例
 # ===========================================
@@ -289,6 +455,105 @@ class OptimizationStats(BaseModel):
     total_tokens_used: Optional[int]
     total_cost: Optional[float]
     success_rate: float
+    version_id: Optional[int] = None
+    error_count: int = 0
+    rating_count: int = 0
+    input_tokens_used: Optional[int] = None
+    output_tokens_used: Optional[int] = None
+    execution_time_percentiles: Optional[Dict[str, float]] = Field(
+        None, description="执行时间分位数估计（p50/p90/p95/p99，相对误差约1%）"
+    )
+    updated_at: Optional[datetime] = None
+
+class SortOrder(str, Enum):
+    """排序方向"""
+    ASC = "asc"
+    DESC = "desc"
+
+class ResultFormat(str, Enum):
+    """结果列表输出格式"""
+    JSON = "json"
+    NDJSON = "ndjson"
+
+class TagMatchMode(str, Enum):
+    """多标签匹配方式"""
+    ALL = "all"
+    ANY = "any"
+
+class SearchScope(str, Enum):
+    """全文搜索范围"""
+    ALL = "all"
+    PROMPTS = "prompts"
+    VERSIONS = "versions"
+
+class SearchHit(BaseModel):
+    """全文搜索命中项"""
+    type: str = Field(..., description="命中类型：prompt 或 version")
+    id: int = Field(..., description="提示词或版本ID")
+    prompt_id: int = Field(..., description="所属提示词ID")
+    version_number: Optional[int] = Field(None, description="版本号（仅版本命中）")
+    title: str = Field(..., description="提示词标题（可能包含 <mark> 高亮）")
+    snippet: Optional[str] = Field(None, description="命中片段（包含 <mark> 高亮）")
+    score: float = Field(..., description="相关性得分，越大越相关（只在同一类型的命中之间可比较）")
+
+class TagFacet(BaseModel):
+    """标签分面统计"""
+    tag: str
+    count: int
+
+class ArchiveSummary(BaseModel):
+    """版本已归档结果的聚合统计"""
+    version_id: int
+    result_count: int = Field(..., description="已归档结果数")
+    error_count: int
+    success_rate: float
+    average_execution_time: Optional[float] = None
+    average_rating: Optional[float] = None
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+    total_cost: float
+    first_created_at: Optional[datetime] = None
+    last_created_at: Optional[datetime] = None
+
+class UsageGranularity(str, Enum):
+    """用量汇总的时间粒度"""
+    MINUTE = "minute"
+    HOUR = "hour"
+    DAY = "day"
+
+class UsageGroupBy(str, Enum):
+    """用量序列的分组方式"""
+    NONE = "none"
+    SOURCE = "source"
+    PROVIDER = "provider"
+    MODEL = "model"
+
+class ColumnarFormat(str, Enum):
+    """结果列式导出格式"""
+    PARQUET = "parquet"
+    ARROW = "arrow"
+
+class UsagePoint(BaseModel):
+    """一个时间桶的用量与延迟"""
+    bucket_start: datetime
+    requests: int
+    errors: int
+    input_tokens: int
+    output_tokens: int
+    total_tokens: int
+    cost: float
+    avg_latency: Optional[float] = None
+    p50_latency: Optional[float] = None
+    p95_latency: Optional[float] = None
+    p99_latency: Optional[float] = None
+
+class UsageSeries(BaseModel):
+    """一个分组的用量时间序列"""
+    source: Optional[str] = None
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    points: List[UsagePoint]
 
 # ===========================================
 # API响应封装
@@ -301,13 +566,14 @@ class ApiResponse(BaseModel):
     data: Optional[Any] = None
     errors: Optional[List[str]] = None
 
-class PaginatedResponse(BaseModel):
+class PaginatedResponse(BaseModel, Generic[T]):
     """分页响应格式"""
-    items: List[Any]
-    total: int
+    items: List[T]
+    total: Optional[int] = Field(None, description="符合条件的总数（仅在请求时计算）")
     page: int
     size: int
-    pages: int
+    pages: Optional[int] = Field(None, description="总页数（仅在计算总数时返回）")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，为空表示没有更多数据")
 
 # ===========================================
 # LLM服务相关模式 (新增)
@@ -340,6 +606,24 @@ class LLMResponse(BaseModel):
     error: Optional[str] = Field(None, description="错误信息")
     finish_reason: Optional[str] = Field(None, description="完成原因")
 
+class RunRequest(BaseModel):
+    """运行已保存提示词的请求模式（未指定的LLM参数取自版本的 llm_config）"""
+    inputs: Dict[str, Any] = Field(default_factory=dict, description="模板变量的值")
+    version: Union[int, Literal["baseline", "latest"]] = Field(
+        "baseline", description="运行的版本：baseline（基准版本，没有时为最新版本）、latest 或版本号"
+    )
+    provider: Optional[LLMProvider] = Field(None, description="覆盖版本配置的提供商")
+    model: Optional[str] = Field(None, description="覆盖版本配置的模型")
+    temperature: Optional[float] = Field(None, ge=0, le=2, description="覆盖版本配置的温度参数")
+    max_tokens: Optional[int] = Field(None, ge=1, le=8192, description="覆盖版本配置的最大token数")
+    parameters: Dict[str, Any] = Field(default_factory=dict, description="其他参数")
+
+class RunResponse(LLMResponse):
+    """运行已保存提示词的响应模式"""
+    prompt_id: int
+    version_id: int
+    version_number: int
+
 class ProvidersResponse(BaseModel):
     """提供商列表响应模式"""
     providers: List[str] = Field(..., description="可用的提供商列表")
@@ -0,0 +1,388 @@
+"""
+用量与延迟分析 - 按时间桶汇总的调用量、token、成本和延迟
+
+数据来源：
+- generate：/llm/generate 的每次调用（record_generate）
+- result：保存的测试结果（ORM 写入在事务提交后自动计入；绕过ORM的批量写入提交后调用 record_results）
+
+记录先在进程内按 (分钟, 来源, 提供商, 模型) 聚合，由后台线程每 ROLLUP_FLUSH_INTERVAL 秒
+合并写入 usage_rollups 的分钟、小时、天三个粒度；查询只读取汇总表，不扫描结果表。
+"""
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, event, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..core.sketch import QuantileSketch
+from ..models import prompt as models
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("minute", "hour", "day")
+SOURCE_GENERATE = "generate"
+SOURCE_RESULT = "result"
+
+# 缓冲区写入汇总表的间隔（秒）
+FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", "5"))
+# 分钟粒度的保留天数（小时和天粒度长期保留）
+MINUTE_RETENTION_DAYS = int(os.getenv("ROLLUP_MINUTE_RETENTION_DAYS", "7"))
+# 单次查询最多返回的时间桶数
+MAX_BUCKETS = 5000
+
+_rollups = models.UsageRollup.__table__
+_SUM_FIELDS = ("requests", "errors", "input_tokens", "output_tokens", "total_tokens", "cost",
+               "latency_sum", "latency_count")
+_STEPS = {"minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# 各提供商返回的 usage 字段名不同，统一为 输入/输出/总 token
+_USAGE_KEYS = {
+    "input_tokens": ("prompt_tokens", "input_tokens", "prompt_token_count"),
+    "output_tokens": ("completion_tokens", "output_tokens", "candidates_token_count"),
+    "total_tokens": ("total_tokens", "total_token_count"),
+}
+
+
+def truncate(moment: datetime, granularity: str) -> datetime:
+    """将时间截断到所在时间桶的起点"""
+    moment = moment.replace(second=0, microsecond=0, tzinfo=None)
+    if granularity in ("hour", "day"):
+        moment = moment.replace(minute=0)
+    if granularity == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def normalize_usage(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    usage = usage or {}
+    normalized = {}
+    for field, keys in _USAGE_KEYS.items():
+        normalized[field] = next((int(usage[key]) for key in keys if usage.get(key) is not None), 0)
+    if not normalized["total_tokens"]:
+        normalized["total_tokens"] = normalized["input_tokens"] + normalized["output_tokens"]
+    return normalized
+
+
+class _Bucket:
+    """一个时间桶内某来源/提供商/模型的汇总增量"""
+
+    def __init__(self):
+        self.sums = dict.fromkeys(_SUM_FIELDS, 0)
+        self.sketch = QuantileSketch()
+
+    def add(self, is_error: bool, latency: Optional[float], input_tokens: int, output_tokens: int,
+            total_tokens: int, cost: float):
+        self.sums["requests"] += 1
+        self.sums["errors"] += 1 if is_error else 0
+        self.sums["input_tokens"] += input_tokens
+        self.sums["output_tokens"] += output_tokens
+        self.sums["total_tokens"] += total_tokens
+        self.sums["cost"] += cost
+        if latency is not None:
+            self.sums["latency_sum"] += latency
+            self.sums["latency_count"] += 1
+            self.sketch.add(latency)
+
+    def merge(self, other: "_Bucket"):
+        for name, value in other.sums.items():
+            self.sums[name] += value
+        self.sketch.merge(other.sketch)
+
+
+class RollupBuffer:
+    """进程内的分钟级聚合缓冲区"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple, _Bucket] = defaultdict(_Bucket)
+
+    def add(self, moment: datetime, source: str, provider: Optional[str], model: Optional[str], **values):
+        key = (truncate(moment, "minute"), source, provider or "unknown", model or "unknown")
+        with self._lock:
+            self._buckets[key].add(**values)
+
+    def drain(self) -> Dict[Tuple, _Bucket]:
+        with self._lock:
+            buckets, self._buckets = self._buckets, defaultdict(_Bucket)
+        return buckets
+
+    def restore(self, buckets: Dict[Tuple, _Bucket]):
+        """写入失败时放回缓冲区，下次重试"""
+        with self._lock:
+            for key, bucket in buckets.items():
+                self._buckets[key].merge(bucket)
+
+
+buffer = RollupBuffer()
+
+
+def record_generate(provider: str, model: Optional[str], result: Dict[str, Any]):
+    """记录一次 /llm/generate 调用"""
+    usage = normalize_usage(result.get("usage"))
+    buffer.add(
+        datetime.utcnow(), SOURCE_GENERATE, provider, model or result.get("model"),
+        is_error=bool(result.get("error")), latency=result.get("execution_time"), cost=0.0, **usage
+    )
+
+
+def record_results(rows: Iterable[Dict[str, Any]], moment: Optional[datetime] = None):
+    """记录一批已提交的测试结果（llm_provider、llm_model、is_error、execution_time、token 和 cost 字段）"""
+    moment = moment or datetime.utcnow()
+    for row in rows:
+        buffer.add(
+            row.get("created_at") or moment, SOURCE_RESULT, row.get("llm_provider"), row.get("llm_model"),
+            is_error=bool(row.get("is_error")), latency=row.get("execution_time"),
+            input_tokens=row.get("input_tokens") or 0, output_tokens=row.get("output_tokens") or 0,
+            total_tokens=row.get("total_tokens") or 0, cost=row.get("cost") or 0.0
+        )
+
+
+# ORM 写入的结果在事务提交后计入，回滚的写入不会被统计
+_RESULT_FIELDS = ("llm_provider", "llm_model", "is_error", "execution_time", "input_tokens",
+                  "output_tokens", "total_tokens", "cost")
+
+
+@event.listens_for(models.OptimizationResult, "after_insert")
+def _result_inserted(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        row = {name: getattr(target, name) for name in _RESULT_FIELDS}
+        session.info.setdefault("analytics_pending", []).append(row)
+
+
+@event.listens_for(Session, "after_commit")
+def _session_committed(session):
+    rows = session.info.pop("analytics_pending", None)
+    if rows:
+        record_results(rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def _session_rolled_back(session):
+    session.info.pop("analytics_pending", None)
+
+
+# ===========================================
+# 写入汇总表
+# ===========================================
+
+def _merge_rows(connection, buckets: Dict[Tuple, _Bucket]):
+    rolled: Dict[Tuple, _Bucket] = defaultdict(_Bucket)
+    for (minute, source, provider, model), bucket in buckets.items():
+        for granularity in GRANULARITIES:
+            rolled[(granularity, truncate(minute, granularity), source, provider, model)].merge(bucket)
+
+    for (granularity, start, source, provider, model), bucket in rolled.items():
+        key = dict(granularity=granularity, bucket_start=start, source=source, provider=provider, model=model)
+        # 先累加数值列（同时取得写锁），再读改写延迟草图
+        insert = sqlite_insert(_rollups).values(**key, **bucket.sums)
+        connection.execute(insert.on_conflict_do_update(
+            index_elements=list(key),
+            set_={name: _rollups.c[name] + insert.excluded[name] for name in _SUM_FIELDS}
+        ))
+        condition = and_(*(_rollups.c[name] == value for name, value in key.items()))
+        current = connection.execute(select(_rollups.c.latency_sketch).where(condition)).scalar()
+        sketch = QuantileSketch.from_dict(current)
+        sketch.merge(bucket.sketch)
+        connection.execute(update(_rollups).where(condition).values(latency_sketch=sketch.to_dict()))
+
+
+def flush(engine) -> int:
+    """将缓冲区写入汇总表，返回写入的分钟桶数"""
+    buckets = buffer.drain()
+    if not buckets:
+        return 0
+    try:
+        with engine.begin() as connection:
+            _merge_rows(connection, buckets)
+    except Exception:
+        buffer.restore(buckets)
+        raise
+    return len(buckets)
+
+
+def prune_minutes(engine):
+    """删除超过保留期的分钟粒度汇总"""
+    if MINUTE_RETENTION_DAYS <= 0:
+        return
+    cutoff = truncate(datetime.utcnow() - timedelta(days=MINUTE_RETENTION_DAYS), "minute")
+    with engine.begin() as connection:
+        connection.execute(delete(_rollups).where(
+            _rollups.c.granularity == "minute", _rollups.c.bucket_start < cutoff
+        ))
+
+
+_flush_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def start_background_flush(engine):
+    """启动周期写入汇总表的后台线程"""
+    global _flush_thread
+    if _flush_thread is not None and _flush_thread.is_alive():
+        return
+
+    def run():
+        last_prune = None
+        while not _stop.wait(FLUSH_INTERVAL):
+            try:
+                flush(engine)
+                if last_prune is None or datetime.utcnow() - last_prune > timedelta(hours=1):
+                    prune_minutes(engine)
+                    last_prune = datetime.utcnow()
+            except Exception as e:
+                logger.error(f"写入用量汇总失败: {e}")
+
+    _stop.clear()
+    _flush_thread = threading.Thread(target=run, name="usage-rollup", daemon=True)
+    _flush_thread.start()
+
+
+def stop_background_flush(engine, timeout: float = 5.0):
+    """停止后台线程并写入缓冲区中剩余的数据"""
+    _stop.set()
+    if _flush_thread is not None:
+        _flush_thread.join(timeout)
+    try:
+        flush(engine)
+    except Exception as e:
+        logger.error(f"关闭时写入用量汇总失败: {e}")
+
+
+# ===========================================
+# 查询
+# ===========================================
+
+_GROUP_COLUMNS = {
+    "none": (),
+    "source": ("source",),
+    "provider": ("provider",),
+    "model": ("provider", "model"),
+}
+
+
+def query_series(connection, granularity: str, start: datetime, end: datetime,
+                 provider: Optional[str] = None, model: Optional[str] = None,
+                 source: Optional[str] = None, group_by: str = "model") -> List[Dict[str, Any]]:
+    """
+    查询 [start, end) 内的时间序列
+
+    按 group_by 分组（none/source/provider/model），每组返回按时间排序的数据点
+    """
+    start, end = truncate(start, granularity), end.replace(tzinfo=None)
+    if (end - start) / _STEPS[granularity] > MAX_BUCKETS:
+        raise ValueError(f"时间范围过大：{granularity} 粒度最多 {MAX_BUCKETS} 个时间桶")
+
+    query = select(_rollups).where(
+        _rollups.c.granularity == granularity,
+        _rollups.c.bucket_start >= start,
+        _rollups.c.bucket_start < end,
+    )
+    if provider is not None:
+        query = query.where(_rollups.c.provider == provider)
+    if model is not None:
+        query = query.where(_rollups.c.model == model)
+    if source is not None:
+        query = query.where(_rollups.c.source == source)
+
+    group_columns = _GROUP_COLUMNS[group_by]
+    series: Dict[Tuple, Dict[datetime, _Bucket]] = defaultdict(lambda: defaultdict(_Bucket))
+    for row in connection.execute(query.order_by(_rollups.c.bucket_start)):
+        bucket = _Bucket()
+        bucket.sums = {name: getattr(row, name) for name in _SUM_FIELDS}
+        bucket.sketch = QuantileSketch.from_dict(row.latency_sketch)
+        series[tuple(getattr(row, name) for name in group_columns)][row.bucket_start].merge(bucket)
+
+    result = []
+    for group_key, points in series.items():
+        result.append({
+            **dict(zip(group_columns, group_key)),
+            "points": [_point(moment, bucket) for moment, bucket in sorted(points.items())],
+        })
+    return result
+
+
+def _point(moment: datetime, bucket: _Bucket) -> Dict[str, Any]:
+    sums = bucket.sums
+    return {
+        "bucket_start": moment,
+        "requests": sums["requests"],
+        "errors": sums["errors"],
+        "input_tokens": sums["input_tokens"],
+        "output_tokens": sums["output_tokens"],
+        "total_tokens": sums["total_tokens"],
+        "cost": sums["cost"],
+        "avg_latency": sums["latency_sum"] / sums["latency_count"] if sums["latency_count"] else None,
+        "p50_latency": bucket.sketch.quantile(0.5),
+        "p95_latency": bucket.sketch.quantile(0.95),
+        "p99_latency": bucket.sketch.quantile(0.99),
+    }
+
+
+def ensure_rollups(engine):
+    """汇总表为空但已有结果时（首次升级）回填 result 来源的汇总"""
+    results = models.OptimizationResult.__table__
+    with engine.connect() as connection:
+        has_rollups = connection.execute(select(_rollups.c.requests).limit(1)).first() is not None
+        has_results = connection.execute(select(results.c.id).limit(1)).first() is not None
+    if not has_rollups and has_results:
+        rebuild_from_results(engine)
+
+
+def rebuild_from_results(engine, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    按保存的测试结果（含归档）重建 result 来源的汇总（用于首次回填）
+
+    generate 来源的记录无法从数据库恢复，保持不变
+    """
+    from . import archive_service
+
+    results = models.OptimizationResult.__table__
+    columns = [results.c[name] for name in _RESULT_FIELDS + ("created_at",)]
+    report = {"results": 0, "archived": 0}
+    local = RollupBuffer()
+    with engine.begin() as connection:
+        connection.execute(delete(_rollups).where(_rollups.c.source == SOURCE_RESULT))
+
+        def merge(rows):
+            for row in rows:
+                local.add(
+                    row["created_at"] or datetime.utcnow(), SOURCE_RESULT, row["llm_provider"], row["llm_model"],
+                    is_error=bool(row["is_error"]), latency=row["execution_time"],
+                    input_tokens=row["input_tokens"] or 0, output_tokens=row["output_tokens"] or 0,
+                    total_tokens=row["total_tokens"] or 0, cost=row["cost"] or 0.0
+                )
+            _merge_rows(connection, local.drain())
+
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                select(results.c.id, *columns).where(results.c.id > last_id).order_by(results.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            merge([row._mapping for row in rows])
+            report["results"] += len(rows)
+            last_id = rows[-1].id
+
+        archived = models.ArchivedResult.__table__
+        version_ids = connection.execute(select(archived.c.version_id).distinct()).scalars().all()
+        for version_id in version_ids:
+            after_id = None
+            while True:
+                records = archive_service.read_archived(connection, version_id, after_id, limit=batch_size)
+                if not records:
+                    break
+                for record in records:
+                    if record["created_at"]:
+                        record["created_at"] = datetime.fromisoformat(str(record["created_at"]))
+                merge(records)
+                report["archived"] += len(records)
+                after_id = records[-1]["id"]
+    logger.info(f"用量汇总重建完成: {report}")
+    return report
@@ -0,0 +1,435 @@
+"""
+优化结果归档 - 将旧结果移出热表，保存到本地只追加的压缩归档文件
+
+保留策略（环境变量，0 表示不启用该条件）：
+- RESULT_RETENTION_DAYS：创建时间早于 N 天的结果
+- RESULT_RETENTION_KEEP：每个版本只在热表保留最新的 K 条结果
+
+归档文件 RESULT_ARCHIVE_DIR/results-YYYYMM-NNN.arc 由数据帧顺序追加而成，
+每帧是同一版本一批结果的 NDJSON，按 core/compression 的格式压缩。
+archived_results 表记录每条结果所在的文件、偏移和长度，按需读取时只解压对应的帧；
+archived_result_stats 表保存每个版本已归档结果的聚合统计。
+
+归档按批进行：先追加并落盘数据帧，再在同一事务中写索引、累加统计并删除热表中的行。
+事务失败只会在文件中留下无索引引用的帧，不会丢失数据。
+"""
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, event, func, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.schema import CreateTable
+
+from ..core import compression
+from ..core.cache import LRUCache
+from ..models import prompt as models
+from . import blob_store
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("RESULT_ARCHIVE_DIR", "./data/archive")
+RETENTION_DAYS = int(os.getenv("RESULT_RETENTION_DAYS", "0"))
+RETENTION_KEEP = int(os.getenv("RESULT_RETENTION_KEEP", "0"))
+# 后台归档的运行间隔（秒）
+ARCHIVE_INTERVAL = int(os.getenv("RESULT_ARCHIVE_INTERVAL", "3600"))
+# 单个归档文件的最大字节数，超过后写入下一个文件
+SEGMENT_MAX_BYTES = int(os.getenv("RESULT_ARCHIVE_SEGMENT_MAX_BYTES", str(256 * 1024 * 1024)))
+# 归档文件使用的压缩算法
+ARCHIVE_CODEC = compression.resolve_codec(os.getenv("RESULT_ARCHIVE_CODEC", "auto"))
+
+_results = models.OptimizationResult.__table__
+_index = models.ArchivedResult.__table__
+_stats = models.ArchivedResultStats.__table__
+
+# 归档时写入的结果字段（与 OptimizationResultView 一致）
+_ARCHIVE_COLUMNS = [
+    column for column in _results.columns if column.name not in ("test_input", "test_input_hash")
+]
+
+# 已解压的数据帧缓存：键为 (文件名, 偏移)
+_frame_cache = LRUCache(max_items=256, max_size=64 * 1024 * 1024)
+
+# 同一进程内的归档批次串行执行（后台线程与命令行不会交错写文件）
+_archive_lock = threading.Lock()
+_background_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+# ===========================================
+# 归档文件读写
+# ===========================================
+
+def _segment_path(name: str) -> str:
+    return os.path.join(ARCHIVE_DIR, name)
+
+
+def _current_segment(incoming: int) -> str:
+    """当月的归档文件中第一个还能容纳 incoming 字节的文件名"""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    month = datetime.utcnow().strftime("%Y%m")
+    number = 1
+    while True:
+        name = f"results-{month}-{number:03d}.arc"
+        path = _segment_path(name)
+        if not os.path.exists(path) or os.path.getsize(path) + incoming <= SEGMENT_MAX_BYTES:
+            return name
+        number += 1
+
+
+def _append_frame(records: List[Dict[str, Any]]):
+    """将一批记录压缩为一帧追加到归档文件并落盘，返回 (文件名, 偏移, 长度)"""
+    payload = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in records)
+    frame = compression.encode(payload.encode("utf-8"), ARCHIVE_CODEC)
+    name = _current_segment(len(frame))
+    with open(_segment_path(name), "ab") as f:
+        offset = f.tell()
+        f.write(frame)
+        f.flush()
+        os.fsync(f.fileno())
+    return name, offset, len(frame)
+
+
+def _read_frame(segment: str, offset: int, length: int) -> Dict[int, Dict[str, Any]]:
+    """读取并解压一帧，返回 结果ID -> 记录"""
+    key = (segment, offset)
+    payload = _frame_cache.get(key)
+    if payload is None:
+        with open(_segment_path(segment), "rb") as f:
+            f.seek(offset)
+            payload = compression.decode(f.read(length))
+        _frame_cache.set(key, payload)
+    records = (json.loads(line) for line in payload.decode("utf-8").splitlines() if line)
+    return {record["id"]: record for record in records}
+
+
+# ===========================================
+# 归档
+# ===========================================
+
+def keep_cutoffs(connection, keep: int) -> Dict[int, int]:
+    """
+    按保留数量计算每个版本的截止ID：版本 -> 第 keep+1 新的结果ID，不超过该ID的结果都应归档
+
+    只包含结果数超过 keep 的版本。每轮归档只计算一次（窗口函数需扫描整张结果表）：
+    之后写入的结果ID更大，已超出保留数量的结果不会重新回到最新的 keep 条之内
+    """
+    ranked = select(
+        _results.c.version_id,
+        _results.c.id,
+        func.row_number().over(partition_by=_results.c.version_id, order_by=_results.c.id.desc()).label("rank")
+    ).subquery()
+    return dict(connection.execute(
+        select(ranked.c.version_id, ranked.c.id).where(ranked.c.rank == int(keep) + 1)
+    ).all())
+
+
+def _candidate_ids(connection, days: int, cutoffs: Optional[Dict[int, int]], batch_size: int) -> List[int]:
+    """
+    取一批符合保留策略、需要归档的结果ID
+
+    cutoffs 为 keep_cutoffs 的结果：按版本依次取ID不超过截止值的结果（走 version_id 索引的范围扫描），
+    已取完的版本从 cutoffs 中移除，同一轮的后续批次不再查询
+    """
+    ids: List[int] = []
+    if days:
+        # created_at 以 SQLite 的 "YYYY-MM-DD HH:MM:SS" 文本保存，与 datetime() 的结果可直接比较
+        ids = connection.execute(
+            select(_results.c.id).where(_results.c.created_at < func.datetime("now", f"-{int(days)} days"))
+            .order_by(_results.c.id).limit(batch_size)
+        ).scalars().all()
+    selected = set(ids)
+    for version_id in sorted(cutoffs or ()):
+        wanted = batch_size - len(selected)
+        if wanted <= 0:
+            break
+        found = connection.execute(
+            select(_results.c.id).where(
+                _results.c.version_id == version_id, _results.c.id <= cutoffs[version_id]
+            ).order_by(_results.c.id).limit(wanted)
+        ).scalars().all()
+        if len(found) < wanted:
+            del cutoffs[version_id]
+        selected.update(found)
+    return sorted(selected)
+
+
+def _aggregate(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """一批记录的聚合值（可与已有统计直接相加）"""
+    executions = [r["execution_time"] for r in records if r["execution_time"] is not None]
+    ratings = [r["user_rating"] for r in records if r["user_rating"] is not None]
+    created = [r["created_at"] for r in records if r["created_at"] is not None]
+    return {
+        "result_count": len(records),
+        "error_count": sum(1 for r in records if r["is_error"]),
+        "execution_time_sum": sum(executions),
+        "execution_time_count": len(executions),
+        "input_tokens_sum": sum(r["input_tokens"] or 0 for r in records),
+        "output_tokens_sum": sum(r["output_tokens"] or 0 for r in records),
+        "total_tokens_sum": sum(r["total_tokens"] or 0 for r in records),
+        "cost_sum": sum(r["cost"] or 0 for r in records),
+        "rating_sum": sum(ratings),
+        "rating_count": len(ratings),
+        "first_created_at": min(created) if created else None,
+        "last_created_at": max(created) if created else None,
+    }
+
+
+def _merge_stats(connection, version_id: int, values: Dict[str, Any]):
+    insert = sqlite_insert(_stats).values(version_id=version_id, **values)
+    merged = {
+        name: _stats.c[name] + insert.excluded[name]
+        for name in values if name not in ("first_created_at", "last_created_at")
+    }
+    # SQLite 的多参数 min/max 遇到 NULL 返回 NULL，用 coalesce 取非空的一侧
+    for name, pick in (("first_created_at", func.min), ("last_created_at", func.max)):
+        current, incoming = _stats.c[name], insert.excluded[name]
+        merged[name] = func.coalesce(pick(current, incoming), current, incoming)
+    merged["updated_at"] = func.now()
+    connection.execute(insert.on_conflict_do_update(index_elements=[_stats.c.version_id], set_=merged))
+
+
+def archive_batch(engine, days: int = None, keep: int = None, batch_size: int = 500,
+                  cutoffs: Optional[Dict[int, int]] = None) -> Dict[str, int]:
+    """
+    归档一批符合保留策略的结果
+
+    连续归档多批时由调用方传入 keep_cutoffs 的结果（见 run_incremental），未传入时本批单独计算。
+    返回本批归档的行数、数据帧数和写入字节数；rows 为0表示已没有需要归档的结果
+    """
+    days = RETENTION_DAYS if days is None else days
+    keep = RETENTION_KEEP if keep is None else keep
+    report = {"rows": 0, "frames": 0, "bytes": 0}
+    if not days and not keep:
+        return report
+
+    with _archive_lock, engine.begin() as connection:
+        if keep and cutoffs is None:
+            cutoffs = keep_cutoffs(connection, keep)
+        ids = _candidate_ids(connection, days, cutoffs if keep else None, batch_size)
+        if not ids:
+            return report
+        rows = connection.execute(
+            select(*_ARCHIVE_COLUMNS, _results.c.test_input, _results.c.test_input_hash)
+            .where(_results.c.id.in_(ids))
+            .order_by(_results.c.version_id, _results.c.id)
+        ).all()
+        if not rows:
+            return report
+
+        blob_store.prefetch(connection, (row.test_input_hash for row in rows))
+        groups: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for row in rows:
+            record = {column.name: getattr(row, column.name) for column in _ARCHIVE_COLUMNS}
+            record["test_input"] = (
+                blob_store.load(connection, row.test_input_hash) if row.test_input_hash else row.test_input
+            )
+            groups[row.version_id].append(record)
+
+        index_rows = []
+        for version_id, records in groups.items():
+            segment, offset, length = _append_frame(records)
+            index_rows.extend(
+                {"id": r["id"], "version_id": version_id, "created_at": r["created_at"],
+                 "segment": segment, "frame_offset": offset, "frame_length": length}
+                for r in records
+            )
+            _merge_stats(connection, version_id, _aggregate(records))
+            report["frames"] += 1
+            report["bytes"] += length
+
+        connection.execute(_index.insert(), index_rows)
+        for row in rows:
+            blob_store.release(connection, row.test_input_hash)
+        connection.execute(delete(_results).where(_results.c.id.in_([row.id for row in rows])))
+        report["rows"] = len(rows)
+    return report
+
+
+def incremental_vacuum(engine) -> Dict[str, Any]:
+    """
+    归还删除行释放的空闲页
+
+    需要数据库处于 auto_vacuum=INCREMENTAL 模式（新建数据库默认开启，
+    旧数据库可通过 `python -m app.cli archive-results --enable-incremental-vacuum` 转换）
+    """
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        mode = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        free_before = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        if mode != 2:
+            return {"auto_vacuum": mode, "free_pages": free_before, "freed_pages": 0}
+        # sqlite3 的 execute 只执行该语句的一步（释放一页），executescript 会执行到底
+        connection.connection.driver_connection.executescript("PRAGMA incremental_vacuum;")
+        free_after = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+    return {"auto_vacuum": mode, "free_pages": free_after, "freed_pages": free_before - free_after}
+
+
+def run_incremental(engine, days: int = None, keep: int = None, batch_size: int = 500,
+                    stop: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    逐批归档直到没有符合条件的结果（或收到停止信号），然后归还空闲页
+
+    按保留数量归档时，每个版本的截止ID在开始时计算一次，各批次只做索引范围扫描
+    """
+    keep = RETENTION_KEEP if keep is None else keep
+    report = {"rows": 0, "frames": 0, "bytes": 0, "batches": 0}
+    cutoffs = None
+    if keep:
+        with engine.connect() as connection:
+            cutoffs = keep_cutoffs(connection, keep)
+    while stop is None or not stop.is_set():
+        batch = archive_batch(engine, days, keep, batch_size, cutoffs)
+        if not batch["rows"]:
+            break
+        report["batches"] += 1
+        for key in ("rows", "frames", "bytes"):
+            report[key] += batch[key]
+    report["vacuum"] = incremental_vacuum(engine)
+    return report
+
+
+def ensure_result_autoincrement(engine):
+    """
+    将旧数据库的结果表重建为 AUTOINCREMENT 表
+
+    没有 AUTOINCREMENT 时 SQLite 会把当前最大ID加一分配给新行，归档并删除ID最大的结果后这些ID会被重用，
+    再次归档时与 archived_results 的主键冲突。重建时ID序列从已归档的最大ID之后开始，
+    已与归档结果重复的行分配新ID。只在首次启动时复制一次整张表
+    """
+    with engine.begin() as connection:
+        sql = connection.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": _results.name}
+        ).scalar()
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            return
+        rebuilt = f"{_results.name}_rebuild"
+        columns = ", ".join(f'"{column.name}"' for column in _results.columns)
+        data_columns = ", ".join(f'"{column.name}"' for column in _results.columns if column.name != "id")
+        create = str(CreateTable(_results).compile(dialect=connection.dialect))
+        connection.exec_driver_sql(create.replace(_results.name, rebuilt, 1))
+        connection.execute(
+            text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, max("
+                 f"(SELECT coalesce(max(id), 0) FROM {_results.name}), "
+                 f"(SELECT coalesce(max(id), 0) FROM {_index.name})))"),
+            {"name": rebuilt}
+        )
+        connection.exec_driver_sql(
+            f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {_results.name} "
+            f"WHERE id NOT IN (SELECT id FROM {_index.name})"
+        )
+        renumbered = connection.exec_driver_sql(
+            f"INSERT INTO {rebuilt} ({data_columns}) SELECT {data_columns} FROM {_results.name} "
+            f"WHERE id IN (SELECT id FROM {_index.name}) ORDER BY id"
+        ).rowcount
+        connection.exec_driver_sql(f"DROP TABLE {_results.name}")
+        connection.exec_driver_sql(f"ALTER TABLE {rebuilt} RENAME TO {_results.name}")
+        for index in _results.indexes:
+            index.create(bind=connection)
+    logger.info("结果表已重建为 AUTOINCREMENT，%d 条与归档结果ID重复的结果分配了新ID", renumbered)
+
+
+def enable_incremental_vacuum(engine):
+    """将已有数据库切换为 auto_vacuum=INCREMENTAL（需要执行一次完整 VACUUM）"""
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+
+
+# ===========================================
+# 读取
+# ===========================================
+
+def read_archived(connection, version_id: int, after_id: Optional[int] = None,
+                  limit: int = 50, descending: bool = False) -> List[Dict[str, Any]]:
+    """按结果ID顺序读取某版本的归档结果，每个数据帧只读取和解压一次"""
+    query = select(_index).where(_index.c.version_id == version_id)
+    if after_id is not None:
+        query = query.where(_index.c.id < after_id if descending else _index.c.id > after_id)
+    order = _index.c.id.desc() if descending else _index.c.id.asc()
+    entries = connection.execute(query.order_by(order).limit(limit)).all()
+
+    frames: Dict[Any, Dict[int, Dict[str, Any]]] = {}
+    records = []
+    for entry in entries:
+        key = (entry.segment, entry.frame_offset)
+        if key not in frames:
+            frames[key] = _read_frame(entry.segment, entry.frame_offset, entry.frame_length)
+        record = frames[key].get(entry.id)
+        if record is None:
+            logger.error(f"归档结果 {entry.id} 不在索引指向的数据帧中: {entry.segment}@{entry.frame_offset}")
+            continue
+        records.append(record)
+    return records
+
+
+def archive_summary(connection, version_id: int) -> Optional[Dict[str, Any]]:
+    """某版本已归档结果的聚合统计，没有归档时返回None"""
+    row = connection.execute(select(_stats).where(_stats.c.version_id == version_id)).first()
+    if row is None:
+        return None
+    stats = dict(row._mapping)
+    return {
+        "version_id": version_id,
+        "result_count": stats["result_count"],
+        "error_count": stats["error_count"],
+        "success_rate": (
+            (stats["result_count"] - stats["error_count"]) / stats["result_count"] if stats["result_count"] else 0.0
+        ),
+        "average_execution_time": (
+            stats["execution_time_sum"] / stats["execution_time_count"] if stats["execution_time_count"] else None
+        ),
+        "average_rating": stats["rating_sum"] / stats["rating_count"] if stats["rating_count"] else None,
+        "input_tokens": stats["input_tokens_sum"],
+        "output_tokens": stats["output_tokens_sum"],
+        "total_tokens": stats["total_tokens_sum"],
+        "total_cost": stats["cost_sum"],
+        "first_created_at": stats["first_created_at"],
+        "last_created_at": stats["last_created_at"],
+    }
+
+
+@event.listens_for(models.PromptVersion, "after_delete")
+def _version_deleted(mapper, connection, target):
+    # 归档文件只追加不修改，删除版本时只清理索引和统计
+    connection.execute(delete(_index).where(_index.c.version_id == target.id))
+    connection.execute(delete(_stats).where(_stats.c.version_id == target.id))
+
+
+# ===========================================
+# 后台归档
+# ===========================================
+
+def start_background_archiver(engine):
+    """按 RESULT_ARCHIVE_INTERVAL 周期在后台线程中归档（未配置保留策略时不启动）"""
+    global _background_thread
+    if not (RETENTION_DAYS or RETENTION_KEEP):
+        return
+    if _background_thread is not None and _background_thread.is_alive():
+        return
+
+    def run():
+        while not _stop.is_set():
+            try:
+                report = run_incremental(engine, stop=_stop)
+                if report["rows"]:
+                    logger.info(f"结果归档完成: {report}")
+            except Exception as e:
+                logger.error(f"结果归档失败: {e}")
+            _stop.wait(ARCHIVE_INTERVAL)
+
+    _stop.clear()
+    _background_thread = threading.Thread(target=run, name="result-archiver", daemon=True)
+    _background_thread.start()
+
+
+def stop_background_archiver(timeout: float = 5.0):
+    """请求后台归档在当前批次结束后停止"""
+    _stop.set()
+    if _background_thread is not None:
+        _background_thread.join(timeout)
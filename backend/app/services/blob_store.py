@@ -0,0 +1,283 @@
+"""
+内容块存储 - 按SHA-256寻址的去重文本存储
+
+相同的文本（复制的模板、在大量结果中重复使用的测试输入）只在 content_blobs
+表中保存一份，引用方只记录哈希：
+- prompt_versions：content_encoding 为 blob 的版本以 content_hash 引用内容块
+- optimization_results：test_input_hash 引用测试输入
+
+每个引用使 ref_count 加一，引用方被修改或删除时减一，归零即删除内容块。
+判断内容是否相同只需比较带索引的哈希列。ORM 写入由本模块的事件自动维护计数，
+绕过 ORM 的批量写入/删除须自行调用 acquire/release。
+"""
+import hashlib
+import logging
+import os
+import zlib
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import object_session
+
+from ..core.cache import LRUCache
+from ..models import prompt as models
+
+logger = logging.getLogger(__name__)
+
+_blobs = models.ContentBlob.__table__
+_versions = models.PromptVersion.__table__
+_results = models.OptimizationResult.__table__
+
+# 还原后的文本缓存：键为内容哈希（内容寻址，缓存无需失效），按字符数限制总大小
+text_cache = LRUCache(
+    max_items=8192,
+    max_size=int(os.getenv("CONTENT_CACHE_MAX_CHARS", str(32 * 1024 * 1024)))
+)
+
+# prefetch 单条 IN 查询的最大哈希数
+_PREFETCH_CHUNK = 500
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def acquire(connection, text: str, count: int = 1) -> str:
+    """
+    为文本增加 count 个引用，内容块不存在时创建，返回内容哈希
+
+    先尝试递增计数，未命中再插入：写语句使本事务持有SQLite写锁，并发写入不会重复插入
+    """
+    digest = content_hash(text)
+    result = connection.execute(
+        update(_blobs).where(_blobs.c.hash == digest).values(ref_count=_blobs.c.ref_count + count)
+    )
+    if result.rowcount == 0:
+        raw = text.encode("utf-8")
+        connection.execute(_blobs.insert().values(
+            hash=digest, data=zlib.compress(raw, 9), size=len(raw), ref_count=count
+        ))
+    text_cache.set(digest, text)
+    return digest
+
+
+def release(connection, digest: Optional[str]):
+    """减少一个引用，计数归零时删除内容块"""
+    if digest is None:
+        return
+    connection.execute(
+        update(_blobs).where(_blobs.c.hash == digest).values(ref_count=_blobs.c.ref_count - 1)
+    )
+    connection.execute(delete(_blobs).where(_blobs.c.hash == digest, _blobs.c.ref_count <= 0))
+
+
+def exists(connection, digest: str) -> bool:
+    return connection.execute(select(_blobs.c.hash).where(_blobs.c.hash == digest)).first() is not None
+
+
+def load(connection, digest: str) -> str:
+    """读取内容块的原文"""
+    text = text_cache.get(digest)
+    if text is None:
+        data = connection.execute(select(_blobs.c.data).where(_blobs.c.hash == digest)).scalar()
+        if data is None:
+            raise LookupError(f"内容块 {digest} 不存在")
+        text = zlib.decompress(data).decode("utf-8")
+        text_cache.set(digest, text)
+    return text
+
+
+def prefetch(connection, digests: Iterable[Optional[str]]):
+    """批量读取尚未缓存的内容块，避免逐行查询"""
+    missing = [d for d in set(digests) if d is not None and text_cache.get(d) is None]
+    for start in range(0, len(missing), _PREFETCH_CHUNK):
+        rows = connection.execute(
+            select(_blobs.c.hash, _blobs.c.data).where(_blobs.c.hash.in_(missing[start:start + _PREFETCH_CHUNK]))
+        )
+        for digest, data in rows:
+            text_cache.set(digest, zlib.decompress(data).decode("utf-8"))
+
+
+def load_many(connection, digests: Iterable[Optional[str]]) -> Dict[str, str]:
+    """批量读取内容块原文，返回 哈希 -> 原文（不受缓存容量限制，适合大批量导出）"""
+    texts = {}
+    missing = []
+    for digest in set(digests):
+        if digest is None:
+            continue
+        text = text_cache.get(digest)
+        if text is None:
+            missing.append(digest)
+        else:
+            texts[digest] = text
+    for start in range(0, len(missing), _PREFETCH_CHUNK):
+        rows = connection.execute(
+            select(_blobs.c.hash, _blobs.c.data).where(_blobs.c.hash.in_(missing[start:start + _PREFETCH_CHUNK]))
+        )
+        for digest, data in rows:
+            texts[digest] = zlib.decompress(data).decode("utf-8")
+    return texts
+
+
+def resolve_text(obj, digest: str) -> str:
+    """在ORM对象所属会话的连接上读取内容块"""
+    session = object_session(obj)
+    if session is not None:
+        return load(session.connection(), digest)
+    from ..database import engine
+    with engine.connect() as connection:
+        return load(connection, digest)
+
+
+# ===========================================
+# 测试输入的引用维护
+# ===========================================
+
+def _pending_test_input(target):
+    """取出通过 test_input 属性设置、尚未写入的值；未设置时返回 (False, None)"""
+    if "_test_input_text" in target.__dict__:
+        return True, target.__dict__.pop("_test_input_text")
+    return False, None
+
+
+@event.listens_for(models.OptimizationResult, "before_insert")
+def _result_before_insert(mapper, connection, target):
+    pending, text = _pending_test_input(target)
+    if not pending:
+        text = target._test_input
+    if text is not None:
+        target.test_input_hash = acquire(connection, text)
+        target._test_input = None
+
+
+@event.listens_for(models.OptimizationResult, "before_update")
+def _result_before_update(mapper, connection, target):
+    pending, text = _pending_test_input(target)
+    if not pending:
+        return
+    old = connection.execute(select(_results.c.test_input_hash).where(_results.c.id == target.id)).scalar()
+    target.test_input_hash = acquire(connection, text) if text is not None else None
+    target._test_input = None
+    release(connection, old)
+
+
+@event.listens_for(models.OptimizationResult, "before_delete")
+def _result_before_delete(mapper, connection, target):
+    old = connection.execute(select(_results.c.test_input_hash).where(_results.c.id == target.id)).scalar()
+    release(connection, old)
+
+
+# ===========================================
+# 迁移与引用计数校验
+# ===========================================
+
+def migrate_existing(engine, batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    将旧的明文测试输入和压缩全文版本转换为内容块引用，按批提交
+
+    返回报告：迁移的行数、去重命中数以及迁移前后占用的字节数
+    """
+    from .version_store import ENCODING_BLOB, ENCODING_FULL, decode_full
+
+    report = {"test_inputs": 0, "versions": 0, "deduplicated": 0, "bytes_before": 0}
+    blobs_before = stored_bytes(engine)
+
+    def migrate(connection, text, stored_size):
+        digest = content_hash(text)
+        if exists(connection, digest):
+            report["deduplicated"] += 1
+        report["bytes_before"] += stored_size
+        return acquire(connection, text)
+
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(_results.c.id, _results.c.test_input).where(
+                    _results.c.id > last_id,
+                    _results.c.test_input.is_not(None),
+                    _results.c.test_input_hash.is_(None)
+                ).order_by(_results.c.id).limit(batch_size)
+            ).all()
+            for row in rows:
+                connection.execute(update(_results).where(_results.c.id == row.id).values(
+                    test_input_hash=migrate(connection, row.test_input, len(row.test_input.encode("utf-8"))),
+                    test_input=None
+                ))
+        if not rows:
+            break
+        last_id = rows[-1].id
+        report["test_inputs"] += len(rows)
+
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(_versions.c.id, _versions.c.content_data).where(
+                    _versions.c.id > last_id,
+                    _versions.c.content_encoding == ENCODING_FULL
+                ).order_by(_versions.c.id).limit(batch_size)
+            ).all()
+            for row in rows:
+                digest = migrate(connection, decode_full(row.content_data), len(row.content_data))
+                connection.execute(update(_versions).where(_versions.c.id == row.id).values(
+                    content_encoding=ENCODING_BLOB, content_data=None, content_hash=digest
+                ))
+        if not rows:
+            break
+        last_id = rows[-1].id
+        report["versions"] += len(rows)
+
+    report["bytes_after"] = stored_bytes(engine) - blobs_before
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    report["repaired_refcounts"] = verify_refcounts(engine)
+    return report
+
+
+def stored_bytes(engine) -> int:
+    """内容块压缩后占用的总字节数"""
+    with engine.connect() as connection:
+        return connection.execute(select(func.coalesce(func.sum(func.length(_blobs.c.data)), 0))).scalar()
+
+
+def verify_refcounts(engine) -> int:
+    """
+    按实际引用重新计算所有内容块的引用计数，删除无引用的内容块
+
+    返回被修正的内容块数量（正常情况下为0）
+    """
+    from .version_store import ENCODING_BLOB
+
+    references = select(_versions.c.content_hash.label("hash")).where(
+        _versions.c.content_encoding == ENCODING_BLOB
+    ).union_all(
+        select(_results.c.test_input_hash.label("hash")).where(_results.c.test_input_hash.is_not(None))
+    ).subquery()
+    with engine.begin() as connection:
+        actual = dict(connection.execute(
+            select(references.c.hash, func.count()).group_by(references.c.hash)
+        ).all())
+        repaired = 0
+        for digest, ref_count in connection.execute(select(_blobs.c.hash, _blobs.c.ref_count)).all():
+            expected = actual.get(digest, 0)
+            if expected == ref_count:
+                continue
+            repaired += 1
+            if expected == 0:
+                connection.execute(delete(_blobs).where(_blobs.c.hash == digest))
+            else:
+                connection.execute(update(_blobs).where(_blobs.c.hash == digest).values(ref_count=expected))
+    if repaired:
+        logger.warning(f"已修正 {repaired} 个内容块的引用计数")
+    return repaired
+
+
+def stats(engine) -> Dict[str, Any]:
+    """内容块存储的统计信息"""
+    with engine.connect() as connection:
+        row = connection.execute(select(
+            func.count(), func.coalesce(func.sum(_blobs.c.ref_count), 0),
+            func.coalesce(func.sum(_blobs.c.size), 0), func.coalesce(func.sum(func.length(_blobs.c.data)), 0)
+        )).one()
+    return {"blobs": row[0], "references": row[1], "raw_bytes": row[2], "stored_bytes": row[3],
+            "cache": text_cache.stats()}
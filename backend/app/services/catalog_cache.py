@@ -0,0 +1,199 @@
+"""
+目录响应缓存 - 进程内缓存序列化后的提示词列表、提示词详情和版本详情响应
+
+读多写少：命中时只需一次主键查询读取缓存代数，不再查询和序列化。
+- 本进程内的写入：提交后按提示词ID精确删除相关条目（以及所有列表条目），其余条目继续有效
+- 其他进程的写入：每次变更在同一事务中使 catalog_generation 加一，
+  读取时发现代数变化即清空本地缓存
+
+提示词和版本的 ORM 写入由本模块的事件自动处理（包括路由、导入等所有经过 Session 的写入）；
+依赖结果数据的响应（summary、嵌入结果）不缓存。
+其他按提示词失效的进程内缓存（如 prompt_runtime 的版本解析缓存）可通过 register 共用同一套失效机制。
+"""
+import logging
+import os
+import threading
+from typing import Any, Hashable, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+from ..core.cache import LRUCache
+from ..models import prompt as models
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("CATALOG_CACHE", "true").lower() == "true"
+MAX_ITEMS = int(os.getenv("CATALOG_CACHE_MAX_ITEMS", "2048"))
+# 缓存的响应体总字节数上限
+MAX_BYTES = int(os.getenv("CATALOG_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_generation = models.CatalogGeneration.__table__
+_ROW_ID = 1
+
+
+class CachedResponse(NamedTuple):
+    prompt_id: Optional[int]  # 所属提示词；列表响应为None，任何提示词变更都会删除
+    epoch: int
+    etag: str
+    cache_control: str
+    body: bytes
+
+
+class Token(NamedTuple):
+    """一次读取开始时的缓存状态，写入缓存时用于判断期间是否发生过变更"""
+    epoch: Optional[int]
+    writes: int
+
+
+cache = LRUCache(max_items=MAX_ITEMS, max_size=MAX_BYTES, size_of=lambda entry: len(entry.body))
+# 共用失效机制的所有缓存；条目须有 prompt_id 和 epoch 属性
+_caches: List[LRUCache] = [cache]
+
+_lock = threading.Lock()
+# 本地缓存对应的数据库代数；epoch 在清空缓存时加一，旧 epoch 的条目一律无效
+_seen_generation: Optional[int] = None
+_epoch = 0
+# 本进程提交的变更次数，读取期间有变更提交则不写入缓存
+_local_writes = 0
+
+
+def register(target: LRUCache):
+    """登记一个按提示词失效的缓存，之后与响应缓存一同删除或清空"""
+    with _lock:
+        _caches.append(target)
+
+
+def _clear_all():
+    for target in _caches:
+        target.clear()
+
+
+def ensure_generation(engine):
+    """确保代数行存在"""
+    with engine.begin() as conn:
+        if conn.execute(select(_generation.c.id).where(_generation.c.id == _ROW_ID)).first() is None:
+            conn.execute(_generation.insert().values(id=_ROW_ID, generation=0))
+
+
+def read_generation(connection) -> int:
+    value = connection.execute(select(_generation.c.generation).where(_generation.c.id == _ROW_ID)).scalar()
+    return value or 0
+
+
+def bump_generation(connection) -> int:
+    """在当前事务中使代数加一，返回新代数"""
+    return connection.execute(
+        update(_generation).where(_generation.c.id == _ROW_ID)
+        .values(generation=_generation.c.generation + 1)
+        .returning(_generation.c.generation)
+    ).scalar() or 0
+
+
+def begin(connection) -> Token:
+    """读取前调用：核对数据库代数，其他进程有写入时清空本地缓存"""
+    global _seen_generation, _epoch
+    generation = read_generation(connection)
+    with _lock:
+        if generation != _seen_generation:
+            if _seen_generation is not None and generation < _seen_generation:
+                # 读到的快照早于本进程已知的代数，本次读取不使用也不写入缓存
+                return Token(None, _local_writes)
+            _clear_all()
+            _epoch += 1
+            _seen_generation = generation
+        return Token(_epoch, _local_writes)
+
+
+def lookup(key: Hashable, token: Token, target: LRUCache = cache) -> Optional[Any]:
+    if not ENABLED or token.epoch is None:
+        return None
+    entry = target.get(key)
+    if entry is None or entry.epoch != token.epoch:
+        return None
+    return entry
+
+
+def store(key: Hashable, token: Token, prompt_id: Optional[int], etag: str, cache_control: str, body: bytes):
+    """缓存一个响应；读取开始后有变更提交或缓存已清空时放弃"""
+    put(cache, key, token, CachedResponse(prompt_id, token.epoch, etag, cache_control, body))
+
+
+def put(target: LRUCache, key: Hashable, token: Token, entry: Any):
+    """向登记的缓存写入条目（entry.epoch 应为 token.epoch）；读取开始后有变更提交或缓存已清空时放弃"""
+    if not ENABLED or token.epoch is None:
+        return
+    with _lock:
+        if token.epoch != _epoch or token.writes != _local_writes:
+            return
+        target.set(key, entry)
+
+
+def invalidate(prompt_ids: Iterable[int], generation: Optional[int] = None):
+    """
+    本进程提交变更后调用：删除这些提示词的条目和所有列表条目
+
+    generation 为该事务写入的新代数；若期间还有其他进程的写入，则清空全部缓存
+    """
+    global _seen_generation, _epoch, _local_writes
+    prompt_ids: Set[int] = set(prompt_ids)
+    with _lock:
+        _local_writes += 1
+        if generation is not None and _seen_generation is not None and generation == _seen_generation + 1:
+            for target in _caches:
+                target.pop_where(lambda key, entry: entry.prompt_id is None or entry.prompt_id in prompt_ids)
+            _seen_generation = generation
+        else:
+            _clear_all()
+            _epoch += 1
+            _seen_generation = generation
+
+
+def clear():
+    global _epoch, _seen_generation
+    with _lock:
+        _clear_all()
+        _epoch += 1
+        _seen_generation = None
+
+
+# ===========================================
+# ORM 事件：同一事务内使代数加一，提交后精确失效
+# ===========================================
+
+def _record_change(connection, target, prompt_id: Optional[int]):
+    session = Session.object_session(target)
+    if session is None:
+        bump_generation(connection)
+        return
+    if "catalog_generation" not in session.info:
+        session.info["catalog_generation"] = bump_generation(connection)
+    session.info.setdefault("catalog_changed", set()).add(prompt_id)
+
+
+@event.listens_for(models.Prompt, "after_insert")
+@event.listens_for(models.Prompt, "after_update")
+@event.listens_for(models.Prompt, "after_delete")
+def _prompt_changed(mapper, connection, target):
+    _record_change(connection, target, target.id)
+
+
+@event.listens_for(models.PromptVersion, "after_insert")
+@event.listens_for(models.PromptVersion, "after_update")
+@event.listens_for(models.PromptVersion, "after_delete")
+def _version_changed(mapper, connection, target):
+    _record_change(connection, target, target.prompt_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _session_committed(session):
+    changed = session.info.pop("catalog_changed", None)
+    generation = session.info.pop("catalog_generation", None)
+    if changed:
+        invalidate((prompt_id for prompt_id in changed if prompt_id is not None), generation)
+
+
+@event.listens_for(Session, "after_rollback")
+def _session_rolled_back(session):
+    session.info.pop("catalog_changed", None)
+    session.info.pop("catalog_generation", None)
@@ -0,0 +1,206 @@
+"""
+结果的列式导出 - 将优化结果（附带提示词和版本信息）写为 Parquet 或 Arrow IPC 文件
+
+按结果ID分批读取，每批写为一个行组（Parquet）或记录批（Arrow），边写边输出，
+内存占用只与行组大小有关。Arrow IPC 文件可被分析工具以内存映射零拷贝加载。
+依赖 pyarrow（已列入 requirements.txt）；未安装时导出接口返回 501，其余功能不受影响。
+"""
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from ..models import prompt as models
+from . import blob_store
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖
+    pa = None
+
+FORMAT_PARQUET = "parquet"
+FORMAT_ARROW = "arrow"
+MEDIA_TYPES = {
+    FORMAT_PARQUET: "application/vnd.apache.parquet",
+    FORMAT_ARROW: "application/vnd.apache.arrow.file",
+}
+
+# 每个行组的行数
+ROW_GROUP_SIZE = int(os.getenv("COLUMNAR_EXPORT_ROW_GROUP_SIZE", "50000"))
+# Parquet 的列压缩算法
+PARQUET_COMPRESSION = os.getenv("COLUMNAR_EXPORT_COMPRESSION", "zstd")
+
+_results = models.OptimizationResult.__table__
+_versions = models.PromptVersion.__table__
+_prompts = models.Prompt.__table__
+
+# 导出列 -> (查询列, Arrow 类型名)；类型在 pyarrow 可用时解析
+_COLUMNS = {
+    "id": (_results.c.id, "int64"),
+    "version_id": (_results.c.version_id, "int64"),
+    "prompt_id": (_versions.c.prompt_id, "int64"),
+    "prompt_title": (_prompts.c.title, "string"),
+    "prompt_category": (_prompts.c.category, "string"),
+    "version_number": (_versions.c.version_number, "int32"),
+    "version_name": (_versions.c.version_name, "string"),
+    "is_baseline": (_versions.c.is_baseline, "bool_"),
+    "llm_provider": (_results.c.llm_provider, "string"),
+    "llm_model": (_results.c.llm_model, "string"),
+    "test_input": (None, "string"),
+    "output_text": (_results.c.output_text, "string"),
+    "execution_time": (_results.c.execution_time, "float64"),
+    "input_tokens": (_results.c.input_tokens, "int64"),
+    "output_tokens": (_results.c.output_tokens, "int64"),
+    "total_tokens": (_results.c.total_tokens, "int64"),
+    "cost": (_results.c.cost, "float64"),
+    "user_rating": (_results.c.user_rating, "int8"),
+    "quality_score": (_results.c.quality_score, "float64"),
+    "is_error": (_results.c.is_error, "bool_"),
+    "error_type": (_results.c.error_type, "string"),
+    "error_message": (_results.c.error_message, "string"),
+    "created_at": (_results.c.created_at, "timestamp"),
+}
+COLUMN_NAMES = list(_COLUMNS)
+
+
+class ColumnarExportUnavailable(RuntimeError):
+    """未安装 pyarrow"""
+    pass
+
+
+def ensure_available():
+    if pa is None:
+        raise ColumnarExportUnavailable("列式导出需要安装可选依赖 pyarrow（pip install pyarrow）")
+
+
+def _arrow_type(name: str):
+    if name == "timestamp":
+        return pa.timestamp("us", tz="UTC")
+    return getattr(pa, name)()
+
+
+def schema_for(columns: List[str]):
+    # 低基数的文本列（提供商、模型等）由 Parquet 自动字典编码；Arrow IPC 文件不允许各批字典不同，保持普通字符串
+    return pa.schema([pa.field(name, _arrow_type(_COLUMNS[name][1])) for name in columns])
+
+
+def _query(columns: List[str], filters: Dict[str, Any]):
+    selected = [_COLUMNS[name][0].label(name) for name in columns if _COLUMNS[name][0] is not None]
+    if "test_input" in columns:
+        selected += [_results.c.test_input.label("_legacy_input"), _results.c.test_input_hash.label("_input_hash")]
+    query = select(_results.c.id.label("_id"), *selected).select_from(
+        _results.join(_versions, _versions.c.id == _results.c.version_id)
+        .join(_prompts, _prompts.c.id == _versions.c.prompt_id)
+    )
+    if filters.get("prompt_ids"):
+        query = query.where(_versions.c.prompt_id.in_(filters["prompt_ids"]))
+    if filters.get("version_ids"):
+        query = query.where(_results.c.version_id.in_(filters["version_ids"]))
+    if filters.get("provider") is not None:
+        query = query.where(_results.c.llm_provider == filters["provider"])
+    if filters.get("model") is not None:
+        query = query.where(_results.c.llm_model == filters["model"])
+    if filters.get("created_after") is not None:
+        query = query.where(_results.c.created_at >= filters["created_after"])
+    if filters.get("created_before") is not None:
+        query = query.where(_results.c.created_at < filters["created_before"])
+    return query
+
+
+def record_batches(connection, columns: List[str], filters: Dict[str, Any],
+                   row_group_size: int = ROW_GROUP_SIZE) -> Iterator["pa.RecordBatch"]:
+    """按结果ID分批查询并转换为 Arrow 记录批"""
+    schema = schema_for(columns)
+    query = _query(columns, filters)
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            query.where(_results.c.id > last_id).order_by(_results.c.id).limit(row_group_size)
+        ).mappings().all()
+        if not rows:
+            return
+        data = {}
+        for name in columns:
+            if name == "test_input":
+                texts = blob_store.load_many(connection, (row["_input_hash"] for row in rows))
+                data[name] = [
+                    texts[row["_input_hash"]] if row["_input_hash"] is not None else row["_legacy_input"]
+                    for row in rows
+                ]
+            else:
+                data[name] = [row[name] for row in rows]
+        yield pa.RecordBatch.from_pydict(data, schema=schema)
+        last_id = rows[-1]["_id"]
+
+
+class _ChunkSink:
+    """收集写入器输出的字节，供流式响应逐块取出"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def export_stream(connection_factory, output_format: str = FORMAT_PARQUET, columns: Optional[List[str]] = None,
+                  row_group_size: int = ROW_GROUP_SIZE, **filters) -> Iterator[bytes]:
+    """
+    生成导出文件的字节流
+
+    connection_factory 返回数据库连接的上下文管理器（如 engine.connect），
+    每写完一个行组就输出已生成的字节。客户端中途断开（生成器被关闭）或出错时同样关闭写入器和数据库连接
+    """
+    ensure_available()
+    columns = columns or COLUMN_NAMES
+    schema = schema_for(columns)
+    sink = _ChunkSink()
+    stream = pa.PythonFile(sink, mode="w")
+    if output_format == FORMAT_PARQUET:
+        writer = pq.ParquetWriter(stream, schema, compression=PARQUET_COMPRESSION)
+    else:
+        # Arrow IPC 文件不压缩，读取方可直接内存映射
+        writer = pa.ipc.new_file(stream, schema)
+
+    finished = False
+    try:
+        with connection_factory() as connection:
+            for batch in record_batches(connection, columns, filters, row_group_size):
+                writer.write_batch(batch)
+                data = sink.drain()
+                if data:
+                    yield data
+        finished = True
+        writer.close()
+        yield sink.drain()
+    finally:
+        if not finished:
+            # 未写完的文件直接丢弃，写入器只需释放
+            writer.close()
+            sink.drain()
+
+
+def default_filename(output_format: str) -> str:
+    suffix = "parquet" if output_format == FORMAT_PARQUET else "arrow"
+    return f"optimization-results-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{suffix}"
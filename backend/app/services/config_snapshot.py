@@ -0,0 +1,153 @@
+"""
+API配置快照 - 进程内缓存 llm_api_configs 的全部配置及其派生数据
+
+配置只有几条、读远多于写：读取时只执行一次聚合查询得到变更戳（配置数、最大ID、
+最近更新和测试时间、各测试状态的数量），与快照的变更戳一致即直接使用快照；
+列表、启用列表、状态统计和可用提供商均由快照一次遍历计算并预先序列化。
+- 本进程内经过 Session 的写入：提交后由本模块的事件标记快照失效
+- 其他进程的写入或同一秒内的修改：由变更戳的变化发现
+"""
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import String, case, event, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from ..core import http_cache
+from ..core.responses import dumps, to_json
+from ..models.api_config import LLMAPIConfig
+from ..schemas.api_config import (
+    ConfigStatusResponse,
+    LLMAPIConfig as LLMAPIConfigSchema,
+    ProvidersResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+_configs = LLMAPIConfig.__table__
+
+
+class ConfigSnapshot:
+    """某一时刻的全部API配置（只读）"""
+
+    def __init__(self, stamp: tuple, rows: Sequence, writes: int):
+        self.stamp = stamp
+        self.writes = writes
+        self.etag = http_cache.make_etag("api-configs", *stamp)
+
+        self.configs: List[LLMAPIConfigSchema] = []
+        self.enabled: List[LLMAPIConfigSchema] = []
+        self.by_id: Dict[int, LLMAPIConfigSchema] = {}
+        working = 0
+        last_updated = None
+        for row in rows:
+            config = LLMAPIConfigSchema.model_validate(dict(row))
+            self.configs.append(config)
+            self.by_id[config.id] = config
+            if config.is_enabled:
+                self.enabled.append(config)
+                if config.last_test_status == "success":
+                    working += 1
+            if config.updated_at is not None and (last_updated is None or config.updated_at > last_updated):
+                last_updated = config.updated_at
+
+        self.status = ConfigStatusResponse(
+            total_configs=len(self.configs),
+            enabled_configs=len(self.enabled),
+            working_configs=working,
+            last_updated=last_updated,
+        )
+        self.providers = ProvidersResponse(
+            providers=[config.provider for config in self.enabled],
+            configs=self.enabled,
+            models={config.provider: config.supported_models for config in self.enabled},
+        )
+
+        # 预先序列化的响应体
+        self.all_body = dumps(self.configs)
+        self.enabled_body = dumps(self.enabled)
+        self.status_body = to_json(self.status)
+        self.providers_body = to_json(self.providers)
+
+    def scoped_etag(self, scope: str) -> str:
+        return http_cache.make_etag("api-configs", scope, *self.stamp)
+
+    def config_etag(self, config: LLMAPIConfigSchema) -> str:
+        return http_cache.make_etag(
+            "api-config", config.id, config.updated_at, config.last_test_at, config.last_test_status
+        )
+
+
+_lock = threading.Lock()
+_snapshot: Optional[ConfigSnapshot] = None
+# 本进程提交的配置变更次数，快照加载后有变更提交即失效
+_local_writes = 0
+
+
+def read_stamp(connection) -> tuple:
+    """
+    配置的变更戳：增、删、改都会改变配置数、最大ID或最近更新时间之一
+
+    连接测试在同一秒内多次修改状态，另计入最近测试时间和各测试状态的数量
+    """
+    row = connection.execute(select(
+        func.count(_configs.c.id),
+        func.max(_configs.c.id),
+        func.max(type_coerce(_configs.c.updated_at, String)),
+        func.max(type_coerce(_configs.c.last_test_at, String)),
+        func.sum(case((_configs.c.last_test_status == "success", 1), else_=0)),
+        func.sum(case((_configs.c.last_test_status == "error", 1), else_=0)),
+    )).one()
+    return tuple(row)
+
+
+def get_snapshot(connection) -> ConfigSnapshot:
+    """返回当前配置快照；变更戳变化或本进程提交过配置变更时重新加载"""
+    global _snapshot
+    stamp = read_stamp(connection)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.stamp == stamp and snapshot.writes == _local_writes:
+        return snapshot
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is not None and snapshot.stamp == stamp and snapshot.writes == _local_writes:
+            return snapshot
+        # 先记下变更次数再加载：加载期间有提交则该快照下次读取时即失效
+        writes = _local_writes
+        rows = connection.execute(select(_configs).order_by(_configs.c.id)).mappings().all()
+        snapshot = ConfigSnapshot(stamp, rows, writes)
+        _snapshot = snapshot
+        return snapshot
+
+
+def invalidate():
+    global _local_writes
+    with _lock:
+        _local_writes += 1
+
+
+# ===========================================
+# ORM 事件：本进程提交配置变更后使快照失效
+# ===========================================
+
+@event.listens_for(LLMAPIConfig, "after_insert")
+@event.listens_for(LLMAPIConfig, "after_update")
+@event.listens_for(LLMAPIConfig, "after_delete")
+def _config_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is None:
+        invalidate()
+        return
+    session.info["api_configs_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _session_committed(session):
+    if session.info.pop("api_configs_changed", False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _session_rolled_back(session):
+    session.info.pop("api_configs_changed", None)
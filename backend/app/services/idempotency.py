@@ -0,0 +1,216 @@
+"""
+幂等键 - 带 Idempotency-Key 请求头的写请求只执行一次
+
+客户端超时后重试 /llm/generate 会再次调用（并计费）上游模型，重试保存结果会写入重复记录。
+携带同一 Idempotency-Key 的请求：
+- 首个请求在 idempotency_keys 中登记为执行中，完成后保存状态码和响应体（保留 IDEMPOTENCY_TTL 秒），
+  之后的重试直接返回保存的响应（带 Idempotent-Replayed: true 头）
+- 原请求仍在执行时到达的重试：同一进程内直接等待原请求的结果；其他进程中执行的请求
+  则轮询等待其完成，超过 IDEMPOTENCY_WAIT_TIMEOUT 秒返回冲突
+- 同一个键用于内容不同的请求时拒绝
+- 服务器错误（5xx 或未处理的异常）不保存，释放该键以便重试重新执行
+
+请求的执行在独立任务中进行，原请求的连接断开后仍会完成并保存响应，供重试取回。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Tuple
+
+from fastapi import HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..core.responses import FastJSONResponse, dumps
+from ..models import prompt as models
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# 已完成请求的响应保留时间（秒）
+TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+# 执行中的记录超过该时间（秒）视为原请求已中断，允许重新执行
+PENDING_TIMEOUT = int(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT", "300"))
+# 等待其他进程中执行的同键请求的最长时间（秒）
+WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "60"))
+POLL_INTERVAL = 0.25
+# 清理过期记录的最小间隔（秒）
+PURGE_INTERVAL = 600
+MAX_KEY_LENGTH = 255
+
+PENDING = "pending"
+COMPLETED = "completed"
+
+_keys = models.IdempotencyRecord.__table__
+
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: bytes
+    replayed: bool
+
+    def to_response(self) -> Response:
+        headers = {REPLAYED_HEADER: "true"} if self.replayed else None
+        return Response(self.body, status_code=self.status_code, media_type="application/json", headers=headers)
+
+
+# 本进程内执行中的请求：(scope, key) -> (请求指纹, 执行任务)
+_inflight: Dict[Tuple[str, str], Tuple[str, "asyncio.Task"]] = {}
+_last_purge = 0.0
+
+
+def _key_reused() -> HTTPException:
+    return HTTPException(status_code=422, detail=f"{HEADER} 已用于内容不同的请求")
+
+
+def fingerprint(payload: Any) -> str:
+    """请求内容（路径参数和请求体）的指纹"""
+    return hashlib.sha256(dumps(payload)).hexdigest()
+
+
+async def execute(engine, scope: str, key: str, payload: Any,
+                  handler: Callable[[], Awaitable[Response]]) -> Response:
+    """
+    按幂等键执行请求
+
+    handler 执行实际操作并返回已渲染的响应；同键的重试返回首个请求保存的响应。
+    键无效（400）、键已用于不同请求（422）、等待其他进程超时（409）时抛出 HTTPException
+    """
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{HEADER} 长度须在 1-{MAX_KEY_LENGTH} 之间")
+    request_fingerprint = fingerprint(payload)
+    ident = (scope, key)
+
+    inflight = _inflight.get(ident)
+    if inflight is not None:
+        # 原请求仍在本进程中执行：等待其结果
+        if inflight[0] != request_fingerprint:
+            raise _key_reused()
+        stored = await asyncio.shield(inflight[1])
+        return stored._replace(replayed=True).to_response()
+
+    task = asyncio.ensure_future(_run(engine, scope, key, request_fingerprint, handler))
+    _inflight[ident] = (request_fingerprint, task)
+    task.add_done_callback(lambda done: _finished(ident, done))
+    stored = await asyncio.shield(task)
+    return stored.to_response()
+
+
+def _finished(ident: Tuple[str, str], task: "asyncio.Task"):
+    if _inflight.get(ident, (None, None))[1] is task:
+        del _inflight[ident]
+    if not task.cancelled():
+        task.exception()  # 所有等待者都已断开时避免“异常未被获取”的警告
+
+
+async def _run(engine, scope: str, key: str, request_fingerprint: str,
+               handler: Callable[[], Awaitable[Response]]) -> StoredResponse:
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while True:
+        state, record = await run_in_threadpool(_claim, engine, scope, key, request_fingerprint)
+        if state is None:
+            break
+        if record.fingerprint != request_fingerprint:
+            raise _key_reused()
+        if state == COMPLETED:
+            return StoredResponse(record.status_code, record.body, replayed=True)
+        # 其他进程正在执行同键请求
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=409, detail=f"使用该 {HEADER} 的请求仍在执行中", headers={"Retry-After": "1"}
+            )
+        await asyncio.sleep(POLL_INTERVAL)
+
+    try:
+        response = await handler()
+    except HTTPException as e:
+        if e.status_code >= 500:
+            await run_in_threadpool(_release, engine, scope, key)
+            raise
+        # 客户端错误同样是确定的结果，重试时原样返回
+        response = FastJSONResponse({"detail": e.detail}, status_code=e.status_code)
+    except BaseException:
+        await run_in_threadpool(_release, engine, scope, key)
+        raise
+
+    stored = StoredResponse(response.status_code, bytes(response.body), replayed=False)
+    if stored.status_code >= 500:
+        await run_in_threadpool(_release, engine, scope, key)
+        return stored
+    try:
+        await run_in_threadpool(_complete, engine, scope, key, stored)
+    except Exception as e:
+        logger.error(f"保存幂等响应失败 {scope} {key}: {e}")
+        await run_in_threadpool(_release, engine, scope, key)
+    return stored
+
+
+def _claim(engine, scope: str, key: str, request_fingerprint: str):
+    """
+    登记执行中的请求；成功时返回 (None, None)
+
+    键已存在且未过期时返回 (状态, 记录)，已过期的记录删除后重新登记
+    """
+    _maybe_purge(engine)
+    now = datetime.utcnow()
+    condition = (_keys.c.scope == scope) & (_keys.c.key == key)
+    with engine.begin() as connection:
+        record = connection.execute(select(_keys).where(condition)).first()
+        if record is not None:
+            if record.expires_at > now:
+                return record.status, record
+            connection.execute(delete(_keys).where(condition))
+        inserted = connection.execute(
+            sqlite_insert(_keys).values(
+                scope=scope, key=key, fingerprint=request_fingerprint, status=PENDING,
+                expires_at=now + timedelta(seconds=PENDING_TIMEOUT),
+            ).on_conflict_do_nothing()
+        ).rowcount
+        if inserted:
+            return None, None
+        record = connection.execute(select(_keys).where(condition)).first()
+        return record.status, record
+
+
+def _complete(engine, scope: str, key: str, stored: StoredResponse):
+    with engine.begin() as connection:
+        connection.execute(
+            update(_keys).where((_keys.c.scope == scope) & (_keys.c.key == key)).values(
+                status=COMPLETED, status_code=stored.status_code, body=stored.body,
+                expires_at=datetime.utcnow() + timedelta(seconds=TTL),
+            )
+        )
+
+
+def _release(engine, scope: str, key: str):
+    """删除执行中的记录，之后的重试重新执行"""
+    try:
+        with engine.begin() as connection:
+            connection.execute(delete(_keys).where(
+                (_keys.c.scope == scope) & (_keys.c.key == key) & (_keys.c.status == PENDING)
+            ))
+    except Exception as e:
+        logger.error(f"释放幂等键失败 {scope} {key}: {e}")
+
+
+def _maybe_purge(engine):
+    global _last_purge
+    if time.monotonic() - _last_purge < PURGE_INTERVAL:
+        return
+    _last_purge = time.monotonic()
+    purge_expired(engine)
+
+
+def purge_expired(engine) -> int:
+    """删除过期的记录"""
+    with engine.begin() as connection:
+        removed = connection.execute(delete(_keys).where(_keys.c.expires_at <= datetime.utcnow())).rowcount
+    if removed:
+        logger.info(f"已清理 {removed} 条过期的幂等键记录")
+    return removed
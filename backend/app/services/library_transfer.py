@@ -0,0 +1,391 @@
+"""
+提示词库导入导出 - 以NDJSON流迁移提示词、版本、结果和模板
+
+导出格式为每行一条记录，按 header、template、prompt、version、result 的顺序输出，
+父记录总在子记录之前；可选 gzip 压缩。导出按ID分批读取，内存占用与库的大小无关。
+只导出热表中的结果，已归档的结果不包含在内。
+
+导入按块（IMPORT_CHUNK_SIZE 条记录）在独立事务中写入，单块失败只回滚该块。
+记录中的ID只用于关联：新写入的记录重新分配ID，子记录通过ID映射指向新的父记录。
+重复导入时按自然键去重：
+- 模板：名称 + 创建时间
+- 提示词：标题 + 创建时间（导入时保留原创建时间）
+- 版本：同一提示词下版本号和内容哈希都相同，且该版本在本次导入前已存在（同一文件中的版本不会相互合并）；
+  版本号被占用但内容不同时追加为新版本
+- 结果：仅当所属版本已存在时，按 创建时间 + 测试输入 + 模型 + 执行时间 去重
+"""
+import gzip
+import json
+import logging
+import os
+import zlib
+from collections import ChainMap
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, select
+
+from ..database import SessionLocal
+from ..models import prompt as models
+from ..schemas import prompt as schemas
+from . import analytics_service, blob_store, prompt_service, result_ingest
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = "promote-library"
+FORMAT_VERSION = 1
+# 导出时每批读取的记录数
+EXPORT_BATCH_SIZE = int(os.getenv("LIBRARY_EXPORT_BATCH_SIZE", "1000"))
+# 导入时每个事务写入的记录数
+IMPORT_CHUNK_SIZE = int(os.getenv("LIBRARY_IMPORT_CHUNK_SIZE", "1000"))
+# 导入报告中最多保留的错误数
+MAX_REPORTED_ERRORS = 100
+
+_PROMPT_FIELDS = ("title", "description", "category", "tags", "is_public", "is_template", "framework_type",
+                  "created_at", "updated_at")
+_VERSION_FIELDS = ("version_number", "version_name", "llm_config", "change_notes", "is_baseline", "created_at")
+_TEMPLATE_FIELDS = tuple(
+    column.name for column in models.PromptTemplate.__table__.columns if column.name != "id"
+)
+_RESULT_FIELDS = tuple(schemas.OptimizationResultCreate.model_fields)
+_RESULT_DEDUP_COLUMNS = ("created_at", "test_input_hash", "llm_model", "execution_time")
+
+
+def _dumps(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+def _parse_datetime(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+
+
+def _timestamps(record: Dict[str, Any], *names: str) -> Dict[str, datetime]:
+    """记录中的时间字段，缺失时不写入（使用数据库默认值）"""
+    values = {name: _parse_datetime(record.get(name)) for name in names}
+    return {name: value for name, value in values.items() if value is not None}
+
+
+def _same_time(column, value: Optional[datetime]):
+    """
+    比较时间列与给定时间
+
+    数据库默认值写入的时间为 "YYYY-MM-DD HH:MM:SS"，SQLAlchemy 写入的带微秒，
+    统一经 SQLite datetime() 规范化后比较
+    """
+    if value is None:
+        return column.is_(None)
+    return func.datetime(column) == func.datetime(value)
+
+
+# ===========================================
+# 导出
+# ===========================================
+
+def _batches(session, model, batch_size: int, options=()):
+    """按ID键集分批读取ORM对象"""
+    last_id = 0
+    while True:
+        batch = session.query(model).options(*options).filter(model.id > last_id).order_by(model.id).limit(
+            batch_size
+        ).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+        # 每批之后释放已输出的对象，保持内存占用恒定
+        session.expunge_all()
+
+
+def _result_batches(connection, batch_size: int):
+    """按ID分批读取结果（Core查询，不构造ORM对象），测试输入从内容块批量还原"""
+    table = models.OptimizationResult.__table__
+    names = ["id", "version_id"] + [name for name in _RESULT_FIELDS if name != "test_input"] + ["created_at"]
+    columns = [table.c[name] for name in names] + [table.c.test_input, table.c.test_input_hash]
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(*columns).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        blob_store.prefetch(connection, (row.test_input_hash for row in rows))
+        records = []
+        for row in rows:
+            record = dict(zip(names, row))
+            legacy, digest = row[-2:]
+            record["test_input"] = blob_store.load(connection, digest) if digest is not None else legacy
+            records.append(record)
+        yield records
+        last_id = rows[-1].id
+
+
+def export_lines(include_results: bool = True, include_templates: bool = True,
+                 batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """逐批生成导出的NDJSON文本（每次产出一批记录）"""
+    session = SessionLocal()
+    try:
+        yield _dumps({
+            "type": "header", "format": FORMAT_NAME, "version": FORMAT_VERSION,
+            "exported_at": datetime.utcnow().isoformat(),
+        })
+        if include_templates:
+            for batch in _batches(session, models.PromptTemplate, batch_size):
+                yield "".join(_dumps({
+                    "type": "template", "id": t.id, **{name: getattr(t, name) for name in _TEMPLATE_FIELDS}
+                }) for t in batch)
+
+        for batch in _batches(session, models.Prompt, batch_size):
+            yield "".join(_dumps({
+                "type": "prompt", "id": p.id, **{name: getattr(p, name) for name in _PROMPT_FIELDS}
+            }) for p in batch)
+
+        for batch in _batches(session, models.PromptVersion, batch_size):
+            yield "".join(_dumps({
+                "type": "version", "id": v.id, "prompt_id": v.prompt_id, "content": v.content,
+                **{name: getattr(v, name) for name in _VERSION_FIELDS}
+            }) for v in batch)
+
+        if include_results:
+            for rows in _result_batches(session.connection(), batch_size):
+                yield "".join(_dumps({"type": "result", **row}) for row in rows)
+    finally:
+        session.close()
+
+
+def export_stream(gzip_output: bool = False, **options) -> Iterator[bytes]:
+    """导出为字节流，可选 gzip 压缩（增量压缩，不缓冲整个文件）"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip_output else None
+    for text in export_lines(**options):
+        data = text.encode("utf-8")
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+    if compressor is not None:
+        yield compressor.flush()
+
+
+# ===========================================
+# 导入
+# ===========================================
+
+class LibraryImporter:
+    """
+    按顺序接收导出记录并分块写入
+
+    add() 接收已解析的记录（或解析错误），finish() 写入剩余记录并返回报告
+    """
+
+    def __init__(self, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.report = {
+            "records": 0,
+            "created": {"template": 0, "prompt": 0, "version": 0, "result": 0},
+            "skipped": {"template": 0, "prompt": 0, "version": 0, "result": 0},
+            "errors": [],
+            "error_count": 0,
+        }
+        # 导出文件中的ID -> 本库ID；已存在的版本额外记录以便对其结果去重，本次导入新建的版本不参与版本去重
+        self._prompt_ids: Dict[int, int] = {}
+        self._version_ids: Dict[int, int] = {}
+        self._existing_versions: Dict[int, bool] = {}
+        self._created_versions: Dict[int, bool] = {}
+        self._pending: List[Tuple[int, Dict[str, Any]]] = []
+        self._line = 0
+
+    def add(self, record: Any, parse_error: Optional[str] = None):
+        self._line += 1
+        if parse_error is not None:
+            self._error(self._line, parse_error)
+            return
+        self._pending.append((self._line, record))
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def add_many(self, entries: Iterable[Tuple[Any, Optional[str]]]):
+        for record, parse_error in entries:
+            self.add(record, parse_error)
+
+    def _error(self, line: int, message: str):
+        self.report["error_count"] += 1
+        if len(self.report["errors"]) < MAX_REPORTED_ERRORS:
+            self.report["errors"].append(f"第 {line} 行: {message}")
+
+    def flush(self):
+        """在一个事务中写入已接收的记录"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        # 本块新增的映射写入 ChainMap 的第一层，提交成功后才合并
+        prompt_ids, version_ids = ChainMap({}, self._prompt_ids), ChainMap({}, self._version_ids)
+        existing_versions = ChainMap({}, self._existing_versions)
+        created_versions = ChainMap({}, self._created_versions)
+        created = dict.fromkeys(self.report["created"], 0)
+        skipped = dict.fromkeys(self.report["skipped"], 0)
+        errors: List[Tuple[int, str]] = []
+        results: List[Dict[str, Any]] = []
+        # 已存在版本的结果去重键，按版本懒加载
+        result_keys: Dict[int, Set[tuple]] = {}
+
+        session = SessionLocal()
+        try:
+            for line, record in pending:
+                try:
+                    kind = record.get("type") if isinstance(record, dict) else None
+                    if kind == "header":
+                        if record.get("format") != FORMAT_NAME or record.get("version", 0) > FORMAT_VERSION:
+                            raise ValueError(f"不支持的导出格式: {record.get('format')} v{record.get('version')}")
+                        continue
+                    if kind == "template":
+                        outcome = self._import_template(session, record)
+                    elif kind == "prompt":
+                        outcome = self._import_prompt(session, record, prompt_ids)
+                    elif kind == "version":
+                        outcome = self._import_version(session, record, prompt_ids, version_ids, existing_versions,
+                                                       created_versions)
+                    elif kind == "result":
+                        outcome = self._import_result(session, record, version_ids, existing_versions,
+                                                      result_keys, results)
+                    else:
+                        raise ValueError(f"未知的记录类型: {kind}")
+                    (created if outcome else skipped)[kind] += 1
+                except (ValueError, KeyError, TypeError, LookupError, ValidationError) as e:
+                    errors.append((line, str(e)))
+
+            if results:
+                result_ingest.insert_results(session.connection(), results)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"导入第 {pending[0][0]}-{pending[-1][0]} 行失败: {e}")
+            for line, _ in pending:
+                self._error(line, f"所在的块写入失败: {e}")
+            return
+        finally:
+            session.close()
+
+        self._prompt_ids.update(prompt_ids.maps[0])
+        self._version_ids.update(version_ids.maps[0])
+        self._existing_versions.update(existing_versions.maps[0])
+        self._created_versions.update(created_versions.maps[0])
+        for kind in created:
+            self.report["created"][kind] += created[kind]
+            self.report["skipped"][kind] += skipped[kind]
+        for line, message in errors:
+            self._error(line, message)
+        self.report["records"] += len(pending)
+        analytics_service.record_results(results)
+
+    def _import_template(self, session, record) -> bool:
+        created_at = _parse_datetime(record.get("created_at"))
+        exists = session.query(models.PromptTemplate.id).filter(
+            models.PromptTemplate.name == record["name"], _same_time(models.PromptTemplate.created_at, created_at)
+        ).first()
+        if exists is not None:
+            return False
+        values = {name: record.get(name) for name in _TEMPLATE_FIELDS if name in record}
+        values.update(_timestamps(record, "created_at", "updated_at"))
+        session.add(models.PromptTemplate(**values))
+        session.flush()
+        return True
+
+    def _import_prompt(self, session, record, prompt_ids) -> bool:
+        created_at = _parse_datetime(record.get("created_at"))
+        existing = session.query(models.Prompt.id).filter(
+            models.Prompt.title == record["title"], _same_time(models.Prompt.created_at, created_at)
+        ).first()
+        if existing is not None:
+            prompt_ids[record["id"]] = existing.id
+            return False
+        values = {name: record.get(name) for name in _PROMPT_FIELDS if name in record}
+        values.update(_timestamps(record, "created_at", "updated_at"))
+        prompt = models.Prompt(**values)
+        session.add(prompt)
+        session.flush()
+        prompt_ids[record["id"]] = prompt.id
+        return True
+
+    def _import_version(self, session, record, prompt_ids, version_ids, existing_versions, created_versions) -> bool:
+        if record["prompt_id"] not in prompt_ids:
+            raise LookupError(f"版本 {record['id']} 所属的提示词 {record['prompt_id']} 不在导入文件中")
+        prompt_id = prompt_ids[record["prompt_id"]]
+        content = record["content"]
+        version_number = record["version_number"]
+        # (提示词, 版本号) 唯一：至多一个候选，内容相同且不是本次导入新建的才视为已存在
+        taken = session.query(models.PromptVersion.id, models.PromptVersion.content_hash).filter(
+            models.PromptVersion.prompt_id == prompt_id, models.PromptVersion.version_number == version_number
+        ).first()
+        if taken is not None and taken.id not in created_versions \
+                and taken.content_hash == blob_store.content_hash(content):
+            version_ids[record["id"]] = taken.id
+            existing_versions[taken.id] = True
+            return False
+        if taken is not None:
+            version_number = prompt_service.allocate_version_number(session.connection(), prompt_id)
+        values = {name: record.get(name) for name in _VERSION_FIELDS if name in record}
+        values.update(prompt_id=prompt_id, version_number=version_number, **_timestamps(record, "created_at"))
+        version = models.PromptVersion(content=content, **values)
+        session.add(version)
+        session.flush()
+        version_ids[record["id"]] = version.id
+        created_versions[version.id] = True
+        return True
+
+    def _import_result(self, session, record, version_ids, existing_versions, result_keys, results) -> bool:
+        if record["version_id"] not in version_ids:
+            raise LookupError(f"结果 {record['id']} 所属的版本 {record['version_id']} 不在导入文件中")
+        version_id = version_ids[record["version_id"]]
+        row = schemas.OptimizationResultCreate.model_validate(record).model_dump(mode="json")
+        row.update(version_id=version_id, created_at=_parse_datetime(record.get("created_at")) or datetime.utcnow())
+
+        if version_id in existing_versions:
+            keys = result_keys.get(version_id)
+            if keys is None:
+                table = models.OptimizationResult.__table__
+                keys = result_keys[version_id] = set(session.connection().execute(
+                    select(*(table.c[name] for name in _RESULT_DEDUP_COLUMNS)).where(table.c.version_id == version_id)
+                ).all())
+            key = (
+                row["created_at"],
+                blob_store.content_hash(row["test_input"]) if row["test_input"] is not None else None,
+                row["llm_model"], row["execution_time"],
+            )
+            if key in keys:
+                return False
+            keys.add(key)
+        results.append(row)
+        return True
+
+    def finish(self) -> Dict[str, Any]:
+        self.flush()
+        return self.report
+
+
+def open_maybe_gzip(path: str):
+    """以二进制方式打开文件，gzip 文件（按魔数判断）透明解压"""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    return gzip.open(path, "rb") if magic == b"\x1f\x8b" else open(path, "rb")
+
+
+def import_lines(lines: Iterable[bytes], chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, Any]:
+    """导入NDJSON行（字节串）并返回报告"""
+    importer = LibraryImporter(chunk_size)
+    importer.add_many(result_ingest.parse_ndjson_line(line) for line in lines if line.strip())
+    return importer.finish()
+
+
+async def decompress_stream(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """请求体为 gzip 时（按魔数判断）增量解压，否则原样转发"""
+    decompressor = None
+    async for chunk in stream:
+        if decompressor is None:
+            if not chunk:
+                continue
+            decompressor = zlib.decompressobj(47) if chunk[:2] == b"\x1f\x8b" else False
+        yield decompressor.decompress(chunk) if decompressor else chunk
+    if decompressor:
+        yield decompressor.flush()
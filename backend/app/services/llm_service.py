@@ -528,10 +528,10 @@ class DynamicLLMService:
     def __init__(self, db_session):
         self.db = db_session
         self.clients: Dict[str, BaseLLMClient] = {}
-        self._load_clients_from_db()
-        # 导入安全管理器
+        # 导入安全管理器（加载客户端时解密API密钥需要）
         from ..core.security import security_manager
         self.security_manager = security_manager
+        self._load_clients_from_db()
     
     def _load_clients_from_db(self):
         """从数据库加载配置的API客户端"""
@@ -0,0 +1,138 @@
+"""
+提示词运行时 - 按提示词ID运行已保存的提示词
+
+解析要运行的版本（基准版本、最新版本或指定版本号），用请求的输入渲染模板变量，
+并按版本的 llm_config 组装调用参数。解析结果（版本、编译后的模板、LLM配置）缓存在进程内，
+与目录响应缓存共用失效机制（见 services/catalog_cache.py）：提示词或版本变更后按提示词ID删除，
+其他进程有写入时清空。命中时只需一次读取缓存代数的主键查询。
+"""
+import os
+from typing import Any, Dict, NamedTuple, Optional, Union
+
+from sqlalchemy.orm import Session, load_only
+
+from ..core.cache import LRUCache
+from ..core.template import CompiledTemplate, compile_template
+from ..models import prompt as models
+from ..schemas.prompt import RunRequest
+from . import catalog_cache
+
+BASELINE = "baseline"
+LATEST = "latest"
+
+MAX_ITEMS = int(os.getenv("RUN_CACHE_MAX_ITEMS", "1024"))
+
+# llm_config 中的采样参数在各提供商接口中的参数名；未列出的提供商只使用温度和最大token数
+_SAMPLING_PARAMETERS = {
+    "openai": {"top_p": "top_p", "frequency_penalty": "frequency_penalty",
+               "presence_penalty": "presence_penalty", "stop_sequences": "stop"},
+    "custom": {"top_p": "top_p", "frequency_penalty": "frequency_penalty",
+               "presence_penalty": "presence_penalty", "stop_sequences": "stop"},
+    "anthropic": {"top_p": "top_p", "stop_sequences": "stop_sequences"},
+}
+_DEFAULT_TEMPERATURE = 0.7
+_DEFAULT_MAX_TOKENS = 1000
+
+
+class VersionNotFoundError(LookupError):
+    """提示词不存在或没有符合条件的版本"""
+    pass
+
+
+class LLMNotConfiguredError(ValueError):
+    """版本未配置提供商或模型，请求中也未指定"""
+    pass
+
+
+class ResolvedPrompt(NamedTuple):
+    prompt_id: int
+    epoch: Optional[int]
+    version_id: int
+    version_number: int
+    template: CompiledTemplate
+    llm_config: Dict[str, Any]
+
+
+class GenerateCall(NamedTuple):
+    """一次LLM调用的参数（DynamicLLMService.generate_text 的参数）"""
+    provider: str
+    model: str
+    prompt: str
+    temperature: float
+    max_tokens: int
+    parameters: Dict[str, Any]
+
+
+cache = LRUCache(max_items=MAX_ITEMS)
+catalog_cache.register(cache)
+
+_VERSION_FIELDS = ("id", "version_number", "llm_config", "content")
+
+
+def _load_version(db: Session, prompt_id: int, selector: Union[int, str]) -> Optional[models.PromptVersion]:
+    query = db.query(models.PromptVersion).options(
+        load_only(*models.PromptVersion.columns_for(_VERSION_FIELDS))
+    ).filter(models.PromptVersion.prompt_id == prompt_id)
+    latest_first = models.PromptVersion.version_number.desc()
+    if selector == BASELINE:
+        version = query.filter(models.PromptVersion.is_baseline == True).order_by(latest_first).first()
+        return version if version is not None else query.order_by(latest_first).first()
+    if selector == LATEST:
+        return query.order_by(latest_first).first()
+    return query.filter(models.PromptVersion.version_number == selector).first()
+
+
+def resolve(db: Session, prompt_id: int, selector: Union[int, str] = BASELINE) -> ResolvedPrompt:
+    """解析要运行的版本并编译其模板（带缓存）"""
+    token = catalog_cache.begin(db.connection())
+    key = (prompt_id, selector)
+    resolved = catalog_cache.lookup(key, token, cache)
+    if resolved is not None:
+        return resolved
+
+    version = _load_version(db, prompt_id, selector)
+    if version is None:
+        raise VersionNotFoundError(f"提示词 {prompt_id} 没有可运行的版本（{selector}）")
+    resolved = ResolvedPrompt(
+        prompt_id=prompt_id,
+        epoch=token.epoch,
+        version_id=version.id,
+        version_number=version.version_number,
+        template=compile_template(version.content, version.content_hash),
+        llm_config=dict(version.llm_config or {}),
+    )
+    catalog_cache.put(cache, key, token, resolved)
+    return resolved
+
+
+def build_call(resolved: ResolvedPrompt, request: RunRequest) -> GenerateCall:
+    """
+    渲染模板并组装调用参数：请求中指定的参数优先，其余取自版本的 llm_config
+
+    缺少模板变量时抛出 MissingVariablesError
+    """
+    config = resolved.llm_config
+    provider = request.provider.value if request.provider is not None else config.get("provider")
+    model = request.model or config.get("model")
+    if not provider or not model:
+        raise LLMNotConfiguredError("该版本未配置LLM提供商和模型，请在请求中指定 provider 和 model")
+
+    text = resolved.template.render(request.inputs)
+
+    temperature = request.temperature if request.temperature is not None else config.get("temperature")
+    max_tokens = request.max_tokens if request.max_tokens is not None else config.get("max_tokens")
+    parameters = {}
+    for field, name in _SAMPLING_PARAMETERS.get(provider, {}).items():
+        value = config.get(field)
+        if value is not None and value != []:
+            parameters[name] = value
+    parameters.update(request.parameters)
+
+    return GenerateCall(
+        provider=provider,
+        model=model,
+        prompt=text,
+        temperature=_DEFAULT_TEMPERATURE if temperature is None else temperature,
+        max_tokens=_DEFAULT_MAX_TOKENS if max_tokens is None else max_tokens,
+        parameters=parameters,
+    )
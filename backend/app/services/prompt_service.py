@@ -0,0 +1,116 @@
+"""提示词查询与版本创建相关的公共逻辑，供多个路由复用"""
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+
+from ..models import prompt as models
+from . import tag_service
+
+logger = logging.getLogger(__name__)
+
+# 分配版本号冲突（唯一约束或数据库锁）时的最大尝试次数
+VERSION_CREATE_ATTEMPTS = 5
+
+_prompts = models.Prompt.__table__
+_versions = models.PromptVersion.__table__
+
+
+def filter_prompts(
+    query,
+    category=None,
+    framework_type=None,
+    is_template: Optional[bool] = None,
+    tags: Optional[List[str]] = None,
+    tag_mode: str = "all"
+):
+    """在提示词查询上应用列表筛选条件"""
+    if category is not None:
+        query = query.filter(models.Prompt.category == category.value)
+    if framework_type is not None:
+        query = query.filter(models.Prompt.framework_type == framework_type.value)
+    if is_template is not None:
+        query = query.filter(models.Prompt.is_template == is_template)
+    return tag_service.filter_by_tags(query, tags, tag_mode)
+
+
+def allocate_version_number(connection, prompt_id: int) -> Optional[int]:
+    """
+    在当前事务中为提示词分配下一个版本号，提示词不存在时返回None
+
+    计数器与现有最大版本号取较大值后加一，由一条 UPDATE ... RETURNING 完成：
+    该语句使事务持有SQLite写锁，其他进程的分配会等待本事务结束
+    """
+    current_max = select(func.coalesce(func.max(_versions.c.version_number), 0)).where(
+        _versions.c.prompt_id == prompt_id
+    ).scalar_subquery()
+    return connection.execute(
+        update(_prompts).where(_prompts.c.id == prompt_id).values(
+            version_counter=func.max(func.coalesce(_prompts.c.version_counter, 0), current_max) + 1,
+            # 分配版本号不算修改提示词本身
+            updated_at=_prompts.c.updated_at,
+        ).returning(_prompts.c.version_counter)
+    ).scalar()
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, IntegrityError):
+        return True
+    return isinstance(error, OperationalError) and "locked" in str(error.orig)
+
+
+def create_version(db: Session, prompt_id: int, values: Dict[str, Any]) -> Optional[models.PromptVersion]:
+    """
+    创建新版本并提交，提示词不存在时返回None
+
+    版本号冲突或遇到数据库锁时回滚后退避重试
+    """
+    for attempt in range(1, VERSION_CREATE_ATTEMPTS + 1):
+        try:
+            version_number = allocate_version_number(db.connection(), prompt_id)
+            if version_number is None:
+                db.rollback()
+                return None
+            db_version = models.PromptVersion(prompt_id=prompt_id, version_number=version_number, **values)
+            db.add(db_version)
+            db.commit()
+            return db_version
+        except (IntegrityError, OperationalError) as e:
+            db.rollback()
+            if attempt == VERSION_CREATE_ATTEMPTS or not _is_retryable(e):
+                raise
+            logger.warning(f"提示词 {prompt_id} 分配版本号冲突，第 {attempt} 次重试: {e}")
+            time.sleep(random.uniform(0, 0.05 * attempt))
+
+
+def deduplicate_version_numbers(engine) -> int:
+    """
+    将同一提示词中重复的版本号改为新的版本号（建立唯一索引前执行），返回修改的版本数
+
+    每组重复中ID最小的版本保留原版本号，其余依次追加到末尾
+    """
+    with engine.begin() as connection:
+        duplicates = connection.execute(
+            select(_versions.c.prompt_id, _versions.c.version_number)
+            .group_by(_versions.c.prompt_id, _versions.c.version_number)
+            .having(func.count() > 1)
+        ).all()
+        changed = 0
+        for prompt_id, version_number in duplicates:
+            ids = connection.execute(
+                select(_versions.c.id).where(
+                    _versions.c.prompt_id == prompt_id, _versions.c.version_number == version_number
+                ).order_by(_versions.c.id)
+            ).scalars().all()
+            for version_id in ids[1:]:
+                connection.execute(update(_versions).where(_versions.c.id == version_id).values(
+                    version_number=allocate_version_number(connection, prompt_id)
+                ))
+                changed += 1
+    if changed:
+        logger.warning(f"已为 {changed} 个重复版本号的版本重新编号")
+    return changed
@@ -0,0 +1,171 @@
+"""
+优化结果输出的压缩迁移与统计
+
+新写入的 output_text 由 CompressedText 列类型自动压缩；本模块负责把已有的
+明文行分批压缩（每批一个短事务，批间让出写锁），并统计压缩率与解压开销，
+供调整 OUTPUT_COMPRESSION_THRESHOLD 参考。
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import cast, func, select, update, LargeBinary
+
+from ..core import compression
+from ..models import prompt as models
+
+logger = logging.getLogger(__name__)
+
+_results = models.OptimizationResult.__table__
+_output = _results.c.output_text
+
+# 大小分段（字节），用于按原文大小观察压缩率
+_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536)
+
+_background_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def compress_existing(engine, batch_size: int = 200, pause: float = 0.05,
+                      stop: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    分批压缩已有的明文 output_text
+
+    每批在独立的短事务中完成，批间暂停 pause 秒，避免长时间持有SQLite写锁；
+    可通过 stop 事件在批间中止，下次运行从头扫描剩余的明文行
+    """
+    column_type = _output.type
+    report = {"rows": 0, "compressed": 0, "bytes_before": 0, "bytes_after": 0, "seconds": 0.0}
+    started = time.perf_counter()
+    last_id = 0
+    while stop is None or not stop.is_set():
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(_results.c.id, cast(_output, LargeBinary).label("raw")).where(
+                    _results.c.id > last_id,
+                    func.typeof(_output) == "text",
+                    func.length(cast(_output, LargeBinary)) >= column_type.threshold
+                ).order_by(_results.c.id).limit(batch_size)
+            ).all()
+            for row in rows:
+                raw = bytes(row.raw)
+                packed = compression.compress(raw.decode("utf-8"), column_type.codec, column_type.threshold)
+                report["rows"] += 1
+                report["bytes_before"] += len(raw)
+                if isinstance(packed, bytes):
+                    connection.execute(
+                        update(_results).where(_results.c.id == row.id).values(output_text=packed)
+                    )
+                    report["compressed"] += 1
+                    report["bytes_after"] += len(packed)
+                else:
+                    report["bytes_after"] += len(raw)
+        if not rows:
+            break
+        last_id = rows[-1].id
+        if pause:
+            time.sleep(pause)
+
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    report["ratio"] = round(report["bytes_after"] / report["bytes_before"], 4) if report["bytes_before"] else None
+    return report
+
+
+def compression_report(engine, sample: int = 1000) -> Dict[str, Any]:
+    """
+    统计 output_text 的存储情况
+
+    按存储类型汇总行数与字节数；对最多 sample 行压缩数据实际解压，
+    给出各原文大小分段的压缩率和每行解压耗时
+    """
+    column_type = _output.type
+    stored = cast(_output, LargeBinary)
+    with engine.connect() as connection:
+        plain = connection.execute(
+            select(func.count(), func.coalesce(func.sum(func.length(stored)), 0)).where(
+                func.typeof(_output) == "text"
+            )
+        ).one()
+        rows = connection.execute(
+            select(stored).where(func.typeof(_output) == "blob").order_by(_results.c.id.desc()).limit(sample)
+        ).scalars().all()
+        compressed_total = connection.execute(
+            select(func.count(), func.coalesce(func.sum(func.length(stored)), 0)).where(
+                func.typeof(_output) == "blob"
+            )
+        ).one()
+
+    buckets: Dict[str, Dict[str, Any]] = {}
+    codecs: Dict[str, int] = {}
+    decode_seconds = 0.0
+    for value in rows:
+        value = bytes(value)
+        started = time.perf_counter()
+        text = compression.decompress(value)
+        elapsed = time.perf_counter() - started
+        decode_seconds += elapsed
+        raw_size = len(text.encode("utf-8"))
+        codec = compression.CODEC_NAMES.get(value[0], "unknown")
+        codecs[codec] = codecs.get(codec, 0) + 1
+        label = next((f"<{limit}" for limit in _SIZE_BUCKETS if raw_size < limit), f">={_SIZE_BUCKETS[-1]}")
+        bucket = buckets.setdefault(label, {"rows": 0, "raw_bytes": 0, "stored_bytes": 0, "decode_us": 0.0})
+        bucket["rows"] += 1
+        bucket["raw_bytes"] += raw_size
+        bucket["stored_bytes"] += len(value)
+        bucket["decode_us"] += elapsed * 1e6
+
+    for bucket in buckets.values():
+        bucket["ratio"] = round(bucket["stored_bytes"] / bucket["raw_bytes"], 4) if bucket["raw_bytes"] else None
+        bucket["avg_decode_us"] = round(bucket.pop("decode_us") / bucket["rows"], 2)
+
+    return {
+        "threshold": column_type.threshold,
+        "codec": column_type.codec,
+        "available_codecs": compression.available_codecs(),
+        "plain_rows": plain[0],
+        "plain_bytes": plain[1],
+        "compressed_rows": compressed_total[0],
+        "compressed_bytes": compressed_total[1],
+        "sample": {
+            "rows": len(rows),
+            "codecs": codecs,
+            "avg_decode_us_per_row": round(decode_seconds * 1e6 / len(rows), 2) if rows else None,
+            "by_raw_size": dict(sorted(buckets.items(), key=lambda item: _bucket_order(item[0]))),
+        },
+        "runtime_decode": compression.decode_stats.snapshot(),
+    }
+
+
+def _bucket_order(label: str) -> int:
+    limit = int(label.lstrip("<>="))
+    return limit + (1 if label.startswith(">=") else 0)
+
+
+def start_background_migration(engine):
+    """在后台线程中压缩已有明文行（OUTPUT_COMPRESSION_BACKGROUND=false 可关闭）"""
+    global _background_thread
+    if os.getenv("OUTPUT_COMPRESSION_BACKGROUND", "true").lower() != "true":
+        return
+    if _background_thread is not None and _background_thread.is_alive():
+        return
+
+    def run():
+        try:
+            report = compress_existing(engine, stop=_stop)
+            if report["rows"]:
+                logger.info(f"结果输出后台压缩完成: {report}")
+        except Exception as e:
+            logger.error(f"结果输出后台压缩失败: {e}")
+
+    _stop.clear()
+    _background_thread = threading.Thread(target=run, name="output-compression", daemon=True)
+    _background_thread.start()
+
+
+def stop_background_migration(timeout: float = 5.0):
+    """请求后台压缩在当前批次结束后停止"""
+    _stop.set()
+    if _background_thread is not None:
+        _background_thread.join(timeout)
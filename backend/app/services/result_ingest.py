@@ -0,0 +1,180 @@
+"""
+批量写入优化结果 - 供外部评测工具一次回传大量结果
+
+每条记录逐条校验（请求模式与版本是否存在），合法记录按块以 executemany 写入，
+每块一个事务；写入时直接取回自增ID，不重新读取结果行。
+绕过ORM写入，因此在同一事务中维护测试输入的内容块引用和版本统计，提交后计入用量汇总。
+"""
+import json
+import logging
+import os
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+from ..models import prompt as models
+from ..schemas import prompt as schemas
+from . import analytics_service, blob_store, stats_service
+
+logger = logging.getLogger(__name__)
+
+# 每个事务写入的结果数
+CHUNK_SIZE = int(os.getenv("RESULT_BULK_CHUNK_SIZE", "500"))
+# 单次请求最多接受的结果数，超出部分逐条返回错误
+MAX_ITEMS = int(os.getenv("RESULT_BULK_MAX_ITEMS", "50000"))
+
+_results = models.OptimizationResult.__table__
+_versions = models.PromptVersion.__table__
+
+
+def _format_errors(error: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(part) for part in detail['loc']) or '(item)'}: {detail['msg']}"
+        for detail in error.errors()
+    ]
+
+
+def existing_versions(connection, version_ids: Iterable[int]) -> Set[int]:
+    """返回其中存在的版本ID"""
+    return set(connection.execute(select(_versions.c.id).where(_versions.c.id.in_(set(version_ids)))).scalars())
+
+
+def insert_results(connection, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    在当前事务中写入一批结果（OptimizationResultCreate 的字段加 version_id），调用方须已确认版本存在
+
+    原地为每行补上 id 和 created_at 并移除 test_input，返回同一列表
+    """
+    # 相同的测试输入只增加一次引用计数
+    inputs = Counter(row["test_input"] for row in rows if row["test_input"] is not None)
+    digests = {text: blob_store.acquire(connection, text, count) for text, count in inputs.items()}
+    for row in rows:
+        text = row.pop("test_input")
+        row["test_input_hash"] = digests[text] if text is not None else None
+
+    # insertmanyvalues：多行 INSERT ... RETURNING，按参数顺序返回ID
+    statement = insert(_results).returning(_results.c.id, _results.c.created_at, sort_by_parameter_order=True)
+    for row, (result_id, created_at) in zip(rows, connection.execute(statement, rows).all()):
+        row["id"] = result_id
+        row["created_at"] = created_at
+    stats_service.record_results(connection, rows)
+    return rows
+
+
+class BulkIngestor:
+    """
+    按到达顺序接收原始记录，攒满一块后写入
+
+    add() 接收已解析的JSON值（或解析失败时的错误信息），finish() 写入剩余记录并返回汇总
+    """
+
+    def __init__(self, engine, chunk_size: int = CHUNK_SIZE, max_items: int = MAX_ITEMS):
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.max_items = max_items
+        self.statuses: List[Dict[str, Any]] = []
+        self._pending: List[Dict[str, Any]] = []
+        # 已确认存在 / 不存在的版本ID，跨块复用
+        self._known_versions: Dict[int, bool] = {}
+
+    def add(self, raw: Any, parse_error: Optional[str] = None):
+        index = len(self.statuses)
+        status = {"index": index, "status": "error"}
+        self.statuses.append(status)
+        if parse_error is not None:
+            status["errors"] = [parse_error]
+            return
+        if index >= self.max_items:
+            status["errors"] = [f"超过单次请求的最大条数 {self.max_items}"]
+            return
+        try:
+            item = schemas.BulkResultItem.model_validate(raw)
+        except ValidationError as e:
+            status["errors"] = _format_errors(e)
+            return
+        status["version_id"] = item.version_id
+        self._pending.append({"status": status, "item": item})
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+
+    def add_many(self, entries: Iterable[Tuple[Any, Optional[str]]]):
+        """依次 add 多个 (值, 解析错误) 对"""
+        for raw, parse_error in entries:
+            self.add(raw, parse_error)
+
+    def flush(self):
+        """写入已校验的记录（一个事务）"""
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            with self.engine.begin() as connection:
+                accepted = self._check_versions(connection, pending)
+                rows = self._insert(connection, accepted) if accepted else []
+        except Exception as e:
+            logger.error(f"批量写入结果失败: {e}")
+            for entry in pending:
+                if entry["status"].get("errors") is None:
+                    entry["status"]["errors"] = [f"写入失败: {e}"]
+            return
+
+        for entry, row in zip(accepted, rows):
+            entry["status"]["status"] = "created"
+            entry["status"]["id"] = row["id"]
+        analytics_service.record_results(rows)
+
+    def _check_versions(self, connection, pending: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        unknown = {entry["item"].version_id for entry in pending} - self._known_versions.keys()
+        if unknown:
+            found = existing_versions(connection, unknown)
+            self._known_versions.update({version_id: version_id in found for version_id in unknown})
+
+        accepted = []
+        for entry in pending:
+            if self._known_versions[entry["item"].version_id]:
+                accepted.append(entry)
+            else:
+                entry["status"]["errors"] = ["版本未找到"]
+        return accepted
+
+    def _insert(self, connection, accepted: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return insert_results(connection, [entry["item"].model_dump(mode="json") for entry in accepted])
+
+    def finish(self) -> Dict[str, Any]:
+        self.flush()
+        created = sum(1 for status in self.statuses if status["status"] == "created")
+        return {
+            "total": len(self.statuses),
+            "created": created,
+            "failed": len(self.statuses) - created,
+            "items": self.statuses,
+        }
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """将请求体的字节流切分为行，只缓冲未结束的一行"""
+    remainder = b""
+    async for chunk in stream:
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line
+    if remainder:
+        yield remainder
+
+
+def parse_ndjson_line(line: bytes) -> Tuple[Any, Optional[str]]:
+    """解析一行NDJSON，返回 (值, 解析错误)"""
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, f"JSON解析失败: {e}"
+
+
+def ingest(engine, items: Iterable[Any], chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """写入一组已解析的记录并返回逐条状态"""
+    ingestor = BulkIngestor(engine, chunk_size)
+    ingestor.add_many((item, None) for item in items)
+    return ingestor.finish()
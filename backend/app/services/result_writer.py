@@ -0,0 +1,225 @@
+"""
+结果写入队列（组提交）- 并发写入单条结果时合并为少量事务
+
+SQLite 同一时间只允许一个写事务，每次提交都要落盘；大量并发请求各自提交时吞吐受限于提交次数。
+启用后 POST /versions/{id}/results 只把结果放入队列并等待，由唯一的写线程取出一组
+（攒满 RESULT_WRITER_MAX_BATCH 条或等待 RESULT_WRITER_MAX_DELAY_MS 毫秒）在一个事务中写入结果与统计，
+提交后再逐个返回。队列满时请求等待空位（背压），超时返回繁忙；关闭时写完队列中剩余的结果。
+写入一组时出现任何异常都只让该组中尚未完成的请求失败，写线程继续运行；
+请求最多等待 RESULT_WRITER_RESULT_TIMEOUT 秒，不会因写线程异常而永久挂起。
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from . import analytics_service, result_ingest
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("RESULT_GROUP_COMMIT", "true").lower() == "true"
+# 队列容量，满时新的写入等待
+QUEUE_SIZE = int(os.getenv("RESULT_WRITER_QUEUE_SIZE", "1000"))
+# 每个事务最多写入的结果数
+MAX_BATCH = int(os.getenv("RESULT_WRITER_MAX_BATCH", "200"))
+# 取到第一条结果后最多再等待多久凑成一组（毫秒）
+MAX_DELAY_MS = float(os.getenv("RESULT_WRITER_MAX_DELAY_MS", "5"))
+# 队列满时等待空位的最长时间（秒）
+PUT_TIMEOUT = float(os.getenv("RESULT_WRITER_PUT_TIMEOUT", "10"))
+# 放入队列后等待提交结果的最长时间（秒）
+RESULT_TIMEOUT = float(os.getenv("RESULT_WRITER_RESULT_TIMEOUT", "30"))
+
+
+class VersionNotFoundError(LookupError):
+    """结果所属的版本不存在"""
+    pass
+
+
+class WriterBusyError(RuntimeError):
+    """队列已满且在超时内没有空位"""
+    pass
+
+
+class WriterTimeoutError(RuntimeError):
+    """已放入队列，但在超时内没有得到提交结果（结果之后仍可能被写入）"""
+    pass
+
+
+_Entry = Tuple[Dict[str, Any], Future]
+_STOP = object()
+
+
+def _resolve(future: Future, row: Dict[str, Any]):
+    """设置结果；等待方已超时取消时忽略"""
+    try:
+        future.set_result(row)
+    except InvalidStateError:
+        pass
+
+
+def _fail(future: Future, error: BaseException):
+    try:
+        future.set_exception(error)
+    except InvalidStateError:
+        pass
+
+
+class ResultWriter:
+    """单写线程的组提交队列"""
+
+    def __init__(self, engine, queue_size: int = QUEUE_SIZE, max_batch: int = MAX_BATCH,
+                 max_delay_ms: float = MAX_DELAY_MS):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"results": 0, "groups": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """写完队列中已有的结果后停止"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit_nowait(self, row: Dict[str, Any], timeout: float = PUT_TIMEOUT) -> Future:
+        """放入一条结果（OptimizationResultCreate 的字段加 version_id），队列满时阻塞等待"""
+        future: Future = Future()
+        try:
+            self._queue.put((row, future), timeout=timeout)
+        except queue.Full:
+            raise WriterBusyError("结果写入队列已满，请稍后重试")
+        return future
+
+    async def submit(self, row: Dict[str, Any], timeout: float = RESULT_TIMEOUT) -> Dict[str, Any]:
+        """放入一条结果并等待提交，返回补上 id 和 created_at 的行；超时抛出 WriterTimeoutError"""
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((row, future))
+        except queue.Full:
+            # 背压：在线程池中等待空位，不阻塞事件循环
+            future = await run_in_threadpool(self.submit_nowait, row)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise WriterTimeoutError("等待结果写入超时，请稍后确认结果是否已保存")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            group = [entry]
+            deadline = time.monotonic() + self.max_delay
+            while len(group) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                group.append(entry)
+            self._write_group(group)
+
+        # 停止前放入队列的结果同样写入
+        remaining: List[_Entry] = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                remaining.append(entry)
+        for start in range(0, len(remaining), self.max_batch):
+            self._write_group(remaining[start:start + self.max_batch])
+
+    def _write_group(self, group: List[_Entry]):
+        """写入一组结果；未预料的异常使组内尚未完成的请求失败，写线程继续处理后续的组"""
+        try:
+            self._write(group)
+        except Exception as e:
+            logger.error(f"写入结果组失败: {e}")
+            for _, future in group:
+                _fail(future, e)
+
+    def _write(self, group: List[_Entry]):
+        try:
+            committed = self._commit(group)
+        except Exception as e:
+            if len(group) == 1:
+                logger.error(f"写入结果失败: {e}")
+                _fail(group[0][1], e)
+                return
+            # 整组失败时逐条重试，避免一条错误的结果拖累同组其他请求
+            logger.warning(f"组提交失败，改为逐条写入: {e}")
+            for entry in group:
+                if not entry[1].done():
+                    self._write([entry])
+            return
+
+        self.stats["results"] += len(committed)
+        self.stats["groups"] += 1
+        # 结果已提交，先返回给请求方，用量统计失败不影响请求
+        for row, future in committed:
+            _resolve(future, row)
+        try:
+            analytics_service.record_results([row for row, _ in committed])
+        except Exception as e:
+            logger.error(f"记录结果用量失败: {e}")
+
+    def _commit(self, group: List[_Entry]) -> List[_Entry]:
+        """在一个事务中写入一组结果，返回 (写入的行, future)；版本不存在的条目直接失败"""
+        with self.engine.begin() as connection:
+            found = result_ingest.existing_versions(connection, (row["version_id"] for row, _ in group))
+            accepted = []
+            for row, future in group:
+                if row["version_id"] in found:
+                    # 写入会修改行，保留原始行以便失败后重试
+                    accepted.append((dict(row), future))
+                else:
+                    _fail(future, VersionNotFoundError(row["version_id"]))
+            if accepted:
+                result_ingest.insert_results(connection, [row for row, _ in accepted])
+        return accepted
+
+
+writer: Optional[ResultWriter] = None
+
+
+def get_writer() -> Optional[ResultWriter]:
+    """运行中的写入队列，未启用时返回None"""
+    return writer if writer is not None and writer.running else None
+
+
+def start_writer(engine):
+    global writer
+    if not ENABLED or get_writer() is not None:
+        return
+    writer = ResultWriter(engine)
+    writer.start()
+    logger.info(f"结果组提交已启用: 每组最多 {MAX_BATCH} 条，最长等待 {MAX_DELAY_MS}ms")
+
+
+def stop_writer():
+    if writer is not None:
+        writer.stop()
+        logger.info(f"结果写入队列已停止: {writer.stats}")
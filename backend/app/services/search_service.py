@@ -0,0 +1,346 @@
+"""
+全文搜索服务 - 基于 SQLite FTS5 的提示词与版本内容索引
+
+索引表与业务表分离维护：
+- prompts_fts：rowid = prompts.id，索引标题、描述和标签
+- prompt_versions_fts：rowid = prompt_versions.id，索引版本内容和变更说明
+
+索引通过 ORM 事件在同一事务内增量同步，应用启动时若索引表是新建的则全量回填。
+"""
+import html
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from ..models import prompt as models
+
+logger = logging.getLogger(__name__)
+
+# 中日韩字符没有空格分词，索引前在其两侧插入分隔符，按单字建立词元，
+# 查询时把中文词转换为相邻单字组成的短语，从而支持中文短语匹配。
+# 分隔符使用原文中不会出现的控制字符，展示片段时可以无损去除
+_CJK = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_CJK_BOUNDARY = re.compile(rf"(?<=[{_CJK}])(?=\S)|(?<=\S)(?=[{_CJK}])")
+_CJK_CHAR = re.compile(rf"[{_CJK}]")
+_SEPARATOR = "\x1f"
+_QUERY_TOKEN = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+# 高亮标记先用控制字符占位，转义HTML后再替换为 <mark>
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+_TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+
+_index_ready = False
+
+
+def _segment(value: Optional[str]) -> str:
+    """为中日韩字符插入分隔符，供索引和查询使用"""
+    if not value:
+        return ""
+    return _CJK_BOUNDARY.sub(_SEPARATOR, value)
+
+
+def _render_fragment(fragment: Optional[str]) -> Optional[str]:
+    """去除分词时插入的分隔符，转义HTML并生成 <mark> 高亮"""
+    if fragment is None:
+        return None
+    fragment = html.escape(fragment, quote=False)
+    fragment = fragment.replace(_SEPARATOR, "")
+    return fragment.replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    将用户输入转换为安全的 FTS5 MATCH 表达式
+
+    - 普通词：按词匹配，多个词之间为 AND 关系
+    - 以 * 结尾的词：前缀匹配
+    - 双引号包裹的内容：短语匹配（可在引号后加 * 做前缀）
+    所有词元都会被引号包裹，用户输入无法注入 FTS5 运算符
+    """
+    terms = []
+    for match in _QUERY_TOKEN.finditer(query or ""):
+        phrase, phrase_prefix, word = match.groups()
+        if word is not None:
+            prefix = word.endswith("*")
+            body = word.rstrip("*")
+        else:
+            prefix = bool(phrase_prefix)
+            body = phrase
+        body = _segment(body.replace('"', " ")).strip()
+        if not body:
+            continue
+        # 中文词的最后一个字是完整的单字词元，前缀匹配没有意义
+        if prefix and _CJK_CHAR.fullmatch(body[-1]):
+            prefix = False
+        terms.append(f'"{body}"' + ("*" if prefix else ""))
+    return " ".join(terms) if terms else None
+
+
+def _prompt_row(prompt: models.Prompt) -> Dict[str, Any]:
+    return {
+        "rowid": prompt.id,
+        "title": _segment(prompt.title),
+        "description": _segment(prompt.description),
+        "tags": _segment(" ".join(prompt.tags or [])),
+    }
+
+
+def _version_row(version: models.PromptVersion) -> Dict[str, Any]:
+    return {
+        "rowid": version.id,
+        "content": _segment(version.content),
+        "change_notes": _segment(version.change_notes),
+        "prompt_id": version.prompt_id,
+    }
+
+
+def index_prompts(connection, rows: List[Dict[str, Any]]):
+    """写入或替换提示词索引行"""
+    if not rows:
+        return
+    connection.execute(text("DELETE FROM prompts_fts WHERE rowid = :rowid"), [{"rowid": r["rowid"]} for r in rows])
+    connection.execute(
+        text("INSERT INTO prompts_fts(rowid, title, description, tags) VALUES (:rowid, :title, :description, :tags)"),
+        rows
+    )
+
+
+def index_versions(connection, rows: List[Dict[str, Any]]):
+    """写入或替换版本索引行"""
+    if not rows:
+        return
+    connection.execute(text("DELETE FROM prompt_versions_fts WHERE rowid = :rowid"), [{"rowid": r["rowid"]} for r in rows])
+    connection.execute(
+        text(
+            "INSERT INTO prompt_versions_fts(rowid, content, change_notes, prompt_id) "
+            "VALUES (:rowid, :content, :change_notes, :prompt_id)"
+        ),
+        rows
+    )
+
+
+def ensure_search_index(engine, batch_size: int = 1000):
+    """创建FTS5索引表；新建时从业务表全量回填"""
+    global _index_ready
+    if engine.dialect.name != "sqlite":
+        logger.info("非SQLite数据库，跳过全文搜索索引")
+        return
+
+    with engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE name IN ('prompts_fts', 'prompt_versions_fts')")
+            )
+        }
+        conn.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(title, description, tags, {_TOKENIZE})"))
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS prompt_versions_fts "
+            f"USING fts5(content, change_notes, prompt_id UNINDEXED, {_TOKENIZE})"
+        ))
+        # 持久化排序函数：标题权重最高，其次是标签
+        conn.execute(text("INSERT INTO prompts_fts(prompts_fts, rank) VALUES ('rank', 'bm25(10.0, 2.0, 5.0)')"))
+        conn.execute(text("INSERT INTO prompt_versions_fts(prompt_versions_fts, rank) VALUES ('rank', 'bm25(3.0, 1.0)')"))
+
+    _index_ready = True
+
+    if "prompts_fts" not in existing:
+        rebuild_index(engine, models.Prompt, batch_size)
+    if "prompt_versions_fts" not in existing:
+        rebuild_index(engine, models.PromptVersion, batch_size)
+
+
+def rebuild_index(engine, model, batch_size: int = 1000):
+    """按主键分批重建指定模型的全文索引"""
+    table, to_row, write = {
+        models.Prompt: ("prompts_fts", _prompt_row, index_prompts),
+        models.PromptVersion: ("prompt_versions_fts", _version_row, index_versions),
+    }[model]
+
+    with Session(bind=engine) as db:
+        db.execute(text(f"DELETE FROM {table}"))
+        last_id = 0
+        while True:
+            batch = db.query(model).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not batch:
+                break
+            write(db.connection(), [to_row(obj) for obj in batch])
+            last_id = batch[-1].id
+            db.expunge_all()
+        db.commit()
+    logger.info(f"全文索引 {table} 重建完成")
+
+
+def _changed(target, *fields: str) -> bool:
+    state = inspect(target)
+    return any(state.attrs[f].history.has_changes() for f in fields)
+
+
+@event.listens_for(models.Prompt, "after_insert")
+def _prompt_inserted(mapper, connection, target):
+    if _index_ready:
+        index_prompts(connection, [_prompt_row(target)])
+
+
+@event.listens_for(models.Prompt, "after_update")
+def _prompt_updated(mapper, connection, target):
+    if _index_ready and _changed(target, "title", "description", "tags"):
+        index_prompts(connection, [_prompt_row(target)])
+
+
+@event.listens_for(models.Prompt, "after_delete")
+def _prompt_deleted(mapper, connection, target):
+    if _index_ready:
+        connection.execute(text("DELETE FROM prompts_fts WHERE rowid = :rowid"), {"rowid": target.id})
+
+
+@event.listens_for(models.PromptVersion, "after_insert")
+def _version_inserted(mapper, connection, target):
+    if _index_ready:
+        index_versions(connection, [_version_row(target)])
+
+
+@event.listens_for(models.PromptVersion, "after_update")
+def _version_updated(mapper, connection, target):
+    if _index_ready and _changed(target, "content_hash", "change_notes"):
+        index_versions(connection, [_version_row(target)])
+
+
+@event.listens_for(models.PromptVersion, "after_delete")
+def _version_deleted(mapper, connection, target):
+    if _index_ready:
+        connection.execute(text("DELETE FROM prompt_versions_fts WHERE rowid = :rowid"), {"rowid": target.id})
+
+
+# 搜索范围 -> 依次查询的索引
+SCOPES = {"all": ("prompts", "versions"), "prompts": ("prompts",), "versions": ("versions",)}
+_FTS_TABLES = {"prompts": "prompts_fts", "versions": "prompt_versions_fts"}
+
+# 位置：(索引, rank, rowid)，同一索引内按 (rank, rowid) 排序
+Position = Tuple[str, float, int]
+
+
+def _top(db, index: str, match: str, after: Optional[Tuple[float, int]], limit: int) -> List[Tuple[float, int]]:
+    """按 (rank, rowid) 键集分页取一个索引的下一批命中，只读取 rank 和 rowid"""
+    table = _FTS_TABLES[index]
+    condition = ""
+    params = {"match": match, "limit": limit}
+    if after is not None:
+        condition = "AND (rank > :rank OR (rank = :rank AND rowid > :rowid)) "
+        params.update(rank=after[0], rowid=after[1])
+    rows = db.execute(
+        text(
+            f"SELECT rank, rowid FROM {table} WHERE {table} MATCH :match {condition}"
+            "ORDER BY rank, rowid LIMIT :limit"
+        ),
+        params
+    ).all()
+    return [(row.rank, row.rowid) for row in rows]
+
+
+def _in_clause(rowids: List[int]) -> Tuple[str, Dict[str, int]]:
+    names = [f"r{index}" for index in range(len(rowids))]
+    return ", ".join(f":{name}" for name in names), dict(zip(names, rowids))
+
+
+def _prompt_hits(db, match: str, rowids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """为当页的提示词命中生成高亮标题和片段"""
+    placeholders, params = _in_clause(rowids)
+    rows = db.execute(
+        text(
+            "SELECT rowid, rank, "
+            "highlight(prompts_fts, 0, :mo, :mc) AS title, "
+            "snippet(prompts_fts, 1, :mo, :mc, '…', 24) AS description, "
+            "snippet(prompts_fts, 2, :mo, :mc, '…', 8) AS tags "
+            f"FROM prompts_fts WHERE prompts_fts MATCH :match AND rowid IN ({placeholders})"
+        ),
+        {"match": match, "mo": _MARK_OPEN, "mc": _MARK_CLOSE, **params}
+    ).all()
+    hits = {}
+    for row in rows:
+        snippet = row.description if _MARK_OPEN in (row.description or "") else (row.tags or row.description)
+        hits[row.rowid] = {
+            "type": "prompt",
+            "id": row.rowid,
+            "prompt_id": row.rowid,
+            "title": _render_fragment(row.title),
+            "snippet": _render_fragment(snippet),
+            "score": -row.rank,
+        }
+    return hits
+
+
+def _version_hits(db, match: str, rowids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """为当页的版本命中生成片段"""
+    placeholders, params = _in_clause(rowids)
+    rows = db.execute(
+        text(
+            "SELECT f.rowid, f.rank, f.prompt_id, "
+            "snippet(prompt_versions_fts, 0, :mo, :mc, '…', 32) AS content, "
+            "snippet(prompt_versions_fts, 1, :mo, :mc, '…', 16) AS change_notes, "
+            "v.version_number, p.title "
+            "FROM prompt_versions_fts AS f "
+            "JOIN prompt_versions AS v ON v.id = f.rowid "
+            "JOIN prompts AS p ON p.id = v.prompt_id "
+            f"WHERE prompt_versions_fts MATCH :match AND f.rowid IN ({placeholders})"
+        ),
+        {"match": match, "mo": _MARK_OPEN, "mc": _MARK_CLOSE, **params}
+    ).all()
+    hits = {}
+    for row in rows:
+        snippet = row.content if _MARK_OPEN in (row.content or "") else row.change_notes
+        hits[row.rowid] = {
+            "type": "version",
+            "id": row.rowid,
+            "prompt_id": row.prompt_id,
+            "version_number": row.version_number,
+            "title": html.escape(row.title, quote=False),
+            "snippet": _render_fragment(snippet),
+            "score": -row.rank,
+        }
+    return hits
+
+
+_DETAILS = {"prompts": _prompt_hits, "versions": _version_hits}
+
+
+def search(db, query: str, scope: str = "all", limit: int = 20,
+           after: Optional[Position] = None) -> Tuple[List[Dict[str, Any]], Optional[Position]]:
+    """
+    执行排序后的全文搜索，返回 (当页命中, 下一页的起始位置)；after 为上一页返回的位置
+
+    两个索引的 bm25 使用不同的列权重，分数不可相互比较，因此不混合排序：
+    scope 为 all 时先返回全部提示词命中，再返回版本命中，各自按相关性排序。
+    每个索引按 (rank, rowid) 键集分页，翻页不会越来越慢；片段和高亮只为当页的行生成
+    """
+    if not _index_ready:
+        raise RuntimeError("全文搜索索引不可用")
+    match = build_match_query(query)
+    if match is None:
+        return [], None
+
+    indexes = SCOPES[scope]
+    if after is not None and after[0] not in indexes:
+        raise ValueError("游标与搜索范围不匹配")
+    start = indexes.index(after[0]) if after is not None else 0
+
+    # 多取一条用于判断是否还有下一页
+    keys: List[Position] = []
+    for index in indexes[start:]:
+        position = (after[1], after[2]) if after is not None and after[0] == index else None
+        keys.extend((index, rank, rowid) for rank, rowid in _top(db, index, match, position, limit + 1 - len(keys)))
+        if len(keys) > limit:
+            break
+    next_after = keys[limit - 1] if len(keys) > limit else None
+    keys = keys[:limit]
+
+    details = {}
+    for index in indexes:
+        rowids = [rowid for key_index, _, rowid in keys if key_index == index]
+        if rowids:
+            details[index] = _DETAILS[index](db, match, rowids)
+    # 两次查询之间被删除的行直接跳过
+    return [details[index][rowid] for index, _, rowid in keys if rowid in details[index]], next_after
@@ -0,0 +1,212 @@
+"""
+版本结果统计 - 在 version_stats 表中增量维护每个版本的聚合值
+
+结果通过ORM写入、修改或删除时由本模块的事件自动更新统计；绕过ORM的批量写入
+须在同一事务中调用 record_results。归档只是移动结果，不影响统计。
+执行时间的分位数由可合并的草图估计，更新时无需重新读取历史结果。
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, event, inspect, select, update
+
+from ..core.sketch import QuantileSketch
+from ..models import prompt as models
+from . import archive_service
+
+logger = logging.getLogger(__name__)
+
+_results = models.OptimizationResult.__table__
+_stats = models.VersionStats.__table__
+
+# 统计用到的结果字段
+STAT_FIELDS = (
+    "version_id", "execution_time", "is_error", "input_tokens", "output_tokens",
+    "total_tokens", "cost", "user_rating",
+)
+_SUM_FIELDS = (
+    "result_count", "error_count", "execution_time_sum", "execution_time_count", "input_tokens_sum",
+    "output_tokens_sum", "total_tokens_sum", "cost_sum", "rating_sum", "rating_count",
+)
+# 接口返回的执行时间分位数
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+
+
+class _Accumulator:
+    """一个版本的统计增量"""
+
+    def __init__(self):
+        self.sums = dict.fromkeys(_SUM_FIELDS, 0)
+        self.sketch = QuantileSketch()
+
+    def add(self, row: Dict[str, Any], sign: int = 1):
+        sums = self.sums
+        sums["result_count"] += sign
+        sums["error_count"] += sign if row.get("is_error") else 0
+        if row.get("execution_time") is not None:
+            sums["execution_time_sum"] += sign * row["execution_time"]
+            sums["execution_time_count"] += sign
+            self.sketch.add(row["execution_time"], sign)
+        sums["input_tokens_sum"] += sign * (row.get("input_tokens") or 0)
+        sums["output_tokens_sum"] += sign * (row.get("output_tokens") or 0)
+        sums["total_tokens_sum"] += sign * (row.get("total_tokens") or 0)
+        sums["cost_sum"] += sign * (row.get("cost") or 0)
+        if row.get("user_rating") is not None:
+            sums["rating_sum"] += sign * row["user_rating"]
+            sums["rating_count"] += sign
+
+
+def _accumulate(rows: Iterable[Dict[str, Any]], sign: int = 1) -> Dict[int, _Accumulator]:
+    groups: Dict[int, _Accumulator] = defaultdict(_Accumulator)
+    for row in rows:
+        groups[row["version_id"]].add(row, sign)
+    return groups
+
+
+def _apply(connection, groups: Dict[int, _Accumulator]):
+    """
+    将增量合并到统计表
+
+    调用方须已在写事务中（例如刚写入结果），草图的读改写不会与其他写入交错
+    """
+    for version_id, delta in groups.items():
+        current = connection.execute(
+            select(_stats.c.execution_time_sketch).where(_stats.c.version_id == version_id)
+        ).first()
+        if current is None:
+            if delta.sums["result_count"] <= 0:
+                # 统计尚未回填的旧结果被修改或删除，等待 rebuild 重新计算
+                continue
+            connection.execute(_stats.insert().values(
+                version_id=version_id, execution_time_sketch=delta.sketch.to_dict(), **delta.sums
+            ))
+            continue
+        sketch = QuantileSketch.from_dict(current.execution_time_sketch)
+        sketch.merge(delta.sketch)
+        values = {name: _stats.c[name] + value for name, value in delta.sums.items() if value}
+        connection.execute(update(_stats).where(_stats.c.version_id == version_id).values(
+            execution_time_sketch=sketch.to_dict(), **values
+        ))
+
+
+def record_results(connection, rows: Iterable[Dict[str, Any]], sign: int = 1):
+    """将一批结果（包含 STAT_FIELDS 的字典）计入统计；sign=-1 表示移除"""
+    _apply(connection, _accumulate(rows, sign))
+
+
+def _row(target, **overrides) -> Dict[str, Any]:
+    row = {name: getattr(target, name) for name in STAT_FIELDS}
+    row.update(overrides)
+    return row
+
+
+@event.listens_for(models.OptimizationResult, "after_insert")
+def _result_inserted(mapper, connection, target):
+    record_results(connection, [_row(target)])
+
+
+@event.listens_for(models.OptimizationResult, "after_update")
+def _result_updated(mapper, connection, target):
+    state = inspect(target)
+    changed = {
+        name: state.attrs[name].history.deleted[0]
+        for name in STAT_FIELDS if state.attrs[name].history.deleted
+    }
+    if changed:
+        groups: Dict[int, _Accumulator] = defaultdict(_Accumulator)
+        old, new = _row(target, **changed), _row(target)
+        groups[old["version_id"]].add(old, -1)
+        groups[new["version_id"]].add(new)
+        _apply(connection, groups)
+
+
+@event.listens_for(models.OptimizationResult, "after_delete")
+def _result_deleted(mapper, connection, target):
+    record_results(connection, [_row(target)], -1)
+
+
+@event.listens_for(models.PromptVersion, "after_delete")
+def _version_deleted(mapper, connection, target):
+    connection.execute(delete(_stats).where(_stats.c.version_id == target.id))
+
+
+def get_stats(connection, version_id: int) -> Dict[str, Any]:
+    """读取版本统计（单行主键查询）"""
+    row = connection.execute(select(_stats).where(_stats.c.version_id == version_id)).first()
+    if row is None:
+        return {
+            "version_id": version_id, "total_results": 0, "error_count": 0, "success_rate": 0.0,
+            "average_rating": None, "rating_count": 0, "average_execution_time": None,
+            "execution_time_percentiles": None, "input_tokens_used": 0, "output_tokens_used": 0,
+            "total_tokens_used": 0, "total_cost": 0.0, "updated_at": None,
+        }
+    sketch = QuantileSketch.from_dict(row.execution_time_sketch)
+    return {
+        "version_id": version_id,
+        "total_results": row.result_count,
+        "error_count": row.error_count,
+        "success_rate": (row.result_count - row.error_count) / row.result_count if row.result_count else 0.0,
+        "average_rating": row.rating_sum / row.rating_count if row.rating_count else None,
+        "rating_count": row.rating_count,
+        "average_execution_time": (
+            row.execution_time_sum / row.execution_time_count if row.execution_time_count else None
+        ),
+        "execution_time_percentiles": (
+            {name: sketch.quantile(q) for name, q in PERCENTILES.items()} if sketch.count > 0 else None
+        ),
+        "input_tokens_used": row.input_tokens_sum,
+        "output_tokens_used": row.output_tokens_sum,
+        "total_tokens_used": row.total_tokens_sum,
+        "total_cost": row.cost_sum,
+        "updated_at": row.updated_at,
+    }
+
+
+def ensure_stats(engine):
+    """统计表为空但已有结果时（首次升级）回填统计"""
+    with engine.connect() as connection:
+        has_stats = connection.execute(select(_stats.c.version_id).limit(1)).first() is not None
+        has_results = connection.execute(select(_results.c.id).limit(1)).first() is not None
+    if not has_stats and has_results:
+        rebuild(engine)
+
+
+def rebuild(engine, version_ids: Optional[List[int]] = None, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    从热表中的结果和归档文件重新计算统计（用于首次回填或修复）
+
+    每个版本在独立事务中替换统计行
+    """
+    report = {"versions": 0, "results": 0, "archived": 0}
+    with engine.connect() as connection:
+        if version_ids is None:
+            version_ids = [row[0] for row in connection.execute(select(models.PromptVersion.id))]
+
+    columns = [_results.c[name] for name in STAT_FIELDS]
+    for version_id in version_ids:
+        with engine.begin() as connection:
+            delta = _Accumulator()
+            rows = connection.execution_options(yield_per=batch_size).execute(
+                select(*columns).where(_results.c.version_id == version_id)
+            )
+            for row in rows:
+                delta.add(row._mapping)
+                report["results"] += 1
+
+            after_id = None
+            while True:
+                records = archive_service.read_archived(connection, version_id, after_id, limit=batch_size)
+                if not records:
+                    break
+                for record in records:
+                    delta.add(record)
+                report["archived"] += len(records)
+                after_id = records[-1]["id"]
+
+            connection.execute(delete(_stats).where(_stats.c.version_id == version_id))
+            if delta.sums["result_count"]:
+                _apply(connection, {version_id: delta})
+            report["versions"] += 1
+    logger.info(f"版本统计重建完成: {report}")
+    return report
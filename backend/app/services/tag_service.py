@@ -0,0 +1,104 @@
+"""
+标签索引服务 - 维护 prompt_tags 关联表并提供基于索引的标签查询
+
+Prompt.tags（JSON数组）仍是对外的数据格式，prompt_tags 是它的规范化副本，
+通过 ORM 事件在同一事务内同步，启动时对旧数据做一次性回填。
+"""
+import logging
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, event, func, inspect, insert, select, text
+
+from ..models import prompt as models
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_tags(tags: Optional[Iterable[str]]) -> List[str]:
+    """去除首尾空白、空标签和重复标签，保持原有顺序"""
+    seen = []
+    for tag in tags or []:
+        if isinstance(tag, str):
+            tag = tag.strip()
+            if tag and tag not in seen:
+                seen.append(tag)
+    return seen
+
+
+def sync_prompt_tags(connection, prompt_id: int, tags: Optional[Iterable[str]]):
+    """用给定标签列表替换某个提示词的标签索引"""
+    connection.execute(delete(models.PromptTag).where(models.PromptTag.prompt_id == prompt_id))
+    rows = [{"prompt_id": prompt_id, "tag": tag} for tag in normalize_tags(tags)]
+    if rows:
+        connection.execute(insert(models.PromptTag), rows)
+
+
+def ensure_tag_index(engine):
+    """标签索引表为空而提示词存在标签时，从JSON字段一次性回填"""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        if conn.execute(select(models.PromptTag.prompt_id).limit(1)).first() is not None:
+            return
+        result = conn.execute(text(
+            "INSERT OR IGNORE INTO prompt_tags (prompt_id, tag) "
+            "SELECT p.id, trim(j.value) FROM prompts AS p, json_each(p.tags) AS j "
+            "WHERE p.tags IS NOT NULL AND json_valid(p.tags) AND j.type = 'text' AND trim(j.value) != ''"
+        ))
+        if result.rowcount:
+            logger.info(f"标签索引回填完成: {result.rowcount} 条")
+
+
+@event.listens_for(models.Prompt, "after_insert")
+def _prompt_inserted(mapper, connection, target):
+    if target.tags:
+        sync_prompt_tags(connection, target.id, target.tags)
+
+
+@event.listens_for(models.Prompt, "after_update")
+def _prompt_updated(mapper, connection, target):
+    if inspect(target).attrs.tags.history.has_changes():
+        sync_prompt_tags(connection, target.id, target.tags)
+
+
+@event.listens_for(models.Prompt, "after_delete")
+def _prompt_deleted(mapper, connection, target):
+    connection.execute(delete(models.PromptTag).where(models.PromptTag.prompt_id == target.id))
+
+
+def filter_by_tags(query, tags: Optional[List[str]], mode: str = "all"):
+    """
+    按标签筛选提示词查询
+
+    mode="all" 要求包含全部标签，mode="any" 包含任一标签即可；
+    每个条件都是 (tag, prompt_id) 索引上的子查询
+    """
+    tags = normalize_tags(tags)
+    if not tags:
+        return query
+    if mode == "any":
+        return query.filter(models.Prompt.id.in_(
+            select(models.PromptTag.prompt_id).where(models.PromptTag.tag.in_(tags))
+        ))
+    for tag in tags:
+        query = query.filter(models.Prompt.id.in_(
+            select(models.PromptTag.prompt_id).where(models.PromptTag.tag == tag)
+        ))
+    return query
+
+
+def tag_facets(db, prompt_ids=None, prefix: Optional[str] = None, limit: int = 50):
+    """
+    统计标签使用次数，按次数降序返回 [(tag, count)]
+
+    prompt_ids 为可选的提示词ID子查询，用于在筛选结果内统计（分面钻取）
+    """
+    count = func.count(models.PromptTag.prompt_id).label("count")
+    query = select(models.PromptTag.tag, count).group_by(models.PromptTag.tag)
+    if prompt_ids is not None:
+        query = query.where(models.PromptTag.prompt_id.in_(prompt_ids))
+    if prefix:
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(models.PromptTag.tag.like(f"{escaped}%", escape="\\"))
+    query = query.order_by(count.desc(), models.PromptTag.tag).limit(limit)
+    return db.execute(query).all()
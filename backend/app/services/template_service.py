@@ -0,0 +1,123 @@
+"""
+提示词模板服务 - 模板的编译、渲染与使用次数统计
+
+渲染使用 core/template.py 的编译结果（按内容哈希缓存），模板记录修改后内容哈希随之变化，无需额外失效。
+使用次数先在进程内累计，由后台线程每 TEMPLATE_USAGE_FLUSH_INTERVAL 秒合并写入 prompt_templates.usage_count，
+渲染请求不再各自写库；读取模板时加上尚未写入的计数。
+"""
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, func, update
+
+from ..core.template import CompiledTemplate, compile_template
+from ..models import prompt as models
+
+logger = logging.getLogger(__name__)
+
+# 使用次数写入数据库的间隔（秒）
+FLUSH_INTERVAL = float(os.getenv("TEMPLATE_USAGE_FLUSH_INTERVAL", "5"))
+
+_templates = models.PromptTemplate.__table__
+
+
+def compiled(template: models.PromptTemplate) -> CompiledTemplate:
+    return compile_template(template.template_content)
+
+
+class UsageCounter:
+    """进程内的模板使用次数缓冲区"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def add(self, template_id: int, count: int = 1):
+        if count <= 0:
+            return
+        with self._lock:
+            self._counts[template_id] += count
+
+    def pending(self, template_id: int) -> int:
+        with self._lock:
+            return self._counts.get(template_id, 0)
+
+    def drain(self) -> Dict[int, int]:
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return dict(counts)
+
+    def restore(self, counts: Dict[int, int]):
+        """写入失败时放回缓冲区，下次重试"""
+        with self._lock:
+            self._counts.update(counts)
+
+    def discard(self, template_id: int):
+        """模板删除后丢弃其计数"""
+        with self._lock:
+            self._counts.pop(template_id, None)
+
+
+usage = UsageCounter()
+
+
+def usage_count(template: models.PromptTemplate) -> int:
+    """数据库中的使用次数加上尚未写入的计数"""
+    return (template.usage_count or 0) + usage.pending(template.id)
+
+
+def flush(engine) -> int:
+    """将累计的使用次数写入数据库，返回涉及的模板数"""
+    counts = usage.drain()
+    if not counts:
+        return 0
+    # 只增加计数，保持 updated_at 不变（onupdate 会将其改为当前时间）
+    statement = update(_templates).where(_templates.c.id == bindparam("template_id")).values(
+        usage_count=func.coalesce(_templates.c.usage_count, 0) + bindparam("delta"),
+        updated_at=_templates.c.updated_at,
+    )
+    try:
+        with engine.begin() as connection:
+            connection.execute(statement, [
+                {"template_id": template_id, "delta": count} for template_id, count in counts.items()
+            ])
+    except Exception:
+        usage.restore(counts)
+        raise
+    return len(counts)
+
+
+_flush_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def start_background_flush(engine):
+    """启动周期写入使用次数的后台线程"""
+    global _flush_thread
+    if _flush_thread is not None and _flush_thread.is_alive():
+        return
+
+    def run():
+        while not _stop.wait(FLUSH_INTERVAL):
+            try:
+                flush(engine)
+            except Exception as e:
+                logger.error(f"写入模板使用次数失败: {e}")
+
+    _stop.clear()
+    _flush_thread = threading.Thread(target=run, name="template-usage", daemon=True)
+    _flush_thread.start()
+
+
+def stop_background_flush(engine, timeout: float = 5.0):
+    """停止后台线程并写入剩余的计数"""
+    _stop.set()
+    if _flush_thread is not None:
+        _flush_thread.join(timeout)
+    try:
+        flush(engine)
+    except Exception as e:
+        logger.error(f"关闭时写入模板使用次数失败: {e}")
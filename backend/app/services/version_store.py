@@ -0,0 +1,300 @@
+"""
+版本内容存储 - 以相对上一版本的压缩差量保存提示词版本内容
+
+存储格式（prompt_versions 表）：
+- content_encoding 为空：旧数据，明文保存在 content 列
+- full：content_data 为 zlib 压缩的全文（旧的关键帧格式，可迁移为 blob）
+- blob：关键帧，全文保存在 content_blobs 中，由 content_hash 引用（见 blob_store.py）
+- delta：content_data 为 zlib 压缩的差量，基于 base_version_id 对应版本的内容
+
+每个版本以同一提示词中版本号最接近的前一版本为基准，差量链长度达到
+KEYFRAME_INTERVAL 或差量不比全文更小时写入关键帧；内容与已有版本或内容块
+完全相同时直接引用内容块。还原后的内容按 SHA-256 缓存在进程内，热点版本无需重复解码。
+"""
+import difflib
+import json
+import logging
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session, object_session
+
+from ..models import prompt as models
+from . import blob_store
+
+logger = logging.getLogger(__name__)
+
+ENCODING_FULL = "full"
+ENCODING_BLOB = "blob"
+ENCODING_DELTA = "delta"
+
+# 差量链的最大长度，达到后写入完整关键帧
+KEYFRAME_INTERVAL = int(os.getenv("VERSION_KEYFRAME_INTERVAL", "8"))
+
+# 还原内容缓存与内容块共用：键为内容哈希
+_content_cache = blob_store.text_cache
+
+# 按句子/行切分文本作为差量比较的单位，同时适用于中英文
+_TOKEN = re.compile(r"[^\n。！？；.!?;]*[\n。！？；.!?;]+|[^\n。！？；.!?;]+")
+
+_versions = models.PromptVersion.__table__
+_STORAGE_COLUMNS = (
+    _versions.c.id, _versions.c.content, _versions.c.content_encoding, _versions.c.content_data,
+    _versions.c.base_version_id, _versions.c.delta_depth, _versions.c.content_hash,
+)
+
+
+content_hash = blob_store.content_hash
+
+
+def encode_full(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 9)
+
+
+def decode_full(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+def make_delta(base: str, target: str) -> bytes:
+    """
+    计算从 base 到 target 的差量
+
+    差量为操作列表：[start, length] 表示复制 base 中的一段，字符串表示插入新文本
+    """
+    base_tokens = _TOKEN.findall(base)
+    target_tokens = _TOKEN.findall(target)
+    offsets = [0]
+    for token in base_tokens:
+        offsets.append(offsets[-1] + len(token))
+
+    ops: List[Any] = []
+    matcher = difflib.SequenceMatcher(None, base_tokens, target_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([offsets[i1], offsets[i2] - offsets[i1]])
+        elif tag in ("replace", "insert"):
+            ops.append("".join(target_tokens[j1:j2]))
+    payload = json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(payload.encode("utf-8"), 9)
+
+
+def apply_delta(base: str, data: bytes) -> str:
+    """将差量应用到基准内容上"""
+    ops = json.loads(zlib.decompress(data).decode("utf-8"))
+    return "".join(base[op[0]:op[0] + op[1]] if isinstance(op, list) else op for op in ops)
+
+
+def _decode_row(connection, row) -> str:
+    if row.content_encoding is None:
+        return row.content
+    if row.content_encoding == ENCODING_BLOB:
+        return blob_store.load(connection, row.content_hash)
+    text = _content_cache.get(row.content_hash)
+    if text is None:
+        if row.content_encoding == ENCODING_FULL:
+            text = decode_full(row.content_data)
+        else:
+            text = apply_delta(load_text(connection, row.base_version_id), row.content_data)
+        _content_cache.set(row.content_hash, text)
+    return text
+
+
+def load_text(connection, version_id: int) -> str:
+    """通过数据库连接还原指定版本的完整内容"""
+    row = connection.execute(select(*_STORAGE_COLUMNS).where(_versions.c.id == version_id)).first()
+    if row is None:
+        raise LookupError(f"版本 {version_id} 不存在，无法还原差量")
+    return _decode_row(connection, row)
+
+
+def resolve_content(version: "models.PromptVersion") -> str:
+    """还原ORM版本对象的内容（PromptVersion.content 属性的实现）"""
+    if version.content_encoding is None:
+        return version._content
+    session = object_session(version)
+    if session is not None:
+        return _decode_row(session.connection(), version)
+    from ..database import engine
+    with engine.connect() as connection:
+        return _decode_row(connection, version)
+
+
+def encode_content(connection, prompt_id: int, version_number: int, text: str,
+                   exclude_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    为即将写入的版本内容选择存储格式，返回需要写入的列值
+
+    内容已存在于内容块或其他版本中时直接引用内容块；否则以同一提示词中
+    版本号小于 version_number 的最新版本为基准计算差量，不合适时写入关键帧。
+    返回 blob 编码时已为该版本增加了一个内容块引用
+    """
+    digest = content_hash(text)
+    values = {
+        "content": "",
+        "content_encoding": ENCODING_BLOB,
+        "content_data": None,
+        "base_version_id": None,
+        "delta_depth": 0,
+        "content_hash": digest,
+    }
+    duplicate = select(_versions.c.id).where(_versions.c.content_hash == digest)
+    if exclude_id is not None:
+        duplicate = duplicate.where(_versions.c.id != exclude_id)
+    if blob_store.exists(connection, digest) or connection.execute(duplicate.limit(1)).first() is not None:
+        blob_store.acquire(connection, text)
+        return values
+
+    query = select(*_STORAGE_COLUMNS).where(
+        _versions.c.prompt_id == prompt_id,
+        _versions.c.version_number < version_number
+    )
+    if exclude_id is not None:
+        query = query.where(_versions.c.id != exclude_id)
+    base = connection.execute(query.order_by(_versions.c.version_number.desc()).limit(1)).first()
+    if base is not None and (base.delta_depth or 0) + 1 < KEYFRAME_INTERVAL:
+        delta = make_delta(_decode_row(connection, base), text)
+        if len(delta) < len(encode_full(text)):
+            values.update(
+                content_encoding=ENCODING_DELTA,
+                content_data=delta,
+                base_version_id=base.id,
+                delta_depth=(base.delta_depth or 0) + 1,
+            )
+            return values
+
+    blob_store.acquire(connection, text)
+    return values
+
+
+def _release_stored(connection, version_id: int):
+    """版本被改写或删除前释放其持有的内容块引用"""
+    row = connection.execute(
+        select(_versions.c.content_encoding, _versions.c.content_hash).where(_versions.c.id == version_id)
+    ).first()
+    if row is not None and row.content_encoding == ENCODING_BLOB:
+        blob_store.release(connection, row.content_hash)
+
+
+def _apply_values(target: "models.PromptVersion", values: Dict[str, Any]):
+    target._content = values["content"]
+    for key in ("content_encoding", "content_data", "base_version_id", "delta_depth", "content_hash"):
+        setattr(target, key, values[key])
+
+
+def _preserve_dependents(connection, target: "models.PromptVersion"):
+    """
+    版本内容被修改或删除前，记下其旧内容，
+    flush 结束后把仍以它为基准的差量版本改写为关键帧
+    """
+    has_dependents = connection.execute(
+        select(_versions.c.id).where(_versions.c.base_version_id == target.id).limit(1)
+    ).first()
+    if has_dependents is not None:
+        session = object_session(target)
+        session.info.setdefault("version_store_rebase", {})[target.id] = load_text(connection, target.id)
+
+
+@event.listens_for(models.PromptVersion, "before_insert")
+def _version_before_insert(mapper, connection, target):
+    text = getattr(target, "_content_text", None)
+    if text is None:
+        text = target._content
+    _apply_values(target, encode_content(connection, target.prompt_id, target.version_number, text))
+
+
+@event.listens_for(models.PromptVersion, "after_insert")
+def _version_after_insert(mapper, connection, target):
+    _content_cache.set(target.content_hash, target.content)
+
+
+@event.listens_for(models.PromptVersion, "before_update")
+def _version_before_update(mapper, connection, target):
+    if not inspect(target).attrs._content.history.has_changes() or target._content == "":
+        return
+    text = target._content
+    _preserve_dependents(connection, target)
+    _release_stored(connection, target.id)
+    _apply_values(target, encode_content(
+        connection, target.prompt_id, target.version_number, text, exclude_id=target.id
+    ))
+    target._content_text = text
+
+
+@event.listens_for(models.PromptVersion, "before_delete")
+def _version_before_delete(mapper, connection, target):
+    _preserve_dependents(connection, target)
+    _release_stored(connection, target.id)
+
+
+@event.listens_for(Session, "after_flush")
+def _rebase_dependents(session, flush_context):
+    old_texts = session.info.pop("version_store_rebase", None)
+    if not old_texts:
+        return
+    connection = session.connection()
+    rows = connection.execute(
+        select(*_STORAGE_COLUMNS).where(_versions.c.base_version_id.in_(list(old_texts)))
+    ).all()
+    for row in rows:
+        text = apply_delta(old_texts[row.base_version_id], row.content_data)
+        connection.execute(
+            update(_versions).where(_versions.c.id == row.id).values(
+                content_encoding=ENCODING_BLOB,
+                content_data=None,
+                content_hash=blob_store.acquire(connection, text),
+                base_version_id=None,
+                delta_depth=0,
+            )
+        )
+    if rows:
+        logger.info(f"已将 {len(rows)} 个依赖版本改写为关键帧")
+
+
+def migrate_existing(engine, prompts_per_batch: int = 50) -> Dict[str, Any]:
+    """
+    将旧的明文版本内容一次性转换为差量存储，按提示词分批提交
+
+    返回迁移报告：版本数、关键帧/差量数量以及迁移前后的内容字节数
+    """
+    report = {"versions": 0, "keyframes": 0, "deltas": 0, "bytes_before": 0, "bytes_after": 0}
+    blob_bytes = blob_store.stored_bytes(engine)
+    with engine.connect() as connection:
+        prompt_ids = [
+            row[0] for row in connection.execute(
+                select(_versions.c.prompt_id).where(_versions.c.content_encoding.is_(None)).distinct()
+            )
+        ]
+
+    for start in range(0, len(prompt_ids), prompts_per_batch):
+        with engine.begin() as connection:
+            for prompt_id in prompt_ids[start:start + prompts_per_batch]:
+                rows = connection.execute(
+                    select(_versions.c.id, _versions.c.version_number, _versions.c.content).where(
+                        _versions.c.prompt_id == prompt_id,
+                        _versions.c.content_encoding.is_(None)
+                    ).order_by(_versions.c.version_number)
+                ).all()
+                for row in rows:
+                    values = encode_content(connection, prompt_id, row.version_number, row.content, exclude_id=row.id)
+                    connection.execute(update(_versions).where(_versions.c.id == row.id).values(**values))
+                    report["versions"] += 1
+                    is_delta = values["content_encoding"] == ENCODING_DELTA
+                    report["deltas" if is_delta else "keyframes"] += 1
+                    report["bytes_before"] += len(row.content.encode("utf-8"))
+                    report["bytes_after"] += len(values["content_data"]) if is_delta else 0
+        logger.info(f"版本内容迁移进度: {min(start + prompts_per_batch, len(prompt_ids))}/{len(prompt_ids)} 个提示词")
+
+    # 关键帧写入内容块（可能与已有内容共享），按内容块的增量计入
+    report["bytes_after"] += blob_store.stored_bytes(engine) - blob_bytes
+    saved = report["bytes_before"] - report["bytes_after"]
+    report["bytes_saved"] = saved
+    report["ratio"] = round(report["bytes_after"] / report["bytes_before"], 4) if report["bytes_before"] else None
+    return report
+
+
+def cache_stats() -> Dict[str, Any]:
+    """还原缓存的命中统计"""
+    return _content_cache.stats()
@@ -0,0 +1,47 @@
+"""
+测试公共配置
+
+测试使用临时目录中的SQLite文件数据库（而非内存数据库），多个连接、线程和子进程可以共享同一个库。
+DATABASE_URL 须在导入 app 之前设置；子进程继承该环境变量，打开的是同一个数据库文件
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="promote-test-"), "test.db")
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from app.database import create_tables, engine
+
+    create_tables()
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def prompt_id(db):
+    """新建一个提示词，返回其ID"""
+    from app.models import prompt as models
+
+    prompt = models.Prompt(title="test", description="test")
+    db.add(prompt)
+    db.commit()
+    return prompt.id
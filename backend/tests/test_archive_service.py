@@ -0,0 +1,166 @@
+"""
+结果归档（services/archive_service.py）
+
+按保留数量归档：每轮只计算一次每个版本的截止ID，之后按版本分批取ID不超过截止值的结果；
+归档删除的结果ID不会分配给新结果
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, inspect, select, update
+from sqlalchemy.schema import CreateTable
+
+from app.database import Base
+from app.models import prompt as models
+from app.services import archive_service, prompt_service, result_ingest
+
+_results = models.OptimizationResult.__table__
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_service, "ARCHIVE_DIR", str(tmp_path))
+
+
+@pytest.fixture
+def version_ids(engine, db, prompt_id):
+    """三个版本，分别有 2、7、12 条结果，交错写入"""
+    version_ids = [prompt_service.create_version(db, prompt_id, {"content": f"content {index}"}).id
+                   for index in range(3)]
+    counts = dict(zip(version_ids, (2, 7, 12)))
+    rows = [
+        {"version_id": version_id, "test_input": f"input {index}", "output_text": f"output {version_id}-{index}"}
+        for index in range(max(counts.values()))
+        for version_id in version_ids if index < counts[version_id]
+    ]
+    with engine.begin() as connection:
+        result_ingest.insert_results(connection, rows)
+    return version_ids
+
+
+def _hot_ids(engine, version_id: int):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(_results.c.id).where(_results.c.version_id == version_id).order_by(_results.c.id)
+        ).scalars().all()
+
+
+def _archived_count(engine, version_id: int):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(models.ArchivedResult.__table__)
+            .where(models.ArchivedResult.__table__.c.version_id == version_id)
+        ).scalar()
+
+
+def test_keep_cutoffs_only_cover_versions_over_limit(engine, version_ids):
+    before = {version_id: _hot_ids(engine, version_id) for version_id in version_ids}
+    with engine.connect() as connection:
+        cutoffs = archive_service.keep_cutoffs(connection, 5)
+
+    # 测试共用一个数据库：只检查本组版本
+    assert version_ids[0] not in cutoffs
+    assert cutoffs[version_ids[1]] == before[version_ids[1]][-6]
+    assert cutoffs[version_ids[2]] == before[version_ids[2]][-6]
+
+
+def test_keep_leaves_newest_results_per_version(engine, version_ids, monkeypatch):
+    before = {version_id: _hot_ids(engine, version_id) for version_id in version_ids}
+    passes = []
+    keep_cutoffs = archive_service.keep_cutoffs
+
+    def counted(connection, keep):
+        passes.append(keep)
+        return keep_cutoffs(connection, keep)
+
+    monkeypatch.setattr(archive_service, "keep_cutoffs", counted)
+    report = archive_service.run_incremental(engine, days=0, keep=5, batch_size=3)
+
+    # 截止ID每轮只计算一次，各批次复用
+    assert passes == [5]
+    assert report["rows"] >= 2 + 7 and report["batches"] >= 3
+    for version_id in version_ids:
+        assert _hot_ids(engine, version_id) == before[version_id][-5:]
+        assert _archived_count(engine, version_id) == len(before[version_id][:-5])
+    with engine.connect() as connection:
+        archived = archive_service.read_archived(connection, version_ids[2])
+    assert [row["id"] for row in archived] == before[version_ids[2]][:-5]
+
+
+def test_single_batch_computes_its_own_cutoffs(engine, version_ids):
+    before = _hot_ids(engine, version_ids[2])
+    # 批次足够大：一批归档全部超出保留数量的结果（包括其他测试留下的版本）
+    archive_service.archive_batch(engine, days=0, keep=10, batch_size=10_000)
+
+    assert _hot_ids(engine, version_ids[2]) == before[-10:]
+    assert len(_hot_ids(engine, version_ids[1])) == 7
+    assert _archived_count(engine, version_ids[2]) == 2
+
+
+def test_days_and_keep_rules_combine(engine, version_ids):
+    oldest = _hot_ids(engine, version_ids[0])
+    with engine.begin() as connection:
+        connection.execute(
+            update(_results).where(_results.c.version_id == version_ids[0]).values(created_at=datetime(2000, 1, 1))
+        )
+
+    archive_service.run_incremental(engine, days=30, keep=10, batch_size=2)
+
+    assert _hot_ids(engine, version_ids[0]) == []
+    assert _archived_count(engine, version_ids[0]) == len(oldest)
+    assert len(_hot_ids(engine, version_ids[1])) == 7
+    assert len(_hot_ids(engine, version_ids[2])) == 10
+
+
+def test_archived_ids_are_not_reused(engine, version_ids):
+    """归档ID最大的结果后再写入新结果：新结果使用新ID，下一次归档不会主键冲突"""
+    version_id = version_ids[2]
+
+    def archive_all_of_version():
+        with engine.begin() as connection:
+            connection.execute(
+                update(_results).where(_results.c.version_id == version_id).values(created_at=datetime(2000, 1, 1))
+            )
+        return archive_service.run_incremental(engine, days=1, keep=0)
+
+    archived = _hot_ids(engine, version_id)
+    archive_all_of_version()
+    with engine.begin() as connection:
+        result_ingest.insert_results(connection, [
+            {"version_id": version_id, "test_input": None, "output_text": f"new {index}"} for index in range(2)
+        ])
+    fresh = _hot_ids(engine, version_id)
+    assert min(fresh) > max(archived)
+
+    archive_all_of_version()
+    assert _hot_ids(engine, version_id) == []
+    assert _archived_count(engine, version_id) == len(archived) + len(fresh)
+
+
+def test_legacy_results_table_is_rebuilt_with_autoincrement(tmp_path):
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(legacy)
+    create = str(CreateTable(_results).compile(dialect=legacy.dialect)).replace(" AUTOINCREMENT", "")
+    with legacy.begin() as connection:
+        connection.exec_driver_sql(f"DROP TABLE {_results.name}")
+        connection.exec_driver_sql(create)
+        for result_id in (1, 2, 3):
+            connection.execute(_results.insert().values(id=result_id, version_id=1, output_text=f"output {result_id}"))
+        # ID 3 是归档后被重用的ID，ID 4 已归档且不在热表中
+        connection.execute(models.ArchivedResult.__table__.insert(), [
+            {"id": result_id, "version_id": 1, "segment": "results-200001-001.arc", "frame_offset": 0,
+             "frame_length": 1}
+            for result_id in (3, 4)
+        ])
+
+    archive_service.ensure_result_autoincrement(legacy)
+    archive_service.ensure_result_autoincrement(legacy)
+
+    with legacy.begin() as connection:
+        rows = connection.execute(select(_results.c.id, _results.c.output_text).order_by(_results.c.id)).all()
+        assert [tuple(row) for row in rows] == [(1, "output 1"), (2, "output 2"), (5, "output 3")]
+        new_id = connection.execute(_results.insert().values(version_id=1, output_text="new")).inserted_primary_key[0]
+    assert new_id == 6
+    indexes = {index["name"] for index in inspect(legacy).get_indexes(_results.name)}
+    assert {index.name for index in _results.indexes} <= indexes
+    legacy.dispose()
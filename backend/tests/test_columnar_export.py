@@ -0,0 +1,83 @@
+"""
+结果的列式导出（services/columnar_export.py）
+
+导出的 Parquet / Arrow 文件可读回；生成器中途关闭（客户端断开）时释放数据库连接
+"""
+import contextlib
+import io
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq  # noqa: E402
+
+from app.services import columnar_export, prompt_service, result_ingest  # noqa: E402
+
+
+@pytest.fixture
+def version_id(engine, db, prompt_id):
+    version_id = prompt_service.create_version(db, prompt_id, {"content": "content"}).id
+    rows = [
+        {"version_id": version_id, "test_input": f"input {index % 3}", "output_text": f"output {index}",
+         "llm_provider": "openai", "execution_time": index / 10}
+        for index in range(25)
+    ]
+    with engine.begin() as connection:
+        result_ingest.insert_results(connection, rows)
+    return version_id
+
+
+class _TrackedConnections:
+    """记录打开和关闭的连接数"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.opened = 0
+        self.closed = 0
+
+    @contextlib.contextmanager
+    def __call__(self):
+        self.opened += 1
+        try:
+            with self.engine.connect() as connection:
+                yield connection
+        finally:
+            self.closed += 1
+
+
+def test_parquet_export_round_trips(engine, version_id):
+    connections = _TrackedConnections(engine)
+    body = b"".join(columnar_export.export_stream(
+        connections, columnar_export.FORMAT_PARQUET, ["id", "version_id", "test_input", "output_text"],
+        row_group_size=10, version_ids=[version_id]
+    ))
+
+    parquet = pq.ParquetFile(io.BytesIO(body))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.num_rows == 25
+    assert table.column("test_input").to_pylist()[:4] == ["input 0", "input 1", "input 2", "input 0"]
+    assert connections.opened == connections.closed == 1
+
+
+def test_arrow_export_round_trips(engine, version_id):
+    body = b"".join(columnar_export.export_stream(
+        engine.connect, columnar_export.FORMAT_ARROW, ["id", "output_text", "execution_time"],
+        row_group_size=10, version_ids=[version_id]
+    ))
+
+    reader = pa.ipc.open_file(pa.BufferReader(body))
+    assert reader.num_record_batches == 3
+    assert reader.read_all().column("output_text").to_pylist()[-1] == "output 24"
+
+
+def test_closing_stream_midway_releases_connection(engine, version_id):
+    connections = _TrackedConnections(engine)
+    stream = columnar_export.export_stream(
+        connections, columnar_export.FORMAT_PARQUET, row_group_size=5, version_ids=[version_id]
+    )
+    assert next(stream)
+    assert connections.closed == 0
+
+    stream.close()
+    assert connections.opened == connections.closed == 1
@@ -0,0 +1,96 @@
+"""
+响应压缩中间件（core/content_encoding.py）
+
+按 Accept-Encoding 协商编码；可压缩的响应无论是否实际压缩都带 Vary: Accept-Encoding
+"""
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core import content_encoding
+
+SMALL = b'{"ok":true}'
+LARGE = b'{"items":[' + b",".join(b'"item %d"' % index for index in range(500)) + b"]}"
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.add_middleware(content_encoding.CompressionMiddleware)
+
+    @app.get("/small")
+    def small():
+        return Response(SMALL, media_type="application/json")
+
+    @app.get("/large")
+    def large():
+        return Response(LARGE, media_type="application/json", headers={"ETag": '"abc"'})
+
+    @app.get("/binary")
+    def binary():
+        return Response(LARGE, media_type="application/octet-stream")
+
+    @app.get("/not-modified")
+    def not_modified():
+        return Response(status_code=304, headers={"ETag": '"abc"'})
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b'{"line":%d}\n' % index for index in range(200)), media_type="application/x-ndjson")
+
+    return TestClient(app)
+
+
+def _get(client, path, accept_encoding):
+    # TestClient（httpx）按 Content-Encoding 自动解压，response.content 是解压后的内容
+    return client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity", ""])
+def test_small_response_varies_on_accept_encoding(client, accept_encoding):
+    response = _get(client, "/small", accept_encoding)
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == SMALL
+
+
+def test_large_response_is_compressed_with_single_vary(client):
+    response = _get(client, "/large", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert response.content == LARGE
+
+
+def test_brotli_preferred_when_available(client):
+    if "br" not in content_encoding.available_encodings():
+        pytest.skip("brotli 未安装")
+    response = _get(client, "/large", "gzip, br")
+    assert response.headers["content-encoding"] == "br"
+
+
+def test_incompressible_response_is_untouched(client):
+    response = _get(client, "/binary", "gzip")
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+
+
+def test_not_modified_carries_vary(client):
+    response = _get(client, "/not-modified", "gzip")
+    assert response.status_code == 304
+    assert response.headers["vary"] == "Accept-Encoding"
+
+
+def test_streaming_response_is_compressed_incrementally(client):
+    response = _get(client, "/stream", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text.count("\n") == 200
+
+
+def test_negotiate_respects_q_values():
+    assert content_encoding.negotiate("gzip;q=1, br;q=0.5", ["br", "gzip"]) == "gzip"
+    assert content_encoding.negotiate("br, gzip", ["br", "gzip"]) == "br"
+    assert content_encoding.negotiate("identity", ["br", "gzip"]) is None
+    assert content_encoding.negotiate("*;q=0.1", ["gzip"]) == "gzip"
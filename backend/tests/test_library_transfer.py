@@ -0,0 +1,103 @@
+"""
+提示词库导入导出（services/library_transfer.py）
+
+导出后导入：同一文件中内容相同的版本各自导入、不相互合并；重复导入时按 (提示词, 版本号, 内容) 识别已存在的版本
+"""
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.models import prompt as models
+from app.services import library_transfer, prompt_service, result_ingest
+
+
+@pytest.fixture
+def library(engine, db, prompt_id):
+    """一个提示词：v1="A"、v2="B"、v3="A"，每个版本一条结果"""
+    # 提示词按 标题 + 创建时间（秒）去重：使用唯一的标题，避免与同一秒创建的其他测试数据匹配
+    db.get(models.Prompt, prompt_id).title = f"library {prompt_id}"
+    db.commit()
+    version_ids = [prompt_service.create_version(db, prompt_id, {"content": content}).id for content in "ABA"]
+    with engine.begin() as connection:
+        result_ingest.insert_results(connection, [
+            {"version_id": version_id, "test_input": f"input {number}", "output_text": f"output v{number}"}
+            for number, version_id in enumerate(version_ids, 1)
+        ])
+    return prompt_id
+
+
+def _export(prompt_id: int):
+    """导出全库后只保留该提示词及其版本和结果的记录（测试共用一个数据库）"""
+    records = [json.loads(line) for text in library_transfer.export_lines(include_templates=False)
+               for line in text.splitlines()]
+    version_ids = {r["id"] for r in records if r["type"] == "version" and r["prompt_id"] == prompt_id}
+    return [
+        json.dumps(r).encode() for r in records
+        if r["type"] == "header"
+        or (r["type"] == "prompt" and r["id"] == prompt_id)
+        or (r["type"] == "version" and r["id"] in version_ids)
+        or (r["type"] == "result" and r["version_id"] in version_ids)
+    ]
+
+
+def _versions(db, prompt_id: int):
+    """[(版本号, 内容, 结果输出)]"""
+    db.expire_all()
+    versions = db.query(models.PromptVersion).filter(models.PromptVersion.prompt_id == prompt_id).order_by(
+        models.PromptVersion.version_number
+    ).all()
+    table = models.OptimizationResult.__table__
+    return [
+        (v.version_number, v.content, sorted(db.execute(
+            select(table.c.output_text).where(table.c.version_id == v.id)
+        ).scalars()))
+        for v in versions
+    ]
+
+
+def _imported_prompt_id(db, source_prompt_id: int) -> int:
+    return db.execute(
+        select(models.Prompt.id).where(models.Prompt.title == f"library {source_prompt_id}")
+    ).scalar_one()
+
+
+def test_fresh_import_keeps_versions_with_repeated_content(db, library):
+    lines = _export(library)
+    # 改名后原提示词不再匹配，导入时新建提示词及其全部版本
+    db.get(models.Prompt, library).title = "renamed"
+    db.commit()
+
+    report = library_transfer.import_lines(lines, chunk_size=2)
+
+    assert report["error_count"] == 0
+    assert report["created"]["version"] == 3 and report["skipped"]["version"] == 0
+    assert report["created"]["result"] == 3
+    imported = _imported_prompt_id(db, library)
+    assert _versions(db, imported) == [(1, "A", ["output v1"]), (2, "B", ["output v2"]), (3, "A", ["output v3"])]
+
+
+def test_reimport_skips_existing_versions_and_results(db, library):
+    before = _versions(db, library)
+    report = library_transfer.import_lines(_export(library))
+
+    assert report["error_count"] == 0
+    assert report["created"] == {"template": 0, "prompt": 0, "version": 0, "result": 0}
+    assert report["skipped"]["version"] == 3 and report["skipped"]["result"] == 3
+    assert _versions(db, library) == before
+
+
+def test_changed_version_with_same_number_is_appended(db, library):
+    # 文件中 v2 的内容与库中的 v2 不同：追加为新版本，其结果跟随新版本
+    lines = [
+        line.replace(b'"content": "B"', b'"content": "B edited"') if b'"type": "version"' in line else line
+        for line in _export(library)
+    ]
+
+    report = library_transfer.import_lines(lines)
+
+    assert report["created"]["version"] == 1 and report["skipped"]["version"] == 2
+    assert report["created"]["result"] == 1 and report["skipped"]["result"] == 2
+    versions = _versions(db, library)
+    assert [(number, content) for number, content, _ in versions] == [(1, "A"), (2, "B"), (3, "A"), (4, "B edited")]
+    assert versions[3][2] == ["output v2"]
@@ -0,0 +1,126 @@
+"""
+结果写入队列（services/result_writer.py）
+
+整组提交失败时逐条重试、未预料的异常不终止写线程、等待超时、关闭时写完队列中剩余的结果
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import prompt as models
+from app.services import analytics_service, prompt_service, result_ingest, result_writer
+
+
+@pytest.fixture
+def version_id(db, prompt_id):
+    return prompt_service.create_version(db, prompt_id, {"content": "content"}).id
+
+
+@pytest.fixture
+def writer(engine):
+    writer = result_writer.ResultWriter(engine, max_delay_ms=50)
+    yield writer
+    writer.stop(timeout=5)
+
+
+def _row(version_id: int, output_text: str = "ok"):
+    return {"version_id": version_id, "test_input": None, "output_text": output_text}
+
+
+def _stored_outputs(db, version_id: int):
+    return sorted(db.execute(
+        select(models.OptimizationResult.output_text).where(models.OptimizationResult.version_id == version_id)
+    ).scalars())
+
+
+def _enqueue(writer, rows):
+    """写线程启动前放入队列，保证这些结果被取到同一组"""
+    return [writer.submit_nowait(row) for row in rows]
+
+
+def test_group_failure_falls_back_to_single_writes(db, version_id, writer, monkeypatch):
+    insert_results = result_ingest.insert_results
+
+    def reject_bad(connection, rows):
+        if any(row["output_text"] == "bad" for row in rows):
+            raise ValueError("bad row")
+        return insert_results(connection, rows)
+
+    monkeypatch.setattr(result_ingest, "insert_results", reject_bad)
+    futures = _enqueue(writer, [_row(version_id, "a"), _row(version_id, "bad"), _row(version_id, "b")])
+    writer.start()
+
+    assert futures[0].result(5)["id"]
+    assert futures[2].result(5)["id"]
+    with pytest.raises(ValueError):
+        futures[1].result(5)
+    assert _stored_outputs(db, version_id) == ["a", "b"]
+    assert writer.running
+
+
+def test_missing_version_fails_only_its_entry(db, version_id, writer):
+    futures = _enqueue(writer, [_row(version_id, "a"), _row(10 ** 9, "orphan")])
+    writer.start()
+
+    assert futures[0].result(5)["version_id"] == version_id
+    with pytest.raises(result_writer.VersionNotFoundError):
+        futures[1].result(5)
+
+
+def test_unexpected_error_fails_group_and_keeps_writer_running(db, version_id, writer, monkeypatch):
+    def broken(group):
+        raise RuntimeError("unexpected")
+
+    monkeypatch.setattr(writer, "_write", broken)
+    futures = _enqueue(writer, [_row(version_id, "a"), _row(version_id, "b")])
+    writer.start()
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result(5)
+
+    monkeypatch.undo()
+    assert writer.running
+    assert writer.submit_nowait(_row(version_id, "c")).result(5)["id"]
+    assert _stored_outputs(db, version_id) == ["c"]
+
+
+def test_analytics_failure_does_not_block_results(db, version_id, writer, monkeypatch):
+    def broken(rows):
+        raise RuntimeError("analytics down")
+
+    monkeypatch.setattr(analytics_service, "record_results", broken)
+    writer.start()
+    assert writer.submit_nowait(_row(version_id)).result(5)["id"]
+    assert writer.running
+
+
+def test_submit_times_out_when_writer_is_stalled(version_id, writer):
+    # 写线程未启动：结果一直留在队列中
+    with pytest.raises(result_writer.WriterTimeoutError):
+        asyncio.run(writer.submit(_row(version_id), timeout=0.1))
+
+
+def test_submit_returns_committed_row(version_id, writer):
+    writer.start()
+    row = asyncio.run(writer.submit(_row(version_id, "async")))
+    assert row["id"] and row["created_at"] is not None
+
+
+def test_stop_drains_results_queued_after_stop_signal(db, engine, version_id):
+    writer = result_writer.ResultWriter(engine, max_batch=3, max_delay_ms=0)
+    before = _enqueue(writer, [_row(version_id, f"before {index}") for index in range(4)])
+    # 停止信号之后到达的结果同样写入
+    writer._queue.put(result_writer._STOP)
+    after = _enqueue(writer, [_row(version_id, f"after {index}") for index in range(5)])
+    writer.start()
+    writer._thread.join(5)
+
+    assert not writer.running
+    assert all(future.result(0)["id"] for future in before + after)
+    count = db.execute(
+        select(func.count()).select_from(models.OptimizationResult).where(
+            models.OptimizationResult.version_id == version_id
+        )
+    ).scalar()
+    assert count == 9
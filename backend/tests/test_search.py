@@ -0,0 +1,91 @@
+"""
+全文搜索（services/search_service.py）
+
+按 (rank, rowid) 键集分页：逐页取完不重复、不遗漏；scope=all 时提示词命中在前、版本命中在后
+"""
+import itertools
+from typing import List, NamedTuple
+
+import pytest
+
+from app.models import prompt as models
+from app.services import prompt_service, search_service
+
+# 测试共用一个数据库，每组数据使用不同的搜索词
+_words = (f"kestrel{index}" for index in itertools.count())
+
+
+class Corpus(NamedTuple):
+    word: str
+    prompt_ids: List[int]
+    version_ids: List[int]
+
+
+@pytest.fixture
+def corpus(db):
+    """标题中出现次数不同的提示词（相关性各不相同），每个提示词两个版本"""
+    word = next(_words)
+    prompt_ids, version_ids = [], []
+    for index in range(7):
+        prompt = models.Prompt(title=" ".join([word] * (index % 3 + 1)) + f" prompt {index}",
+                               description="search test")
+        db.add(prompt)
+        db.commit()
+        prompt_ids.append(prompt.id)
+        for number in range(2):
+            version = prompt_service.create_version(
+                db, prompt.id, {"content": f"{word} content {index}-{number} " + "filler " * number}
+            )
+            version_ids.append(version.id)
+    return Corpus(word, prompt_ids, version_ids)
+
+
+def _all_pages(db, corpus: Corpus, scope: str, limit: int):
+    pages, after = [], None
+    while True:
+        hits, after = search_service.search(db, corpus.word, scope, limit, after)
+        pages.append(hits)
+        if after is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 20])
+def test_pages_cover_all_hits_once(db, corpus, limit):
+    hits = [hit for page in _all_pages(db, corpus, "all", limit) for hit in page]
+
+    keys = [(hit["type"], hit["id"]) for hit in hits]
+    assert len(keys) == len(set(keys))
+    assert sorted(hit["id"] for hit in hits if hit["type"] == "prompt") == sorted(corpus.prompt_ids)
+    assert sorted(hit["id"] for hit in hits if hit["type"] == "version") == sorted(corpus.version_ids)
+
+
+def test_prompt_hits_precede_version_hits_and_keep_relevance_order(db, corpus):
+    hits = [hit for page in _all_pages(db, corpus, "all", 4) for hit in page]
+
+    types = [hit["type"] for hit in hits]
+    assert types == sorted(types, key=lambda kind: kind != "prompt")
+    for kind in ("prompt", "version"):
+        scores = [hit["score"] for hit in hits if hit["type"] == kind]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_scoped_search_returns_only_that_type(db, corpus):
+    hits = [hit for page in _all_pages(db, corpus, "versions", 5) for hit in page]
+    assert {hit["type"] for hit in hits} == {"version"}
+    assert all("<mark>" in hit["snippet"] for hit in hits)
+
+
+def test_page_boundary_between_indexes(db, corpus):
+    # 第一页恰好取完全部提示词命中：下一页从版本命中开始
+    hits, after = search_service.search(db, corpus.word, "all", len(corpus.prompt_ids))
+    assert {hit["type"] for hit in hits} == {"prompt"}
+    assert after is not None and after[0] == "prompts"
+
+    hits, _ = search_service.search(db, corpus.word, "all", 1, after)
+    assert hits[0]["type"] == "version"
+
+
+def test_cursor_from_other_scope_is_rejected(db, corpus):
+    _, after = search_service.search(db, corpus.word, "versions", 1)
+    with pytest.raises(ValueError):
+        search_service.search(db, corpus.word, "prompts", 1, after)
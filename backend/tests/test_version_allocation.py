@@ -0,0 +1,115 @@
+"""
+并发创建版本时的版本号分配（services/prompt_service.py）
+
+多个线程 / 进程同时为同一个提示词创建版本：版本号须唯一且连续（1..N），
+版本号冲突（IntegrityError）和数据库锁时回滚重试
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.database import SessionLocal
+from app.models import prompt as models
+from app.services import prompt_service
+
+WORKERS = 8
+VERSIONS_PER_WORKER = 10
+
+
+def _create_versions(prompt_id: int, count: int, barrier=None):
+    """在独立的会话中连续创建 count 个版本，返回分配到的版本号"""
+    if barrier is not None:
+        barrier.wait()
+    numbers = []
+    with SessionLocal() as session:
+        for index in range(count):
+            version = prompt_service.create_version(session, prompt_id, {"content": f"content {index}"})
+            numbers.append(version.version_number)
+    return numbers
+
+
+def _stored_numbers(db, prompt_id: int):
+    return sorted(db.execute(
+        select(models.PromptVersion.version_number).where(models.PromptVersion.prompt_id == prompt_id)
+    ).scalars())
+
+
+def test_concurrent_threads_allocate_unique_contiguous_numbers(db, prompt_id):
+    barrier = threading.Barrier(WORKERS)
+    with ThreadPoolExecutor(WORKERS) as pool:
+        results = list(pool.map(
+            lambda _: _create_versions(prompt_id, VERSIONS_PER_WORKER, barrier), range(WORKERS)
+        ))
+
+    total = WORKERS * VERSIONS_PER_WORKER
+    returned = sorted(number for numbers in results for number in numbers)
+    assert returned == list(range(1, total + 1))
+    assert _stored_numbers(db, prompt_id) == returned
+    # 每个工作线程内的版本号递增
+    assert all(numbers == sorted(numbers) for numbers in results)
+
+
+def test_concurrent_processes_allocate_unique_contiguous_numbers(db, prompt_id):
+    # spawn：子进程重新导入 app，通过继承的 DATABASE_URL 打开同一个数据库文件
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(WORKERS // 2) as pool:
+        results = pool.starmap(_create_versions, [(prompt_id, VERSIONS_PER_WORKER)] * (WORKERS // 2))
+
+    total = WORKERS // 2 * VERSIONS_PER_WORKER
+    returned = sorted(number for numbers in results for number in numbers)
+    assert returned == list(range(1, total + 1))
+    assert _stored_numbers(db, prompt_id) == returned
+
+
+def test_conflicting_version_number_is_retried(db, prompt_id, monkeypatch):
+    """每个线程的首次分配都返回已被占用的版本号：唯一约束冲突后回滚重试，最终仍然唯一且连续"""
+    _create_versions(prompt_id, 1)
+
+    allocate = prompt_service.allocate_version_number
+    local = threading.local()
+    conflicts = []
+    lock = threading.Lock()
+
+    def allocate_stale_first(connection, target_prompt_id):
+        if not getattr(local, "conflicted", False):
+            local.conflicted = True
+            with lock:
+                conflicts.append(threading.get_ident())
+            return 1
+        return allocate(connection, target_prompt_id)
+
+    monkeypatch.setattr(prompt_service, "allocate_version_number", allocate_stale_first)
+    barrier = threading.Barrier(WORKERS)
+    with ThreadPoolExecutor(WORKERS) as pool:
+        results = list(pool.map(lambda _: _create_versions(prompt_id, 3, barrier), range(WORKERS)))
+
+    assert len(conflicts) == WORKERS
+    returned = sorted(number for numbers in results for number in numbers)
+    assert returned == list(range(2, WORKERS * 3 + 2))
+    assert _stored_numbers(db, prompt_id) == list(range(1, WORKERS * 3 + 2))
+
+
+def test_conflict_retries_are_bounded(db, prompt_id, monkeypatch):
+    """一直冲突时重试 VERSION_CREATE_ATTEMPTS 次后抛出 IntegrityError，不留下半成品"""
+    _create_versions(prompt_id, 1)
+    calls = []
+
+    def always_stale(connection, target_prompt_id):
+        calls.append(target_prompt_id)
+        return 1
+
+    monkeypatch.setattr(prompt_service, "allocate_version_number", always_stale)
+    monkeypatch.setattr(prompt_service.time, "sleep", lambda seconds: None)
+    with pytest.raises(IntegrityError):
+        prompt_service.create_version(db, prompt_id, {"content": "duplicate"})
+
+    assert len(calls) == prompt_service.VERSION_CREATE_ATTEMPTS
+    assert _stored_numbers(db, prompt_id) == [1]
+
+
+def test_missing_prompt_returns_none(db):
+    assert prompt_service.create_version(db, 10 ** 9, {"content": "orphan"}) is None
@@ -29,14 +29,15 @@ import {
 } from '@chakra-ui/react'
 import { StarIcon, RepeatIcon, CopyIcon } from '@chakra-ui/icons'
 import { 
-  Prompt, 
   PromptVersion, 
   ProvidersResponse,
   LLMRequest,
   LLMResponse,
   promptApi,
-  llmApi
+  llmApi,
+  PROMPT_CATEGORIES
 } from '../../services/api'
+import { usePromptPages } from '../../hooks/usePromptPages'
 import QuickTemplates from './QuickTemplates'
 import PromptQualityAnalyzer from './PromptQualityAnalyzer'
 
@@ -52,7 +53,7 @@ interface TestResult {
 }
 
 function PromptOptimizer() {
-  const [prompts, setPrompts] = useState<Prompt[]>([])
+  const [promptCategory, setPromptCategory] = useState('')
   const [selectedPrompt, setSelectedPrompt] = useState<number | null>(null)
   const [currentVersion, setCurrentVersion] = useState<PromptVersion | null>(null)
   const [promptContent, setPromptContent] = useState('')
@@ -69,6 +70,17 @@ function PromptOptimizer() {
   
   const toast = useToast()
 
+  // 项目下拉框按页加载，按分类在服务端筛选
+  const { prompts, hasMore, loadingMore, loadMore } = usePromptPages(
+    { category: promptCategory },
+    () => toast({
+      title: '加载失败',
+      status: 'error',
+      duration: 3000,
+      isClosable: true,
+    })
+  )
+
   // 获取提供商显示名称
   const getProviderDisplayName = (provider: string) => {
     switch (provider) {
@@ -82,7 +94,6 @@ function PromptOptimizer() {
   }
 
   useEffect(() => {
-    loadPrompts()
     loadProviders()
   }, [])
 
@@ -95,20 +106,6 @@ function PromptOptimizer() {
     }
   }, [selectedProvider, providers])
 
-  const loadPrompts = async () => {
-    try {
-      const data = await promptApi.getPrompts()
-      setPrompts(data)
-    } catch (error) {
-      toast({
-        title: '加载失败',
-        status: 'error',
-        duration: 3000,
-        isClosable: true,
-      })
-    }
-  }
-
   const loadProviders = async () => {
     try {
       const data = await llmApi.getProviders()
@@ -290,17 +287,36 @@ function PromptOptimizer() {
             <VStack spacing={4} align="stretch">
               <FormControl>
                 <FormLabel>选择提示词项目</FormLabel>
-                <Select
-                  placeholder="选择一个项目"
-                  value={selectedPrompt || ''}
-                  onChange={(e) => handlePromptSelect(Number(e.target.value))}
-                >
-                  {prompts.map((prompt) => (
-                    <option key={prompt.id} value={prompt.id}>
-                      {prompt.title}
-                    </option>
-                  ))}
-                </Select>
+                <HStack>
+                  <Select
+                    placeholder="全部分类"
+                    value={promptCategory}
+                    onChange={(e) => setPromptCategory(e.target.value)}
+                    maxW="140px"
+                  >
+                    {PROMPT_CATEGORIES.map((option) => (
+                      <option key={option.value} value={option.value}>
+                        {option.label}
+                      </option>
+                    ))}
+                  </Select>
+                  <Select
+                    placeholder="选择一个项目"
+                    value={selectedPrompt || ''}
+                    onChange={(e) => handlePromptSelect(Number(e.target.value))}
+                  >
+                    {prompts.map((prompt) => (
+                      <option key={prompt.id} value={prompt.id}>
+                        {prompt.title}
+                      </option>
+                    ))}
+                  </Select>
+                </HStack>
+                {hasMore && (
+                  <Button size="xs" variant="link" mt={1} onClick={loadMore} isLoading={loadingMore}>
+                    加载更多项目
+                  </Button>
+                )}
               </FormControl>
 
               {currentVersion && (
@@ -25,38 +25,38 @@ import {
   useDisclosure,
   Spinner,
   Badge,
+  Select,
 } from '@chakra-ui/react'
 import { AddIcon, EditIcon, DeleteIcon } from '@chakra-ui/icons'
-import { promptApi, Prompt, PromptCreate } from '../../services/api'
+import { promptApi, tagApi, PromptCreate, TagFacet, PROMPT_CATEGORIES } from '../../services/api'
+import { usePromptPages } from '../../hooks/usePromptPages'
 
 function PromptList() {
-  const [prompts, setPrompts] = useState<Prompt[]>([])
-  const [loading, setLoading] = useState(true)
+  const [category, setCategory] = useState('')
+  const [tag, setTag] = useState('')
+  const [tagFacets, setTagFacets] = useState<TagFacet[]>([])
   const [newPrompt, setNewPrompt] = useState<PromptCreate>({ title: '', description: '' })
   const { isOpen, onOpen, onClose } = useDisclosure()
   const toast = useToast()
 
-  useEffect(() => {
-    loadPrompts()
-  }, [])
+  // 列表按页加载，筛选在服务端进行
+  const { prompts, setPrompts, hasMore, loading, loadingMore, loadMore, reload } = usePromptPages(
+    { category, tag },
+    () => toast({
+      title: '加载失败',
+      description: '无法加载提示词列表',
+      status: 'error',
+      duration: 3000,
+      isClosable: true,
+    })
+  )
 
-  const loadPrompts = async () => {
-    try {
-      setLoading(true)
-      const data = await promptApi.getPrompts()
-      setPrompts(data)
-    } catch (error) {
-      toast({
-        title: '加载失败',
-        description: '无法加载提示词列表',
-        status: 'error',
-        duration: 3000,
-        isClosable: true,
-      })
-    } finally {
-      setLoading(false)
-    }
-  }
+  useEffect(() => {
+    // 标签筛选项：当前分类下最常用的标签
+    tagApi.getTagFacets({ category: category || undefined, limit: 50 })
+      .then(setTagFacets)
+      .catch(() => setTagFacets([]))
+  }, [category])
 
   const handleCreatePrompt = async () => {
     if (!newPrompt.title.trim()) {
@@ -71,7 +71,12 @@ function PromptList() {
 
     try {
       const created = await promptApi.createPrompt(newPrompt)
-      setPrompts([...prompts, created])
+      if (category || tag) {
+        // 新项目不一定符合当前筛选条件，重新加载第一页
+        reload()
+      } else {
+        setPrompts((previous) => [created, ...previous])
+      }
       setNewPrompt({ title: '', description: '' })
       onClose()
       toast({
@@ -95,7 +100,7 @@ function PromptList() {
 
     try {
       await promptApi.deletePrompt(id)
-      setPrompts(prompts.filter(p => p.id !== id))
+      setPrompts((previous) => previous.filter(p => p.id !== id))
       toast({
         title: '删除成功',
         status: 'success',
@@ -112,14 +117,6 @@ function PromptList() {
     }
   }
 
-  if (loading) {
-    return (
-      <Box textAlign="center" py={10}>
-        <Spinner size="xl" color="blue.500" />
-      </Box>
-    )
-  }
-
   return (
     <Box>
       <HStack justify="space-between" mb={6}>
@@ -129,11 +126,47 @@ function PromptList() {
         </Button>
       </HStack>
 
+      <HStack spacing={4} mb={4}>
+        <Select
+          placeholder="全部分类"
+          value={category}
+          onChange={(e) => {
+            setCategory(e.target.value)
+            setTag('')
+          }}
+          maxW="200px"
+        >
+          {PROMPT_CATEGORIES.map((option) => (
+            <option key={option.value} value={option.value}>
+              {option.label}
+            </option>
+          ))}
+        </Select>
+        <Select
+          placeholder="全部标签"
+          value={tag}
+          onChange={(e) => setTag(e.target.value)}
+          maxW="200px"
+        >
+          {tagFacets.map((facet) => (
+            <option key={facet.tag} value={facet.tag}>
+              {facet.tag} ({facet.count})
+            </option>
+          ))}
+        </Select>
+      </HStack>
+
       <VStack spacing={4} align="stretch">
-        {prompts.length === 0 ? (
+        {loading ? (
+          <Box textAlign="center" py={10}>
+            <Spinner size="xl" color="blue.500" />
+          </Box>
+        ) : prompts.length === 0 ? (
           <Card>
             <CardBody textAlign="center" py={10}>
-              <Text color="gray.500">还没有任何提示词项目，点击"新建项目"创建第一个吧！</Text>
+              <Text color="gray.500">
+                {category || tag ? '没有符合筛选条件的提示词项目' : '还没有任何提示词项目，点击"新建项目"创建第一个吧！'}
+              </Text>
             </CardBody>
           </Card>
         ) : (
@@ -173,6 +206,11 @@ function PromptList() {
             </Card>
           ))
         )}
+        {!loading && hasMore && (
+          <Button variant="outline" onClick={loadMore} isLoading={loadingMore}>
+            加载更多
+          </Button>
+        )}
       </VStack>
 
       {/* 创建新提示词的模态框 */}
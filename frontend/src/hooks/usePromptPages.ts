@@ -0,0 +1,77 @@
+import { useCallback, useEffect, useRef, useState } from 'react'
+import { promptApi, Prompt } from '../services/api'
+
+// 提示词列表每页条数
+export const PROMPT_PAGE_SIZE = 20
+
+export interface PromptPageFilters {
+  category?: string;
+  tag?: string;
+}
+
+// 按页加载提示词（服务端筛选、键集分页）：筛选条件变化时重新加载第一页，loadMore 按游标追加下一页
+export function usePromptPages(filters: PromptPageFilters = {}, onError?: (error: unknown) => void) {
+  const { category, tag } = filters
+  const [prompts, setPrompts] = useState<Prompt[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
+  // 筛选条件变化后递增，丢弃旧条件下仍在进行的请求的结果
+  const generation = useRef(0)
+  const onErrorRef = useRef(onError)
+  onErrorRef.current = onError
+
+  const fetchPage = useCallback(async (cursor?: string) => {
+    return promptApi.listPrompts({
+      limit: PROMPT_PAGE_SIZE,
+      cursor,
+      category: category || undefined,
+      tags: tag ? [tag] : undefined,
+    })
+  }, [category, tag])
+
+  const reload = useCallback(async () => {
+    const current = ++generation.current
+    setLoading(true)
+    try {
+      const page = await fetchPage()
+      if (current !== generation.current) return
+      setPrompts(page.items)
+      setNextCursor(page.next_cursor ?? null)
+    } catch (error) {
+      if (current === generation.current) onErrorRef.current?.(error)
+    } finally {
+      if (current === generation.current) setLoading(false)
+    }
+  }, [fetchPage])
+
+  useEffect(() => {
+    reload()
+  }, [reload])
+
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return
+    const current = generation.current
+    setLoadingMore(true)
+    try {
+      const page = await fetchPage(nextCursor)
+      if (current !== generation.current) return
+      setPrompts((previous) => [...previous, ...page.items])
+      setNextCursor(page.next_cursor ?? null)
+    } catch (error) {
+      onErrorRef.current?.(error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  return {
+    prompts,
+    setPrompts,
+    hasMore: nextCursor !== null,
+    loading,
+    loadingMore,
+    loadMore,
+    reload,
+  }
+}
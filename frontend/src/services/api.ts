@@ -36,6 +36,28 @@ api.interceptors.response.use(
   }
 );
 
+// 幂等写请求：同一次操作的所有尝试携带相同的 Idempotency-Key，
+// 超时或连接中断后重试时服务端返回首次执行的结果，不会重复调用模型或写入结果
+const newIdempotencyKey = (): string =>
+  typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function'
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
+async function postIdempotent<T>(url: string, data: unknown, retries = 2): Promise<AxiosResponse<T>> {
+  const headers = { 'Idempotency-Key': newIdempotencyKey() };
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await api.post<T>(url, data, { headers });
+    } catch (error) {
+      // 只重试没有收到响应（超时、网络错误）或原请求仍在执行（409）的情况
+      const status = (error as AxiosError).response?.status;
+      if (attempt >= retries || (status !== undefined && status !== 409)) {
+        throw error;
+      }
+    }
+  }
+}
+
 // TypeScript接口定义 - 基于后端Pydantic模式
 export interface LLMConfig {
   provider: 'openai' | 'anthropic' | 'google' | 'google_custom' | 'custom';
@@ -181,6 +203,180 @@ export interface OptimizationResultCreate {
   llm_model?: string;
 }
 
+export interface BulkResultItem extends OptimizationResultCreate {
+  version_id: number;
+}
+
+export interface BulkResultStatus {
+  index: number;
+  status: 'created' | 'error';
+  id?: number;
+  version_id?: number;
+  errors?: string[];
+}
+
+export interface BulkResultResponse {
+  total: number;
+  created: number;
+  failed: number;
+  items: BulkResultStatus[];
+}
+
+export interface PaginatedResponse<T> {
+  items: T[];
+  total?: number | null;
+  page: number;
+  size: number;
+  pages?: number | null;
+  next_cursor?: string | null;
+}
+
+export interface PromptListParams {
+  limit?: number;
+  cursor?: string;
+  category?: string;
+  framework_type?: string;
+  is_template?: boolean;
+  tags?: string[];
+  tag_mode?: 'all' | 'any';
+  sort?: 'updated_desc' | 'updated_asc' | 'created_desc' | 'created_asc' | 'title_asc' | 'title_desc';
+  with_total?: boolean;
+}
+
+// 提示词分类（与后端 PromptCategory 一致）
+export const PROMPT_CATEGORIES: Array<{ value: string; label: string }> = [
+  { value: 'code_generation', label: '代码生成' },
+  { value: 'content_creation', label: '内容创作' },
+  { value: 'data_analysis', label: '数据分析' },
+  { value: 'reasoning', label: '推理' },
+  { value: 'translation', label: '翻译' },
+  { value: 'summarization', label: '摘要' },
+  { value: 'question_answering', label: '问答' },
+  { value: 'other', label: '其他' },
+];
+
+export interface ResultListParams {
+  limit?: number;
+  cursor?: string;
+  order?: 'asc' | 'desc';
+  fields?: string;
+  provider?: string;
+  model?: string;
+  is_error?: boolean;
+  rating?: number;
+  min_rating?: number;
+  created_after?: string;
+  created_before?: string;
+  test_input?: string;
+}
+
+export interface VersionStats {
+  version_id: number;
+  total_results: number;
+  error_count: number;
+  success_rate: number;
+  average_rating: number | null;
+  rating_count: number;
+  average_execution_time: number | null;
+  execution_time_percentiles: Record<'p50' | 'p90' | 'p95' | 'p99', number> | null;
+  input_tokens_used: number | null;
+  output_tokens_used: number | null;
+  total_tokens_used: number | null;
+  total_cost: number | null;
+  updated_at: string | null;
+}
+
+export interface ArchiveSummary {
+  version_id: number;
+  result_count: number;
+  error_count: number;
+  success_rate: number;
+  average_execution_time: number | null;
+  average_rating: number | null;
+  input_tokens: number;
+  output_tokens: number;
+  total_tokens: number;
+  total_cost: number;
+  first_created_at: string | null;
+  last_created_at: string | null;
+}
+
+export interface TagFacet {
+  tag: string;
+  count: number;
+}
+
+export interface UsagePoint {
+  bucket_start: string;
+  requests: number;
+  errors: number;
+  input_tokens: number;
+  output_tokens: number;
+  total_tokens: number;
+  cost: number;
+  avg_latency: number | null;
+  p50_latency: number | null;
+  p95_latency: number | null;
+  p99_latency: number | null;
+}
+
+export interface UsageSeries {
+  source?: string | null;
+  provider?: string | null;
+  model?: string | null;
+  points: UsagePoint[];
+}
+
+export interface UsageQueryParams {
+  granularity?: 'minute' | 'hour' | 'day';
+  start?: string;
+  end?: string;
+  provider?: string;
+  model?: string;
+  source?: 'generate' | 'result';
+  group_by?: 'none' | 'source' | 'provider' | 'model';
+}
+
+// 按ID批量获取的响应：items 以ID为键（按 fields 裁剪），missing 为不存在的ID
+export interface BatchResponse<T> {
+  items: Record<number, T>;
+  missing: number[];
+}
+
+// 提示词模板（服务端渲染，变量写作 {{name}}）
+export interface PromptTemplate {
+  id: number;
+  name: string;
+  description: string;
+  category: string;
+  complexity: string;
+  framework_type?: string | null;
+  template_content: string;
+  variables?: Record<string, string>;
+  example_use_case?: string | null;
+  best_practices?: string[];
+  usage_count: number;
+  average_rating?: number | null;
+  is_official: boolean;
+  created_at: string;
+  updated_at: string;
+}
+
+export interface TemplateValidation {
+  valid: boolean;
+  variables: string[];
+  undeclared: string[];
+  unused: string[];
+  invalid: string[];
+}
+
+export interface TemplateBatchRender {
+  template_id: number;
+  items: Array<string | null>;
+  errors: Record<number, string>;
+  rendered: number;
+}
+
 export interface PromptWithVersions extends Prompt {
   versions: PromptVersion[];
 }
@@ -191,9 +387,12 @@ export interface VersionWithResults extends PromptVersion {
 
 // API客户端类 - 模块化设计
 export class PromptAPI {
-  // 获取所有提示词
-  static async getPrompts(skip = 0, limit = 100): Promise<Prompt[]> {
-    const response = await api.get('/prompts', { params: { skip, limit } });
+  // 分页获取提示词（键集分页，支持服务端筛选）
+  static async listPrompts(params: PromptListParams = {}): Promise<PaginatedResponse<Prompt>> {
+    const response = await api.get('/prompts', {
+      params,
+      paramsSerializer: { indexes: null },  // tags=a&tags=b
+    });
     return response.data;
   }
 
@@ -209,6 +408,14 @@ export class PromptAPI {
     return response.data;
   }
 
+  // 按ID批量获取提示词（一次请求）
+  static async batchGetPrompts(ids: number[], fields?: Array<keyof Prompt>): Promise<BatchResponse<Partial<Prompt>>> {
+    const response = await api.get('/prompts:batch', {
+      params: { ids: ids.join(','), fields: fields?.join(',') },
+    });
+    return response.data;
+  }
+
   // 更新提示词
   static async updatePrompt(id: number, data: PromptUpdate): Promise<Prompt> {
     const response = await api.put(`/prompts/${id}`, data);
@@ -227,6 +434,22 @@ export class PromptAPI {
   }
 }
 
+export class TagAPI {
+  // 获取标签分面统计（可在筛选条件内统计）
+  static async getTagFacets(params: Omit<PromptListParams, 'cursor' | 'limit' | 'sort' | 'with_total'> & { prefix?: string; limit?: number } = {}): Promise<TagFacet[]> {
+    const response = await api.get('/tags', { params, paramsSerializer: { indexes: null } });
+    return response.data;
+  }
+}
+
+export class AnalyticsAPI {
+  // 获取按时间桶汇总的用量与延迟序列
+  static async getUsageSeries(params: UsageQueryParams = {}): Promise<UsageSeries[]> {
+    const response = await api.get('/analytics/usage', { params });
+    return response.data;
+  }
+}
+
 export class VersionAPI {
   // 获取单个版本（包含结果）
   static async getVersionById(id: number): Promise<VersionWithResults> {
@@ -234,15 +457,50 @@ export class VersionAPI {
     return response.data;
   }
 
+  // 按ID批量获取版本（一次请求）；不需要内容时在 fields 中省略 content
+  static async batchGetVersions(ids: number[], fields?: Array<keyof PromptVersion>): Promise<BatchResponse<Partial<PromptVersion>>> {
+    const response = await api.get('/versions:batch', {
+      params: { ids: ids.join(','), fields: fields?.join(',') },
+    });
+    return response.data;
+  }
+
   // 创建优化结果
   static async createResult(versionId: number, data: OptimizationResultCreate): Promise<OptimizationResult> {
-    const response = await api.post(`/versions/${versionId}/results`, data);
+    const response = await postIdempotent<OptimizationResult>(`/versions/${versionId}/results`, data);
+    return response.data;
+  }
+
+  // 批量创建结果（可跨版本），返回逐条状态
+  static async bulkCreateResults(items: BulkResultItem[]): Promise<BulkResultResponse> {
+    const response = await api.post('/versions/results/bulk', items);
     return response.data;
   }
 
-  // 获取版本的所有结果
-  static async getVersionResults(versionId: number): Promise<OptimizationResult[]> {
-    const response = await api.get(`/versions/${versionId}/results`);
+  // 分页获取版本的结果
+  static async listVersionResults(versionId: number, params: ResultListParams = {}): Promise<PaginatedResponse<OptimizationResult>> {
+    const response = await api.get(`/versions/${versionId}/results`, { params });
+    return response.data;
+  }
+
+  // 获取版本的结果统计（服务端增量维护，无需下载全部结果）
+  static async getVersionStats(versionId: number): Promise<VersionStats> {
+    const response = await api.get(`/versions/${versionId}/stats`);
+    return response.data;
+  }
+
+  // 获取版本已归档结果的汇总统计
+  static async getArchiveSummary(versionId: number): Promise<ArchiveSummary> {
+    const response = await api.get(`/versions/${versionId}/archive`);
+    return response.data;
+  }
+
+  // 分页读取版本的归档结果
+  static async listArchivedResults(
+    versionId: number,
+    params: Pick<ResultListParams, 'limit' | 'cursor' | 'order' | 'fields'> = {}
+  ): Promise<PaginatedResponse<OptimizationResult>> {
+    const response = await api.get(`/versions/${versionId}/archive/results`, { params });
     return response.data;
   }
 }
@@ -268,25 +526,68 @@ export class LLMAPI {
 
   // 执行LLM请求
   static async generateCompletion(data: LLMRequest): Promise<LLMResponse> {
-    const response = await api.post('/llm/generate', data);
+    const response = await postIdempotent<LLMResponse>('/llm/generate', data);
+    return response.data;
+  }
+}
+
+export class TemplateAPI {
+  // 获取模板列表
+  static async listTemplates(params: { category?: string; is_official?: boolean; limit?: number; offset?: number } = {}): Promise<PromptTemplate[]> {
+    const response = await api.get('/templates/', { params });
+    return response.data;
+  }
+
+  // 校验模板变量
+  static async validateTemplate(template_content: string, variables?: Record<string, string>): Promise<TemplateValidation> {
+    const response = await api.post('/templates/validate', { template_content, variables });
+    return response.data;
+  }
+
+  // 服务端渲染模板
+  static async renderTemplate(templateId: number, inputs: Record<string, unknown>): Promise<string> {
+    const response = await api.post(`/templates/${templateId}/render`, { inputs });
+    return response.data.text;
+  }
+
+  // 用多行输入批量渲染同一模板
+  static async renderTemplateBatch(templateId: number, rows: Array<Record<string, unknown>>): Promise<TemplateBatchRender> {
+    const response = await api.post(`/templates/${templateId}/render/batch`, { rows });
     return response.data;
   }
 }
 
 // 向后兼容的导出
 export const promptApi = {
-  getPrompts: PromptAPI.getPrompts,
+  listPrompts: PromptAPI.listPrompts,
   createPrompt: PromptAPI.createPrompt,
   getPromptById: PromptAPI.getPromptById,
+  batchGetPrompts: PromptAPI.batchGetPrompts,
   updatePrompt: PromptAPI.updatePrompt,
   deletePrompt: PromptAPI.deletePrompt,
   createVersion: PromptAPI.createVersion,
 };
 
+export const tagApi = {
+  getTagFacets: TagAPI.getTagFacets,
+};
+
 export const versionApi = {
   getVersionById: VersionAPI.getVersionById,
+  batchGetVersions: VersionAPI.batchGetVersions,
   createResult: VersionAPI.createResult,
-  getVersionResults: VersionAPI.getVersionResults,
+  bulkCreateResults: VersionAPI.bulkCreateResults,
+  listVersionResults: VersionAPI.listVersionResults,
+  getVersionStats: VersionAPI.getVersionStats,
+  getArchiveSummary: VersionAPI.getArchiveSummary,
+  listArchivedResults: VersionAPI.listArchivedResults,
+};
+
+export const templateApi = {
+  listTemplates: TemplateAPI.listTemplates,
+  validateTemplate: TemplateAPI.validateTemplate,
+  renderTemplate: TemplateAPI.renderTemplate,
+  renderTemplateBatch: TemplateAPI.renderTemplateBatch,
 };
 
 export const llmApi = {
@@ -301,4 +602,5 @@ export default {
   prompt: PromptAPI,
   version: VersionAPI,
   llm: LLMAPI,
+  template: TemplateAPI,
 }; 
\ No newline at end of file